@@ -4,24 +4,47 @@ settings = {
             "NoFullscreen": False,        # [Bool]   (Default: False)  Disables fullscreen mode on Linux.
             "DisplayHeightMultiplier": 1, # [Float]  (Default: 1)      Scales the screen height, making it taller or shorter. It is suggested to enable NoFullscreen if using Linux.
             "DisplayWidthMultiplier": 1,  # [Float]  (Default: 1)      Scales the screen width, making it wider or thinner. It is suggested to enable NoFullscreen if using Linux.
-            "TPS": 64,                    # [Int]    (Default: 64)     Modify the game ticks per second, making everythng update faster or slower. Intended for 64 tps.
+            "TPS": 64,                    # [Int]    (Default: 64)     Game ticks per second. Gameplay runs at the same speed at any rate, lower values use less cpu. Online play uses the server rate.
             "FPS": 400,                   # [Int]    (Default: 120)    Limit rendering frames per second.
-            "SpeedMultiplier": 1,         # [Float]  (Default: 1)      Scales the player speed, making it faster or slower.
+            "SpeedMultiplier": 1,         # [Float]  (Default: 1)      Scales the player speed, making it faster or slower. Ignored online, where the server sets the speed.
+            "PreciseHits": True,          # [Bool]   (Default: True)   Uses pixel masks to check bullet hits, so shots through transparent areas miss. Disabled on android.
+            "MaskTestBudget": 64,         # [Int]    (Default: 64)     Maximum pixel mask tests per tick. Hits over the budget fall back to the bounding box.
+            "WorldSeed": None,            # [Int]    (Default: None)   Seed used to generate the world. A random seed is used if None.
+            "ChunkRadius": 2,             # [Int]    (Default: 2)      Number of world chunks around the player kept loaded. Lower values use less memory and cpu.
+            "MaxParticles": 20000,        # [Int]    (Default: 20000)  Maximum live effect particles, shared between muzzle flashes, impacts and falling trees.
+            "ShadowCasting": True,        # [Bool]   (Default: True)   Darkens the areas the player can not see because scenery is in the way.
+            "FogOfWar": True,             # [Bool]   (Default: True)   Covers the parts of the world the player has not explored yet.
+            "Minimap": True,              # [Bool]   (Default: True)   Shows a map of the area around the player.
+            "MinimapRate": 10,            # [Int]    (Default: 10)     Minimap updates per second. Lower values use less cpu.
+            "DynamicResolution": False,   # [Bool]   (Default: False)  Renders the world at a lower resolution when frames take too long, and upscales it to the screen. The UI stays at full resolution.
+            "TargetFPS": 60,              # [Int]    (Default: 60)     Frame rate the dynamic resolution aims for.
+            "MinRenderScale": 0.5,        # [Float]  (Default: 0.5)    Lowest resolution the world is rendered at with dynamic resolution, relative to the screen.
+            "AdaptivePerformance": False, # [Bool]   (Default: False)  Adjusts the FPS limit, effect particles and frame skipping to the measured loop times, battery and temperature. Enabled on android.
+            "MinFPS": 30,                 # [Int]    (Default: 30)     Lowest FPS limit adaptive performance goes down to, also used when the device is hot or the battery is low.
+            "BatteryFPS": 60,             # [Int]    (Default: 60)     Highest FPS limit with adaptive performance while running on battery.
+            "MaxFrameSkip": 2,            # [Int]    (Default: 2)      Most frames adaptive performance skips in a row while the game loop can not keep up.
+            "Server": None,               # [String] (Default: None)   Address of a game server to join as "host:port". Plays offline if None. The server runs at 64 TPS.
             "AndroidBuild": False         # [Bool]   (Default: False)  Changes some sections to work for android.
             }
 
 if settings["AndroidBuild"]:
     settings["NoFullscreen"] = False
+    settings["PreciseHits"] = False
+    settings["AdaptivePerformance"] = True
 
 
 # ----- Setup ------
-import pygame, os, sys, random, math, time, threading
+import pygame, os, sys, random, math, time, threading, queue, bisect, itertools, socket, weakref, collections, abc
 import numpy as np
 
 pygame.init()
 
 # Imports lots of colors as RGB
 from src import color as Color
+# Procedural world generation
+from src import worldgen
+# Multiplayer protocol and shared simulation
+from src import lakeserver
 
 # Clear screen
 if os.name == "posix":
@@ -31,8 +54,8 @@ else:
 
 
 # ----- Constant Variables -----
-# Ticks Per Second
-TPS = settings["TPS"]
+# Ticks Per Second. Online, inputs are applied one per server tick, so the client ticks at the server rate
+TPS = lakeserver.TPS if settings["Server"] else settings["TPS"]
 # Seconds Per Tick
 SPT = 1/TPS
 
@@ -218,15 +241,43 @@ class Render:
     DEBUG_DOT = pygame.Surface((6, 6))
     DEBUG_DOT.fill(Color.RED1)
     previous_show_debug_time = -1
+    # Created on first use, as the UI classes are defined after Render
+    debug_overlay = None
+    debug_labels = []
+
+    # Render layers, displayed in order
+    GROUND_LAYER = 0
+    WORLD_LAYER = 1
+    EFFECTS_LAYER = 2
+    UI_LAYER = 3
     
-    queued_images = []
-    finger_positions = {}
+    queued_layers = ([], [], [], [])
 
     running_spt = np.array([SPT])
     average_running_tps = TPS
 
     running_spf = np.array([SPF])
     average_running_fps = FPS
+
+    running_mask_tests = np.array([0])
+    running_mask_time = np.array([0])
+    average_mask_tests = 0
+    average_mask_time = 0
+
+    running_input_latency = np.array([0])
+    average_input_latency = 0
+    max_input_latency = 0
+
+    # Dynamic resolution
+    SCALE_STEP = 0.125         # Resolution scale change per adjustment
+    SCALE_INTERVAL = 0.5       # Minimum seconds between adjustments
+    SCALE_SMOOTHING = 0.1      # Weight of the newest frame in the average frame time
+
+    render_scale = 1
+    world_surface = None
+    scaled_image_caches = {}
+    average_frame_time = 0
+    previous_scale_time = 0
     
     def __init__(self, game_resolution):
         """
@@ -259,14 +310,25 @@ class Render:
             self.screen.set_alpha(None)
             self.MACHINE = os.uname().machine
     
-    def blit(self, *image):
+    def blit(self, *image, layer = WORLD_LAYER):
         """
-        Adds an image to the queue of images to be blitted later.
+        Adds an image to the queue of a render layer to be blitted later. Images are blitted layer by layer, in the order they were added.
 
         Args:
             *image (tuple): Tuple containing the surface to be blitted and its position.
+            layer (int): The render layer, one of GROUND_LAYER, WORLD_LAYER, EFFECTS_LAYER or UI_LAYER. Defaults to WORLD_LAYER.
+        """
+        self.queued_layers[layer].append(image)
+
+    def blits(self, images, layer = WORLD_LAYER):
         """
-        self.queued_images.append(image)
+        Adds many images to the queue of a render layer at once, so they are blitted in the same batched call as the rest of the layer.
+
+        Args:
+            images (iterable): (surface, position) tuples.
+            layer (int): The render layer. Defaults to WORLD_LAYER.
+        """
+        self.queued_layers[layer].extend(images)
     
     def scale_image(self, surface):
         """
@@ -280,47 +342,79 @@ class Render:
         """        
         surface_resize = pygame.transform.smoothscale(surface, (surface.get_width() * render.WIDTH_MULTIPLIER, surface.get_height() * render.HEIGHT_MULTIPLIER))
         return surface_resize
-    
-    def handle_events(self):
+
+    def get_scaled_image(self, surface):
         """
-        Handles events and updates the display.
+        Returns a surface scaled to the current internal render scale. Scaled surfaces are cached per scale, and freed with the original surface.
+
+        Args:
+            surface (pygame.Surface): The surface, sized for the screen.
+
+        Returns:
+            pygame.Surface: The surface sized for the internal render surface.
         """
-        for event in pygame.event.get(exclude=[pygame.FINGERDOWN, pygame.FINGERMOTION, pygame.FINGERUP]):
-            if event.type == pygame.QUIT:
-                exit()
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                exit()
-    
-    def show_debug(self, compute = True):
+        scaled_images = self.scaled_image_caches[self.render_scale]
+        scaled = scaled_images.get(surface)
+        if scaled is None:
+            # Rounding up keeps neighbouring tiles overlapping
+            scaled = pygame.transform.smoothscale(surface, (math.ceil(surface.get_width() * self.render_scale), math.ceil(surface.get_height() * self.render_scale)))
+            scaled_images[surface] = scaled
+        return scaled
+
+    def add_scaled_image(self, surface):
+        """
+        Marks a surface as already drawn at the current internal render scale, so it is blitted without scaling. Used by surfaces redrawn every frame.
+
+        Args:
+            surface (pygame.Surface): The surface, sized for the internal render surface.
         """
-        Blits game statistics like FPS to the screen. Useful for debugging.
+        if self.render_scale != 1:
+            self.scaled_image_caches[self.render_scale][surface] = surface
+
+    def get_render_size(self):
         """
-        if compute:
-            self.fps_text = Font.debug.render(f"FPS: {self.average_running_fps:.1f}", True, Color.BLACK, Color.WHITE).convert()
-            self.fps_text = render.scale_image(self.fps_text)
-            self.fps_rect = self.fps_text.get_rect()
-            self.fps_rect.topright = render.get_render_pos((GAME_WIDTH - 10, 10))
+        Returns the size of the surface the world is rendered to, which is smaller than the screen with dynamic resolution.
 
-            self.tps_text = Font.debug.render(f"TPS: {self.average_running_tps:.1f}", True, Color.BLACK, Color.WHITE).convert()
-            self.tps_text = render.scale_image(self.tps_text)
-            self.tps_rect = self.tps_text.get_rect()
-            self.tps_rect.topright = render.get_render_pos((GAME_WIDTH - 10, 20 + self.fps_rect.height / render.HEIGHT_MULTIPLIER))
+        Returns:
+            tuple: The (width, height) of the internal render surface.
+        """
+        return (round(self.DISPLAY_WIDTH * self.render_scale), round(self.DISPLAY_HEIGHT * self.render_scale))
+    
+    def show_debug(self, compute = True):
+        """
+        Displays game statistics like FPS on the screen, as labels of their own UI overlay. Useful for debugging.
 
-            self.machine_text = Font.debug.render(f"Machine: {self.MACHINE}", True, Color.BLACK, Color.WHITE).convert()
-            self.machine_text = render.scale_image(self.machine_text)
-            self.machine_rect = self.machine_text.get_rect()
-            self.machine_rect.topright = render.get_render_pos((GAME_WIDTH - 10, 30 + self.machine_rect.height * 2 / render.HEIGHT_MULTIPLIER))
+        Args:
+            compute (bool): Updates the statistics if True, displays the last ones otherwise. Defaults to True.
+        """
+        if compute or self.debug_overlay is None:
+            scale_text = f" Scale: {self.render_scale:.0%}" if settings["DynamicResolution"] else ""
+            governor_text = f" Cap: {Governor.fps_cap:.0f} Effects: {Governor.effect_budget:.0%}" if settings["AdaptivePerformance"] else ""
+            texts = (f"FPS: {self.average_running_fps:.1f}{scale_text}{governor_text}",
+                     f"TPS: {self.average_running_tps:.1f}",
+                     f"Machine: {self.MACHINE}",
+                     f"Masks: {self.average_mask_tests:.1f} {self.average_mask_time * 1000:.3f}ms",
+                     f"Input: {self.average_input_latency * 1000:.1f}ms {self.max_input_latency * 1000:.1f}ms max")
+
+            if self.debug_overlay is None:
+                self.debug_overlay = UIOverlay()
+                # Right aligned lines, 10 game units apart
+                self.debug_labels = [Label(text, (GAME_WIDTH - 10, 10 + index * (10 + Font.debug.get_height())), Font.debug, Color.BLACK, Color.WHITE, "topright") for index, text in enumerate(texts)]
+                for label in self.debug_labels:
+                    self.debug_overlay.add(label)
+            else:
+                for label, text in zip(self.debug_labels, texts):
+                    label.set_text(text)
 
-        self.blit(self.fps_text, self.fps_rect.topleft)
-        self.blit(self.tps_text, self.tps_rect.topleft)
-        self.blit(self.machine_text, self.machine_rect.topleft)
-        self.blit(self.DEBUG_DOT, (self.DISPLAY_WIDTH / 2 - self.DEBUG_DOT.get_width() / 2, self.DISPLAY_HEIGHT / 2 - self.DEBUG_DOT.get_height() / 2))
+        self.debug_overlay.display()
+        self.blit(self.DEBUG_DOT, (self.DISPLAY_WIDTH / 2 - self.DEBUG_DOT.get_width() / 2, self.DISPLAY_HEIGHT / 2 - self.DEBUG_DOT.get_height() / 2), layer=self.UI_LAYER)
     
     def display(self):
         """
         Blits all queued images and updates the display.
+
+        With dynamic resolution, the world layers are blitted to a smaller internal surface which is upscaled to the screen in one step, then the UI layer is blitted at full resolution.
         """
-        self.screen.fill(self.BACKGROUND_COLOR)
         current_time = time.time()
         if settings["ShowDebug"]:
             if self.previous_show_debug_time + 0.5 < current_time:
@@ -329,48 +423,30 @@ class Render:
             else:
                 self.show_debug(False)
 
-        for image in list(self.queued_images):
-            image = list(image)
-            if not image[0].get_locked():
-                image[1] = (round(image[1][0]), round(image[1][1]))
-                self.screen.blit(*image)
-
-        pygame.display.update()
-        self.queued_images = []
-    
-    def get_mouse(self):
-        """
-        Gets the mouse position and mouse button states.
-
-        Returns:
-            tuple: A tuple containing the mouse position and the mouse button states.
-        """
-        return pygame.mouse.get_pos(), pygame.mouse.get_pressed()
-    
-    def get_fingers(self):
-        """
-        Gets the finger positions on the screen (for mobile).
+        scale = self.render_scale
+        if scale == 1:
+            self.screen.fill(self.BACKGROUND_COLOR)
+            # The layer lists are reused every frame instead of being rebuilt
+            for queued_images in self.queued_layers:
+                self.screen.blits(queued_images, doreturn=False)
+                queued_images.clear()
+        else:
+            render_size = self.get_render_size()
+            if self.world_surface is None or self.world_surface.get_size() != render_size:
+                self.world_surface = pygame.Surface(render_size).convert()
+            self.world_surface.fill(self.BACKGROUND_COLOR)
 
-        Returns:
-            tuple: A tuple containing the finger positions.
-        """
-        for event in pygame.event.get(eventtype=[pygame.FINGERDOWN, pygame.FINGERMOTION, pygame.FINGERUP]):
-            if event.type == pygame.FINGERDOWN or event.type == pygame.FINGERMOTION:
-                finger_x, finger_y = event.x * self.DISPLAY_WIDTH, event.y * self.DISPLAY_HEIGHT
-                
-                self.finger_positions[event.finger_id] = (finger_x, finger_y)
-            elif event.type == pygame.FINGERUP:
-                del self.finger_positions[event.finger_id]
-        return self.finger_positions.values()
+            get_scaled_image = self.get_scaled_image
+            for queued_images in self.queued_layers[:self.UI_LAYER]:
+                self.world_surface.blits([(get_scaled_image(image[0]), (image[1][0] * scale, image[1][1] * scale)) for image in queued_images], doreturn=False)
+                queued_images.clear()
 
-    def get_keys(self):
-        """
-        Gets the keyboard button states.
+            # Nearest neighbour upscaling, smoothing the whole screen every frame would cost more than it saves
+            pygame.transform.scale(self.world_surface, (self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT), self.screen)
+            self.screen.blits(self.queued_layers[self.UI_LAYER], doreturn=False)
+            self.queued_layers[self.UI_LAYER].clear()
 
-        Returns:
-            pygame.key.ScancodeWrapper: Contains the keyboard button states.
-        """
-        return pygame.key.get_pressed()
+        pygame.display.update()
     
     def get_game_pos(self, pos):
         """
@@ -428,9 +504,304 @@ class Render:
             self.running_spf = self.running_spf[1:]
         self.average_running_fps = 1 / np.mean(self.running_spf)
 
+    def update_render_scale(self, duration):
+        """
+        Adjusts the internal render scale with dynamic resolution. The scale is lowered while frames take longer than the target frame time, and raised when the frame time at the higher scale would stay well under the target.
+
+        Args:
+            duration (float): The time spent drawing the frame in seconds, without the frame limiter delay.
+        """
+        if not settings["DynamicResolution"]:
+            return
+        self.average_frame_time += (duration - self.average_frame_time) * self.SCALE_SMOOTHING
+
+        current_time = time.perf_counter()
+        if current_time - self.previous_scale_time < self.SCALE_INTERVAL:
+            return
+
+        target_frame_time = 1 / settings["TargetFPS"]
+        scale = self.render_scale
+        if self.average_frame_time > target_frame_time and scale > settings["MinRenderScale"]:
+            scale = max(scale - self.SCALE_STEP, settings["MinRenderScale"])
+        # Fill rate follows the pixel count, the margin keeps the scale from going back and forth
+        elif scale < 1 and self.average_frame_time * ((scale + self.SCALE_STEP) / scale) ** 2 < target_frame_time * 0.8:
+            scale = min(scale + self.SCALE_STEP, 1)
+        else:
+            return
+
+        self.previous_scale_time = current_time
+        # Only the caches of the old and new scale are kept
+        self.scaled_image_caches = {key: cache for key, cache in self.scaled_image_caches.items() if key == self.render_scale}
+        self.scaled_image_caches.setdefault(scale, weakref.WeakKeyDictionary())
+        self.render_scale = scale
+
+    def update_collision_stats(self, mask_tests, duration):
+        """
+        Updates the pixel mask test lists and calculates the average tests and time spent per tick.
+
+        Args:
+            mask_tests (int): The number of mask tests run during the tick.
+            duration (float): The time spent running mask tests during the tick in seconds.
+        """
+        self.running_mask_tests = np.append(self.running_mask_tests, mask_tests)
+        self.running_mask_time = np.append(self.running_mask_time, duration)
+        if len(self.running_mask_tests) > 100:
+            self.running_mask_tests = self.running_mask_tests[1:]
+            self.running_mask_time = self.running_mask_time[1:]
+        self.average_mask_tests = np.mean(self.running_mask_tests)
+        self.average_mask_time = np.mean(self.running_mask_time)
+
+    def update_input_latency(self, latencies):
+        """
+        Updates the input latency list and calculates the average and maximum time events waited before a tick consumed them.
+
+        Args:
+            latencies (list): The latencies of the events consumed during the tick in seconds.
+        """
+        if not latencies:
+            return
+        self.running_input_latency = np.append(self.running_input_latency, latencies)[-100:]
+        self.average_input_latency = np.mean(self.running_input_latency)
+        self.max_input_latency = np.max(self.running_input_latency)
+
 
 render = Render((GAME_WIDTH, GAME_WIDTH))
 
+
+class Governor:
+    UPDATE_INTERVAL = 1        # Seconds between adjustments
+    POWER_INTERVAL = 10        # Seconds between battery and temperature readings
+    LOAD_SMOOTHING = 0.05      # Weight of the newest frame in the average load
+    BUSY_LOAD = 0.75           # Fraction of the frame time spent drawing above which the budgets are lowered
+    IDLE_LOAD = 0.4            # Fraction of the frame time spent drawing under which the budgets are raised again
+    FPS_STEP = 0.8             # Factor the FPS limit is lowered by per adjustment
+    BUDGET_STEP = 0.25         # Effect budget change per adjustment
+    MIN_BUDGET = 0.25
+    TICK_LAG = 0.95            # Fraction of the TPS under which the game loop is behind
+    TICK_RECOVERED = 0.99      # Fraction of the TPS over which the game loop caught up
+    LOW_BATTERY = 20           # Percent
+    HOT_TEMPERATURE = 70       # Degrees celsius
+    POWER_SUPPLY_PATH = "/sys/class/power_supply"
+    THERMAL_PATH = "/sys/class/thermal"
+
+    fps_cap = FPS
+    frame_time = SPF
+    effect_budget = 1
+    frame_skip = 0
+    skipped_frames = 0
+
+    average_load = 0
+    on_battery = False
+    power_saving = False
+    previous_update_time = 0
+    previous_power_time = -POWER_INTERVAL
+
+    @classmethod
+    def read_file(cls, path):
+        """
+        Reads a small system file.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            str: The stripped file contents, or None if the file can not be read.
+        """
+        try:
+            with open(path) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    @classmethod
+    def read_power_state(cls):
+        """
+        Reads the battery and temperature state from the sysfs files exposed by Linux and Android. Platforms without them are treated as plugged in and cool.
+
+        Returns:
+            tuple: (on_battery, power_saving), whether a battery is discharging, and whether the battery is low or the device is hot.
+        """
+        on_battery = battery_low = hot = False
+        try:
+            supplies = os.listdir(cls.POWER_SUPPLY_PATH)
+        except OSError:
+            supplies = []
+        for supply in supplies:
+            path = os.path.join(cls.POWER_SUPPLY_PATH, supply)
+            if cls.read_file(os.path.join(path, "type")) != "Battery" or cls.read_file(os.path.join(path, "status")) != "Discharging":
+                continue
+            on_battery = True
+            capacity = cls.read_file(os.path.join(path, "capacity"))
+            battery_low |= capacity is not None and capacity.isdigit() and int(capacity) <= cls.LOW_BATTERY
+
+        try:
+            zones = [zone for zone in os.listdir(cls.THERMAL_PATH) if zone.startswith("thermal_zone")]
+        except OSError:
+            zones = []
+        for zone in zones:
+            temperature = cls.read_file(os.path.join(cls.THERMAL_PATH, zone, "temp"))
+            # Temperatures are in millidegrees
+            hot |= temperature is not None and temperature.lstrip("-").isdigit() and int(temperature) >= cls.HOT_TEMPERATURE * 1000
+
+        return on_battery, battery_low or hot
+
+    @classmethod
+    def get_max_fps(cls):
+        """
+        Returns the highest FPS limit allowed by the power state.
+
+        Returns:
+            float: The FPS limit upper bound.
+        """
+        if cls.power_saving:
+            return settings["MinFPS"]
+        if cls.on_battery:
+            return min(settings["BatteryFPS"], FPS)
+        return FPS
+
+    @classmethod
+    def update(cls, draw_duration):
+        """
+        Adjusts the FPS limit, effect budget and frame skip. Called every drawn frame, adjustments are made at most once per update interval.
+
+        The FPS limit is lowered while drawing takes most of the frame time, and the effect budget once the FPS limit is at its minimum. They are raised in the opposite order once drawing takes well under the frame time. Frames are skipped while the game loop falls behind its TPS.
+
+        Args:
+            draw_duration (float): The time spent drawing the frame in seconds, without the frame limiter delay.
+        """
+        if not settings["AdaptivePerformance"]:
+            return
+        cls.average_load += (draw_duration / cls.frame_time - cls.average_load) * cls.LOAD_SMOOTHING
+
+        current_time = time.perf_counter()
+        if current_time - cls.previous_power_time >= cls.POWER_INTERVAL:
+            cls.previous_power_time = current_time
+            cls.on_battery, cls.power_saving = cls.read_power_state()
+        if current_time - cls.previous_update_time < cls.UPDATE_INTERVAL:
+            return
+        cls.previous_update_time = current_time
+
+        if render.average_running_tps < TPS * cls.TICK_LAG:
+            cls.frame_skip = min(cls.frame_skip + 1, settings["MaxFrameSkip"])
+        elif render.average_running_tps > TPS * cls.TICK_RECOVERED:
+            cls.frame_skip = max(cls.frame_skip - 1, 0)
+
+        max_fps = cls.get_max_fps()
+        max_budget = 0.5 if cls.power_saving else 1
+        if cls.average_load > cls.BUSY_LOAD or cls.fps_cap > max_fps or cls.effect_budget > max_budget:
+            if cls.fps_cap > settings["MinFPS"]:
+                cls.fps_cap = max(min(cls.fps_cap * cls.FPS_STEP, max_fps), settings["MinFPS"])
+            if cls.fps_cap <= settings["MinFPS"] or cls.effect_budget > max_budget:
+                cls.effect_budget = max(min(cls.effect_budget - cls.BUDGET_STEP, max_budget), cls.MIN_BUDGET)
+        elif cls.average_load < cls.IDLE_LOAD:
+            if cls.effect_budget < max_budget:
+                cls.effect_budget = min(cls.effect_budget + cls.BUDGET_STEP, max_budget)
+            else:
+                cls.fps_cap = min(cls.fps_cap / cls.FPS_STEP, max_fps)
+        cls.frame_time = 1 / cls.fps_cap
+
+    @classmethod
+    def skip_frame(cls):
+        """
+        Returns whether the render loop skips drawing this frame, to leave time to the game loop.
+
+        Returns:
+            bool: True if the frame is skipped.
+        """
+        if cls.skipped_frames < cls.frame_skip:
+            cls.skipped_frames += 1
+            return True
+        cls.skipped_frames = 0
+        return False
+
+
+class KeyStates(frozenset):
+    """
+    The keys held or pressed during a tick, indexed by key constant like pygame.key.get_pressed.
+    """
+    def __getitem__(self, key):
+        return key in self
+
+
+class Input:
+    MOUSE_BUTTONS = 3
+
+    # Events are appended by the thread owning the window and taken by the game thread. Deque appends and pops are atomic, so no lock is needed
+    events = collections.deque()
+
+    mouse_pos = pygame.mouse.get_pos()
+    mouse_held = [False] * MOUSE_BUTTONS
+    keys_held = set()
+    finger_positions = {}
+
+    # The input state of the current tick
+    mouse_down = (False,) * MOUSE_BUTTONS
+    mouse_pressed = (False,) * MOUSE_BUTTONS
+    keys = KeyStates()
+    keys_pressed = KeyStates()
+    fingers = []
+
+    @classmethod
+    def poll(cls):
+        """
+        Drains the pygame event queue into the input queue, time stamping the events. Only the main thread, which owns the window, drains the events.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        timestamp = time.perf_counter()
+        cls.events.extend((timestamp, event) for event in pygame.event.get())
+
+    @classmethod
+    def update(cls):
+        """
+        Applies the queued events to the input state of a new tick.
+
+        Presses are kept for the tick even if released before it, so short clicks, key taps and touches are never lost. The time each event waited in the queue is reported to the render stats.
+        """
+        current_time = time.perf_counter()
+        mouse_pressed = [False] * cls.MOUSE_BUTTONS
+        keys_pressed = set()
+        touches = {}
+        latencies = []
+
+        while cls.events:
+            timestamp, event = cls.events.popleft()
+            latencies.append(current_time - timestamp)
+
+            if event.type == pygame.MOUSEMOTION:
+                cls.mouse_pos = event.pos
+            elif event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.MOUSEBUTTONUP:
+                cls.mouse_pos = event.pos
+                # Buttons over 3 are the scroll wheel and side buttons
+                if 1 <= event.button <= cls.MOUSE_BUTTONS:
+                    pressed = event.type == pygame.MOUSEBUTTONDOWN
+                    cls.mouse_held[event.button - 1] = pressed
+                    mouse_pressed[event.button - 1] |= pressed
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    exit()
+                cls.keys_held.add(event.key)
+                keys_pressed.add(event.key)
+            elif event.type == pygame.KEYUP:
+                cls.keys_held.discard(event.key)
+            elif event.type == pygame.FINGERDOWN or event.type == pygame.FINGERMOTION:
+                finger_pos = (event.x * render.DISPLAY_WIDTH, event.y * render.DISPLAY_HEIGHT)
+                cls.finger_positions[event.finger_id] = finger_pos
+                if event.type == pygame.FINGERDOWN or event.finger_id in touches:
+                    touches[event.finger_id] = finger_pos
+            elif event.type == pygame.FINGERUP:
+                cls.finger_positions.pop(event.finger_id, None)
+            elif event.type == pygame.QUIT:
+                exit()
+
+        cls.mouse_down = tuple(held or pressed for held, pressed in zip(cls.mouse_held, mouse_pressed))
+        cls.mouse_pressed = tuple(mouse_pressed)
+        cls.keys = KeyStates(cls.keys_held | keys_pressed)
+        cls.keys_pressed = KeyStates(keys_pressed)
+        # Fingers lifted during the tick still touch for this tick
+        cls.fingers = list({**touches, **cls.finger_positions}.values())
+        render.update_input_latency(latencies)
+
 class Sprite:
     class Player:
         class Body:
@@ -471,32 +842,256 @@ class Sprite:
                 frames = load_images(["images/scenery/foilage/tree/f0.png"], size, transparent)
 
 
+class HitIndex:
+    CELL_SIZE = 256            # Render pixels per grid cell
+
+    def __init__(self):
+        """
+        Initializes a HitIndex, a coarse grid of button rects used to find the buttons under pointers.
+
+        Rects are added once with their buttons. The pressed and unclaimed lists are reused by every resolve call, so resolving pointers allocates no lists.
+        """
+        self.rects = []
+        self.cells = {}
+        self.pressed = []
+        self.released = []
+        self.unclaimed = []
+
+    def add(self, rect):
+        """
+        Adds a rect to every grid cell it overlaps.
+
+        Args:
+            rect (pygame.Rect): The button area in render pixels.
+
+        Returns:
+            int: The index of the rect, matching its pressed state.
+        """
+        index = len(self.rects)
+        self.rects.append(rect)
+        for x in range(rect.left // self.CELL_SIZE, (rect.right - 1) // self.CELL_SIZE + 1):
+            for y in range(rect.top // self.CELL_SIZE, (rect.bottom - 1) // self.CELL_SIZE + 1):
+                self.cells.setdefault((x, y), []).append(index)
+        self.pressed.append(False)
+        self.released.append(False)
+        return index
+
+    def resolve(self, pointers):
+        """
+        Finds the rects under all pointers in one pass. A pointer presses every rect it is on.
+
+        Args:
+            pointers (iterable): The pointer positions in render pixels.
+
+        Returns:
+            tuple: A tuple containing:
+                - list: The pressed state of each rect, by index.
+                - list: The pointers which are on no rect.
+            Both lists are reused by the next call.
+        """
+        pressed = self.pressed
+        pressed[:] = self.released
+        unclaimed = self.unclaimed
+        unclaimed.clear()
+
+        rects = self.rects
+        for pointer in pointers:
+            claimed = False
+            for index in self.cells.get((int(pointer[0] // self.CELL_SIZE), int(pointer[1] // self.CELL_SIZE)), ()):
+                if rects[index].collidepoint(pointer):
+                    pressed[index] = True
+                    claimed = True
+            if not claimed:
+                unclaimed.append(pointer)
+        return pressed, unclaimed
+
+
+class Widget(abc.ABC):
+    def __init__(self, render_pos):
+        """
+        Initializes a Widget, an element of a UIOverlay. Widgets are rendered to their own surface when created and when changed, and composited into the overlay of their Scene.
+
+        Args:
+            render_pos (tuple): The top left screen position.
+        """
+        self.rect = pygame.Rect(render_pos, (0, 0))
+        self.surface = None
+        self.overlay = None
+
+    @abc.abstractmethod
+    def redraw(self):
+        """
+        Renders the widget surface and updates the size of its rect. Called on the render thread.
+        """
+
+    def invalidate(self):
+        """
+        Queues the widget to be rendered and composited again, after its state or text changed.
+        """
+        if self.overlay is not None:
+            self.overlay.changes.put(self)
+
+
+class Label(Widget):
+    def __init__(self, text, pos, font, color, background = None, anchor = "topleft"):
+        """
+        Initializes a Label, a line of text which is only rendered again when the text changes.
+
+        Args:
+            text (str): The text.
+            pos (tuple): The game position of the anchor.
+            font (pygame.font.Font): The font.
+            color (tuple): The text color.
+            background (tuple): The background color, or None for a transparent background. Defaults to None.
+            anchor (str): The point of the label kept at pos as the text changes, like "topleft" or "topright". Defaults to "topleft".
+        """
+        super().__init__(render.get_render_pos(pos))
+        self.anchor = anchor
+        self.text = text
+        self.font = font
+        self.color = color
+        self.background = background
+        self.redraw()
+
+    def set_text(self, text):
+        """
+        Changes the text of the label.
+
+        Args:
+            text (str): The new text.
+        """
+        if text != self.text:
+            self.text = text
+            self.invalidate()
+
+    def redraw(self):
+        """
+        Renders the label surface with its current text.
+        """
+        anchor_pos = getattr(self.rect, self.anchor)
+        self.surface = render.scale_image(self.font.render(self.text, True, self.color, self.background).convert_alpha())
+        self.rect.size = self.surface.get_size()
+        setattr(self.rect, self.anchor, anchor_pos)
+
+
+class UIOverlay:
+    def __init__(self, background = None):
+        """
+        Initializes a UIOverlay, a retained UI layer. Widgets are added once and composited into one cached surface, which is displayed with a single blit per frame.
+
+        Only the area of widgets which changed is composited again. Without a background the surface is transparent, and only covers the area around the widgets.
+
+        Args:
+            background (pygame.Surface): An opaque screen sized surface drawn under the widgets, or None. Defaults to None.
+        """
+        self.background = background
+        self.widgets = []
+        self.changes = queue.Queue()
+        self.surface = None
+        self.rect = None
+
+    def add(self, widget):
+        """
+        Adds a widget on top of the others.
+
+        Args:
+            widget (Widget): The widget.
+        """
+        widget.overlay = self
+        self.widgets.append(widget)
+        # The overlay is built again around the new widget
+        self.surface = None
+
+    def build(self):
+        """
+        Creates the overlay surface and composites every widget into it.
+        """
+        if self.background is not None:
+            self.rect = self.background.get_rect()
+            self.surface = self.background.copy()
+        else:
+            self.rect = self.widgets[0].rect.unionall([widget.rect for widget in self.widgets[1:]])
+            self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.composite(self.rect)
+
+    def composite(self, area):
+        """
+        Draws the background and the widgets over an area of the overlay again.
+
+        Args:
+            area (pygame.Rect): The screen area.
+        """
+        local_area = area.move(-self.rect.x, -self.rect.y)
+        self.surface.set_clip(local_area)
+        if self.background is not None:
+            self.surface.blit(self.background, local_area.topleft, local_area)
+        else:
+            self.surface.fill((0, 0, 0, 0), local_area)
+        for widget in self.widgets:
+            if widget.rect.colliderect(area):
+                self.surface.blit(widget.surface, (widget.rect.x - self.rect.x, widget.rect.y - self.rect.y))
+        self.surface.set_clip(None)
+
+    def display(self):
+        """
+        Renders and composites the changed widgets, then displays the overlay on the screen.
+        """
+        if not self.widgets:
+            return
+        if self.surface is None:
+            self.build()
+
+        while not self.changes.empty():
+            widget = self.changes.get()
+            previous_rect = widget.rect.copy()
+            widget.redraw()
+            if self.rect.contains(widget.rect):
+                self.composite(previous_rect.union(widget.rect))
+            else:
+                self.build()
+
+        render.blit(self.surface, self.rect.topleft, layer=render.UI_LAYER)
+
+
 class Scene:
     mobile_buttons = {}
     buttons = []
     objects = []
+
+    button_index = HitIndex()
+    mobile_button_index = HitIndex()
+    mobile_button_names = []
+    pressed_mobile_buttons = {}
+
+    ui = UIOverlay()
     
     @classmethod
     def add_button(cls, button):
         """
-        A class method which adds a button to the list of buttons in the Scene class.
+        A class method which adds a button to the list of buttons in the Scene class, its area to the button hit index and the button to the UI overlay.
 
         Args:
             button (Button): A Button instance to be added.
         """
         cls.buttons.append(button)
+        cls.button_index.add(button.rect)
+        cls.ui.add(button)
 
     @classmethod
     def add_mobile_button(cls, name, mobile_button):
         """
-        A class method which adds a mobile button to the dict of mobile buttons in the Scene class.
+        A class method which adds a mobile button to the dict of mobile buttons in the Scene class, its area to the mobile button hit index and the button to the UI overlay.
 
         Args:
             name (String): The name of the button in the list.
             mobile_button (MobileButton): A MobileButton instance to be added.
         """
         cls.mobile_buttons[name] = mobile_button
-    
+        cls.mobile_button_index.add(mobile_button.rect)
+        cls.mobile_button_names.append(name)
+        cls.pressed_mobile_buttons[name] = False
+        cls.ui.add(mobile_button)
+
     @classmethod
     def add_object(cls, object):
         """
@@ -516,33 +1111,32 @@ class Scene:
             mouse_pos (tuple): Current mouse position.
             mouse_down (tuple): Indicates if the mouse button is being pressed.
         """
-        for button in cls.buttons:
-            button.update(mouse_pos, mouse_down)
+        if not mouse_down[0]:
+            return
+        pressed, unclaimed = cls.button_index.resolve((mouse_pos,))
+        for button, button_pressed in zip(cls.buttons, pressed):
+            if button_pressed:
+                button.callback()
 
     @classmethod
     def update_mobile_buttons(cls, finger_positions):
         """
-        Updates the MobileButtons (excluding Buttons) and returns a dictionary of pressed buttons and a list of remaining fingers.
+        Updates the MobileButtons (excluding Buttons) and returns a dictionary of pressed buttons and a list of remaining fingers. A finger presses every button it is on, and fingers on no button remain.
 
         Args:
             finger_positions (tuple): A list of finger positions.
 
         Returns:
-            dict: A dictionary containing the state of pressed buttons and remaining fingers.
+            dict: A dictionary containing the state of pressed buttons, reused every tick.
                 - Keys (str): Names of the buttons.
                 - Values (bool): True if the button is pressed, False otherwise.
-            list: A list of remaining fingers.
+            list: A list of remaining fingers, reused every tick.
         """
-        pressed_buttons = {}
-        remaining_fingers = list(finger_positions)
-
-        for button_name, mobile_button in cls.mobile_buttons.items():
-            button_pressed, finger_used = mobile_button.update(finger_positions)
-            pressed_buttons[button_name] = button_pressed
-            if finger_used in remaining_fingers:
-                remaining_fingers.remove(finger_used)
+        pressed, remaining_fingers = cls.mobile_button_index.resolve(finger_positions)
+        for button_name, button_pressed in zip(cls.mobile_button_names, pressed):
+            cls.pressed_mobile_buttons[button_name] = button_pressed
 
-        return pressed_buttons, remaining_fingers
+        return cls.pressed_mobile_buttons, remaining_fingers
 
 
 class Hand:
@@ -578,80 +1172,326 @@ class Hand:
         """
         Displays the hand on the screen.
         """
-        render.blit(Sprite.Player.Hand.image, render.get_render_pos(self.pos))
+        render.blit(Sprite.Player.Hand.image, render.get_render_pos(self.pos), layer=render.WORLD_LAYER)
 
 
-class Bullet:
-    bullet_path = Sprite.Bullets.Flintlock
-    image_path = bullet_path.image
-    IMAGE = pygame.transform.smoothscale(image_path, (bullet_path.size[0] * render.WIDTH_MULTIPLIER, bullet_path.size[1] * render.HEIGHT_MULTIPLIER))
+class Collision:
+    mask_tests = 0
+    mask_time = 0
 
-    def __init__(self, pos, angle, speed, survival_time):
+    @classmethod
+    def reset(cls):
         """
-        Initializes a Bullet object with position, angle, speed, and survival time.
+        Sends the mask test count and time of the last tick to the render stats and resets them.
+        """
+        render.update_collision_stats(cls.mask_tests, cls.mask_time)
+        cls.mask_tests = 0
+        cls.mask_time = 0
 
-        Args:
-            pos (tuple): A tuple containing the initial position (x, y).
-            angle (float): The angle of movement in radians.
-            speed (float): The speed of movement.
-            survival_time (float): The time the object is expected to survive.
+    @classmethod
+    def hit(cls, game_object, pos, mask):
         """
-        self.pos = pos
-        self.pos[0] += Player.game_pos[0]
-        self.pos[1] += Player.game_pos[1]
-        self.angle = angle * -1
-        self.speed = speed
-        self.survival_time = survival_time
+        Checks if a position hits an object. A bounding box broadphase is run first, then a pixel mask narrowphase if PreciseHits is enabled.
 
-        # Calculate the perpendicular direction
-        perpendicular_angle = self.angle + 0.25
-        perpendicular_speed = -20
+        The narrowphase is limited to MaskTestBudget tests per tick, once the budget is spent the bounding box result is used.
 
-        # Calculate the new position
-        self.pos[0] += perpendicular_speed * math.cos(perpendicular_angle * 2 * math.pi) * render.WIDTH_MULTIPLIER
-        self.pos[1] += perpendicular_speed * math.sin(perpendicular_angle * 2 * math.pi) * render.HEIGHT_MULTIPLIER
+        Args:
+            game_object (Object): The object to check against.
+            pos (tuple): The game position of the center of the mask.
+            mask (pygame.mask.Mask): The mask at the position, in render pixels.
 
-        # Calculate the perpendicular direction
-        perpendicular_angle = self.angle + 0.5
-        perpendicular_speed = -20
+        Returns:
+            bool: True if the position hits the object, False otherwise.
+        """
+        if not game_object.rect.collidepoint(pos):
+            return False
+        if not settings["PreciseHits"] or cls.mask_tests >= settings["MaskTestBudget"]:
+            return True
 
-        # Calculate the new position
-        self.pos[0] += perpendicular_speed * math.cos(perpendicular_angle * 2 * math.pi) * render.WIDTH_MULTIPLIER
-        self.pos[1] += perpendicular_speed * math.sin(perpendicular_angle * 2 * math.pi) * render.HEIGHT_MULTIPLIER
+        start_time = time.perf_counter()
+        offset = (round((pos[0] - game_object.game_pos[0]) * render.WIDTH_MULTIPLIER - mask.get_size()[0] / 2),
+                  round((pos[1] - game_object.game_pos[1]) * render.HEIGHT_MULTIPLIER - mask.get_size()[1] / 2))
+        overlap = game_object.mask.overlap(mask, offset)
 
-        # Calculate the horizontal and vertical components of speed
-        self.horizontal_speed = self.speed * math.cos(self.angle * 2 * math.pi)
-        self.vertical_speed = self.speed * math.sin(self.angle * 2 * math.pi)
+        cls.mask_tests += 1
+        cls.mask_time += time.perf_counter() - start_time
+        return overlap is not None
 
-    def update(self):
-        """
-        Updates the state of the Bullet object.
 
-        Moves the bullet based on its horizontal and vertical speed. Checks for collisions with game objects in the World, removes the bullet and the collided object upon collision, and adds new tree objects if the object count is below 500. Decreases the bullet's survival time, and removes it if the survival time reaches zero.
+class ParticleEmitter:
+    SIZE_STEPS = 8
+    RENDER_SCALE = np.array((render.WIDTH_MULTIPLIER, render.HEIGHT_MULTIPLIER), dtype=np.float32)
+
+    def __init__(self, capacity, colors, radius, gravity = 0, drag = 0):
         """
-        self.pos[0] += self.horizontal_speed
-        self.pos[1] += self.vertical_speed
+        Initializes a ParticleEmitter, a fixed capacity pool of particles stored in NumPy arrays.
 
-        for game_object in World.objects:
-            if pygame.Rect(*game_object.game_pos, game_object.image.get_width() / render.WIDTH_MULTIPLIER, game_object.image.get_height() / render.HEIGHT_MULTIPLIER).collidepoint(self.pos):
-                Player.gun.bullets.remove(self)
-                World.objects.remove(game_object)
+        Live particles are packed at the start of the arrays, so integrating and displaying them never loops over particles in Python. Every color is pre-rendered at SIZE_STEPS sizes, and particles shrink through the sizes as they age.
 
-                if len(World.objects) < 500:
-                    World.add_object(Object(Sprite.Scenery.Foilage.Tree.frames[0], (random.randint(-100, 1500), random.randint(-100, 1500)), (60, 60)))
-                    World.add_object(Object(Sprite.Scenery.Foilage.Tree.frames[0], (random.randint(-100, 1500), random.randint(-100, 1500)), (60, 60)))
-                World.add_object(Object(Sprite.Scenery.Foilage.Tree.frames[0], (random.randint(-100, 1500), random.randint(-100, 1500)), (60, 60)))
-                return
+        The arrays are triple buffered. Emitting only writes past the live count of the current arrays, which the render thread never reads. Updates write a set of arrays which is neither the current one nor the one the render thread is displaying, then swap it in with the live count as one reference, so the render thread always displays one consistent set of particles however long a frame takes.
 
-        self.survival_time -= 1
-        if self.survival_time <= 0:
-            Player.gun.bullets.remove(self)
+        Args:
+            capacity (int): The maximum live particles. Particles emitted when full are dropped.
+            colors (list): The particle colors, as RGB or RGBA.
+            radius (float): The largest particle radius in game units.
+            gravity (float): The downwards acceleration in game units per second squared. Defaults to 0.
+            drag (float): The rate the speed decays at, per second. Defaults to 0.
+        """
+        self.capacity = int(capacity)
+        self.count = 0
+        self.gravity = gravity * SPT
+        # Decaying by the same factor every tick keeps the decay per second independent of the tick rate
+        self.drag = math.exp(-drag * SPT)
+
+        # Sets of (pos, vel, age, lifetime, color, size) arrays
+        self.buffers = [self.create_arrays() for _ in range(3)]
+        self.arrays = self.buffers[0]
+        # The live count and arrays, read by the render thread, and the arrays it is displaying
+        self.view = (0, self.arrays)
+        self.displayed_arrays = None
+        self.lock = threading.Lock()
+
+        self.color_count = len(colors)
+        self.sprites = []
+        sprite_offsets = []
+        for color in colors:
+            for step in range(self.SIZE_STEPS):
+                step_radius = radius * (step + 1) / self.SIZE_STEPS
+                sprite = pygame.Surface((max(round(step_radius * 2 * render.WIDTH_MULTIPLIER), 1), max(round(step_radius * 2 * render.HEIGHT_MULTIPLIER), 1)), pygame.SRCALPHA)
+                pygame.draw.ellipse(sprite, color, sprite.get_rect())
+                self.sprites.append(sprite.convert_alpha())
+                sprite_offsets.append((sprite.get_width() / 2, sprite.get_height() / 2))
+        self.sprite_offsets = np.array(sprite_offsets, dtype=np.float32)
+
+    def create_arrays(self):
+        """
+        Creates a set of particle arrays.
 
-    def display(self):
+        Returns:
+            tuple: A tuple containing the pos, vel, age, lifetime, color and size arrays.
+        """
+        return (np.zeros((self.capacity, 2), dtype=np.float32), np.zeros((self.capacity, 2), dtype=np.float32), np.zeros(self.capacity, dtype=np.float32),
+                np.ones(self.capacity, dtype=np.float32), np.zeros(self.capacity, dtype=np.uint8), np.zeros(self.capacity, dtype=np.float32))
+
+    def emit(self, pos, count, angle, spread, speed, lifetime, size = (0.5, 1)):
+        """
+        Emits particles flying out in a cone.
+
+        Args:
+            pos (tuple or numpy.ndarray): The game position, or an array with a game position per particle.
+            count (int): The number of particles, before the effect budget of the Governor is applied.
+            angle (float): The direction of the cone in radians.
+            spread (float): The width of the cone in radians, math.tau for every direction.
+            speed (tuple): The (min, max) speed in game units per second.
+            lifetime (tuple): The (min, max) lifetime in seconds.
+            size (tuple): The (min, max) size as a fraction of the emitter radius. Defaults to (0.5, 1).
+        """
+        start = self.count
+        count = min(round(count * Governor.effect_budget), self.capacity - start)
+        if count <= 0:
+            return
+
+        rng = Particles.rng
+        new = slice(start, start + count)
+        directions = angle + rng.uniform(-spread / 2, spread / 2, count)
+        speeds = rng.uniform(*speed, count)
+        particle_pos, vel, age, particle_lifetime, color, particle_size = self.arrays
+        particle_pos[new] = pos[:count] if np.ndim(pos) == 2 else pos
+        vel[new, 0] = np.cos(directions) * speeds
+        vel[new, 1] = np.sin(directions) * speeds
+        age[new] = 0
+        particle_lifetime[new] = rng.uniform(*lifetime, count)
+        color[new] = rng.integers(0, self.color_count, count)
+        particle_size[new] = rng.uniform(*size, count)
+        # The count is published last, so the render thread never displays a half written particle
+        self.count = start + count
+        self.view = (self.count, self.arrays)
+
+    def update(self):
+        """
+        Packs the surviving particles at the start of a free set of arrays, moves and ages them there, then swaps that set in.
+        """
+        count = self.count
+        if not count:
+            return
+
+        with self.lock:
+            # Of three sets, one is neither current nor displayed
+            back_arrays = next(arrays for arrays in self.buffers if arrays is not self.arrays and arrays is not self.displayed_arrays)
+
+        age, lifetime = self.arrays[2:4]
+        alive = age[:count] + np.float32(SPT) < lifetime[:count]
+        alive_count = int(np.count_nonzero(alive))
+        for array, back_array in zip(self.arrays, back_arrays):
+            np.compress(alive, array[:count], axis=0, out=back_array[:alive_count])
+
+        pos, vel, age = (array[:alive_count] for array in back_arrays[:3])
+        pos += vel * SPT
+        vel *= self.drag
+        vel[:, 1] += self.gravity
+        age += SPT
+
+        self.arrays = back_arrays
+        self.count = alive_count
+        self.view = (alive_count, back_arrays)
+
+    def display(self, layer = Render.EFFECTS_LAYER):
+        """
+        Displays the live particles on screen, queued as one batch for the layer blits call.
+
+        Args:
+            layer (int): The render layer. Defaults to Render.EFFECTS_LAYER.
+        """
+        # One read of the view, so every array matches the count, and the arrays are marked as displayed so updates leave them alone
+        with self.lock:
+            count, arrays = self.view
+            self.displayed_arrays = arrays
+        pos, vel, age, lifetime, color, size = arrays
+        if not count:
+            self.displayed_arrays = None
+            return
+
+        steps = (size[:count] * (1 - age[:count] / lifetime[:count]) * self.SIZE_STEPS).astype(np.intp)
+        sprite_indices = color[:count].astype(np.intp) * self.SIZE_STEPS + np.clip(steps, 0, self.SIZE_STEPS - 1)
+        positions = (pos[:count] - np.asarray(Player.game_pos, dtype=np.float32)) * self.RENDER_SCALE - self.sprite_offsets[sprite_indices]
+        # The rest only reads copies
+        self.displayed_arrays = None
+
+        on_screen = ((positions > -self.sprite_offsets[-1] * 2) & (positions < (render.DISPLAY_WIDTH, render.DISPLAY_HEIGHT))).all(axis=1)
+        sprites = self.sprites
+        render.blits(zip(map(sprites.__getitem__, sprite_indices[on_screen].tolist()), positions[on_screen].tolist()), layer=layer)
+
+
+class Particles:
+    rng = np.random.default_rng()
+
+    # The particle budget is split between the effects
+    flash = ParticleEmitter(settings["MaxParticles"] * 0.2, [Color.GOLD1, Color.DARKORANGE, Color.CADMIUMYELLOW, (255, 250, 220)], 7, drag=18)
+    sparks = ParticleEmitter(settings["MaxParticles"] * 0.3, [Color.DARKGOLDENROD1, Color.DARKGRAY, Color.BURNTSIENNA], 4, gravity=1000, drag=4.6)
+    leaves = ParticleEmitter(settings["MaxParticles"] * 0.5, [Color.FORESTGREEN, Color.DARKGREEN, Color.DARKOLIVEGREEN4, Color.BURNTSIENNA], 9, gravity=500, drag=6.7)
+    emitters = (flash, sparks, leaves)
+
+    @classmethod
+    def muzzle_flash(cls, pos, angle):
+        """
+        Emits a muzzle flash.
+
+        Args:
+            pos (tuple): The game position of the muzzle.
+            angle (float): The firing direction in radians.
+        """
+        cls.flash.emit(pos, 30, angle, 0.7, (200, 640), (0.06, 0.16))
+
+    @classmethod
+    def impact(cls, pos, angle):
+        """
+        Emits sparks where a bullet hit, bouncing back against its direction.
+
+        Args:
+            pos (tuple): The game position of the hit.
+            angle (float): The bullet direction in radians.
+        """
+        cls.sparks.emit(pos, 60, angle + math.pi, 2.2, (64, 450), (0.19, 0.47))
+
+    @classmethod
+    def tree_destroyed(cls, rect):
+        """
+        Emits leaves bursting out of a destroyed tree.
+
+        Args:
+            rect (pygame.Rect): The area of the tree in game units.
+        """
+        count = 400
+        positions = cls.rng.uniform(rect.topleft, rect.bottomright, (count, 2))
+        cls.leaves.emit(positions, count, 0, math.tau, (32, 320), (0.6, 1.4))
+
+    @classmethod
+    def update(cls):
+        """
+        Updates all particles.
+        """
+        for emitter in cls.emitters:
+            emitter.update()
+
+    @classmethod
+    def display(cls):
+        """
+        Displays all particles on the screen.
+        """
+        for emitter in cls.emitters:
+            emitter.display()
+
+
+class Bullet:
+    bullet_path = Sprite.Bullets.Flintlock
+    image_path = bullet_path.image
+    IMAGE = pygame.transform.smoothscale(image_path, (bullet_path.size[0] * render.WIDTH_MULTIPLIER, bullet_path.size[1] * render.HEIGHT_MULTIPLIER))
+    MASK = pygame.mask.from_surface(IMAGE)
+
+    def __init__(self, pos, angle, speed, survival_time):
+        """
+        Initializes a Bullet object with position, angle, speed, and survival time.
+
+        Args:
+            pos (tuple): A tuple containing the initial position (x, y).
+            angle (float): The angle of movement in radians.
+            speed (float): The speed of movement in game units per second.
+            survival_time (float): The time the bullet survives in seconds.
+        """
+        self.pos = pos
+        self.pos[0] += Player.game_pos[0]
+        self.pos[1] += Player.game_pos[1]
+        self.angle = angle * -1
+        self.speed = speed
+        self.survival_time = survival_time
+
+        # Calculate the perpendicular direction
+        perpendicular_angle = self.angle + 0.25
+        perpendicular_speed = -20
+
+        # Calculate the new position
+        self.pos[0] += perpendicular_speed * math.cos(perpendicular_angle * 2 * math.pi) * render.WIDTH_MULTIPLIER
+        self.pos[1] += perpendicular_speed * math.sin(perpendicular_angle * 2 * math.pi) * render.HEIGHT_MULTIPLIER
+
+        # Calculate the perpendicular direction
+        perpendicular_angle = self.angle + 0.5
+        perpendicular_speed = -20
+
+        # Calculate the new position
+        self.pos[0] += perpendicular_speed * math.cos(perpendicular_angle * 2 * math.pi) * render.WIDTH_MULTIPLIER
+        self.pos[1] += perpendicular_speed * math.sin(perpendicular_angle * 2 * math.pi) * render.HEIGHT_MULTIPLIER
+
+        # Calculate the horizontal and vertical components of speed
+        self.horizontal_speed = self.speed * math.cos(self.angle * 2 * math.pi)
+        self.vertical_speed = self.speed * math.sin(self.angle * 2 * math.pi)
+
+    def update(self):
+        """
+        Updates the state of the Bullet object.
+
+        Moves the bullet based on its horizontal and vertical speed. Checks for collisions with game objects in the World, removes the bullet and the collided object upon collision. Decreases the bullet's survival time, and removes it if the survival time reaches zero.
+        """
+        self.pos[0] += self.horizontal_speed * SPT
+        self.pos[1] += self.vertical_speed * SPT
+
+        for game_object in World.objects:
+            if Collision.hit(game_object, self.pos, self.MASK):
+                Player.gun.bullets.remove(self)
+                Particles.impact(self.pos, self.angle * 2 * math.pi)
+                # Online, trees are only destroyed by the server
+                if not Network.connected:
+                    World.remove_object(game_object)
+                return
+
+        self.survival_time -= SPT
+        if self.survival_time <= lakeserver.TIME_EPSILON:
+            Player.gun.bullets.remove(self)
+
+    def display(self):
         """
         Displays the bullet on the screen.
         """
-        render.blit(self.IMAGE, render.get_render_pos((self.pos[0] - Player.game_pos[0] - self.IMAGE.get_width() / 2, self.pos[1] - Player.game_pos[1] - self.IMAGE.get_height() / 2)))
+        render.blit(self.IMAGE, render.get_render_pos((self.pos[0] - Player.game_pos[0] - self.IMAGE.get_width() / 2, self.pos[1] - Player.game_pos[1] - self.IMAGE.get_height() / 2)), layer=render.EFFECTS_LAYER)
 
 
 class Gun:
@@ -685,11 +1525,16 @@ class Gun:
         Args:
             mousedown (tuple): A tuple representing mouse click states (left_click, middle_click, right_click).
         """
-        if self.cooldown <= 0 and mousedown[0]:
-            self.bullets.append(Bullet([self.pos[0] - 2, self.pos[1]], self.angle, 15, 128))
-            self.cooldown = 10
-        else:
-            self.cooldown -= 1
+        if self.cooldown > 0:
+            self.cooldown -= SPT
+        if self.cooldown <= lakeserver.TIME_EPSILON and mousedown[0]:
+            bullet = Bullet([self.pos[0] - 2, self.pos[1]], self.angle, lakeserver.BULLET_SPEED, lakeserver.BULLET_SURVIVAL_TIME)
+            self.bullets.append(bullet)
+            Particles.muzzle_flash(bullet.pos, bullet.angle * 2 * math.pi)
+            # The remainder carries over to the next shot, so the fire rate does not depend on the tick rate
+            self.cooldown += lakeserver.GUN_COOLDOWN
+        elif self.cooldown < 0:
+            self.cooldown = 0
 
     def update_bullets(self):
         """
@@ -728,7 +1573,7 @@ class Gun:
 
     def display(self):
         """
-        Displays the gun and bullets on the screen.
+        Displays the gun on the screen.
         """
         if self.angle != self.prev_angle or True:
             self.prev_angle = self.angle
@@ -739,102 +1584,859 @@ class Gun:
         pos[0] -= self.pos_offset[0]
         pos[1] -= self.pos_offset[1]
 
-        self.display_bullets()
-        render.blit(self.display_image, render.get_render_pos(pos))
+        render.blit(self.display_image, render.get_render_pos(pos), layer=render.WORLD_LAYER)
+
+
+class Player:
+    game_pos = [0, 0]
+    render_pos = render.get_render_pos([GAME_WIDTH/2 - Sprite.Player.Body.frames[0].get_width() / 2 / render.WIDTH_MULTIPLIER, GAME_HEIGHT/2 - Sprite.Player.Body.frames[0].get_height() / 2 / render.HEIGHT_MULTIPLIER])
+    base_speed = lakeserver.PLAYER_SPEED * settings["SpeedMultiplier"]
+    buttons = 0
+    hands = {"left":Hand(-0.5), "right":Hand(0.5)}
+    gun = Gun(0, Sprite.Guns.Flintlock)
+    current_frame = 0
+    last_frame_time = pygame.time.get_ticks()
+
+    @classmethod
+    def update(cls, mouse_pos, mouse_down, keys_pressed: pygame.key.ScancodeWrapper, movement_arrows):
+        """
+        Updates the player's state and handles movement.
+
+        Calculates the player's input buttons based on keyboard input, arrow keys and the mouse, and moves the player with them. Also updates the render positions of the player's hands and the gun.
+
+        Args:
+            mouse_pos (tuple): Current mouse position relative to the screen.
+            mouse_down (tuple): Current mouse button states.
+            keys_pressed (pygame.key.ScancodeWrapper): Current keyboard button states.
+            movement_arrows (dict): A dictionary containing arrow key states ("up", "down", "left", "right") as a bool.
+        """
+        # Input buttons, also sent to the server when playing online
+        buttons = 0
+        if keys_pressed[pygame.K_w] or movement_arrows["up"]:
+            buttons |= lakeserver.UP
+        if keys_pressed[pygame.K_a] or movement_arrows["left"]:
+            buttons |= lakeserver.LEFT
+        if keys_pressed[pygame.K_s] or movement_arrows["down"]:
+            buttons |= lakeserver.DOWN
+        if keys_pressed[pygame.K_d] or movement_arrows["right"]:
+            buttons |= lakeserver.RIGHT
+        if mouse_down[0]:
+            buttons |= lakeserver.FIRE
+        cls.buttons = buttons
+
+        # Movement is shared with the server, so predicted and authoritative positions match
+        cls.game_pos = lakeserver.move_player(cls.game_pos, buttons, cls.base_speed, SPT)
+
+        cls.hands["left"].update(mouse_pos)
+        cls.hands["right"].update(mouse_pos)
+        cls.gun.update(mouse_pos, mouse_down)
+
+    @classmethod
+    def get_depth(cls):
+        """
+        Returns the depth of the player, the game y position of its feet. Objects with a higher depth are displayed in front.
+
+        Returns:
+            float: The depth of the player.
+        """
+        return cls.game_pos[1] + GAME_HEIGHT / 2 + Sprite.Player.Body.size[1] / 2
+
+    @classmethod
+    def get_rect(cls):
+        """
+        Returns the area covered by the player, including its hands and gun.
+
+        Returns:
+            pygame.Rect: The player area in game units.
+        """
+        rect = pygame.Rect(0, 0, Sprite.Player.Body.size[0] * 2.5, Sprite.Player.Body.size[1] * 2.5)
+        rect.center = (cls.game_pos[0] + GAME_WIDTH / 2, cls.game_pos[1] + GAME_HEIGHT / 2)
+        return rect
+
+    @classmethod
+    def display(cls):
+        """
+        Displays the player, gun and hands on the screen.
+        """
+        cls.gun.display()
+        cls.hands["left"].display()
+        cls.hands["right"].display()
+
+        current_time = pygame.time.get_ticks()
+        if current_time - cls.last_frame_time >= Sprite.Player.Body.frame_interval:
+            cls.last_frame_time = current_time
+            cls.current_frame = (cls.current_frame + 1) % len(Sprite.Player.Body.frames)
+        render.blit(Sprite.Player.Body.frames[cls.current_frame], cls.render_pos, layer=render.WORLD_LAYER)
+
+
+class Object:
+    scaled_images = {}
+
+    def __init__(self, image, game_pos, size = None):
+        """
+        Initializes an Object with its game position and image.
+
+        Args:
+            self: The instance of the Object being initialized.
+            game_pos (tuple): The game position of the object.
+            image (pygame.Surface): The image of the object.
+            size (tuple, optional): The size of the image after scaling (width, height). Defaults to None.
+        """
+        self.image, self.mask = self.load_scaled_image(image, size)
+        self.source = (image, size)
+        self.game_pos = game_pos
+        self.rect = pygame.Rect(*game_pos, self.image.get_width() / render.WIDTH_MULTIPLIER, self.image.get_height() / render.HEIGHT_MULTIPLIER)
+
+    @classmethod
+    def load_scaled_image(cls, image, size = None):
+        """
+        Returns the scaled image and its collision mask. Each unique image and size is only scaled and masked once, then cached.
+
+        Args:
+            image (pygame.Surface): The source image.
+            size (tuple, optional): The size of the image after scaling (width, height). Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the scaled pygame.Surface and its pygame.mask.Mask.
+        """
+        key = (id(image), tuple(size) if size else None)
+        if key not in cls.scaled_images:
+            if size:
+                scaled_image = pygame.transform.smoothscale(image, (size[0] * render.WIDTH_MULTIPLIER, size[1] * render.HEIGHT_MULTIPLIER))
+            else:
+                scaled_image = image
+            cls.scaled_images[key] = (scaled_image, pygame.mask.from_surface(scaled_image))
+        return cls.scaled_images[key]
+
+    def update(self):
+        """
+        Updates and displays the Object.
+        """
+        self.display()
+
+    def display(self, layer = Render.WORLD_LAYER):
+        """
+        Displays the Object on the screen.
+
+        Args:
+            layer (int): The render layer to display the Object on. Defaults to Render.WORLD_LAYER.
+        """
+        render.blit(self.image, render.get_render_pos((self.game_pos[0] - Player.game_pos[0], self.game_pos[1] - Player.game_pos[1])), layer=layer)
+
+
+class Chunk:
+    SIZE = 1000
+
+    def __init__(self, coords, seed, stored_objects = None):
+        """
+        Initializes a Chunk, a square area of the world containing objects. New chunks are generated from the world seed.
+
+        Args:
+            coords (tuple): The chunk grid coordinates (x, y).
+            seed (int): The world seed.
+            stored_objects (list, optional): Serialized objects from a previously unloaded chunk, as returned by serialize. Defaults to None.
+        """
+        self.coords = coords
+        self.objects = []
+        # Occluder rectangles of the objects, built by Lighting when first needed
+        self.occluders = None
+        # Only chunks that differ from a freshly generated chunk need to be stored when unloaded
+        self.modified = stored_objects is not None
+
+        if stored_objects is not None:
+            for image, game_pos, size in stored_objects:
+                self.objects.append(Object(image, game_pos, size))
+        else:
+            for x, y, size in worldgen.generate_foliage(seed, coords, self.SIZE).tolist():
+                if (x, y) not in World.destroyed_trees:
+                    self.objects.append(Object(Sprite.Scenery.Foilage.Tree.frames[0], (x, y), (size, size)))
+
+    @classmethod
+    def get_coords(cls, pos):
+        """
+        Returns the coordinates of the chunk containing a game position.
+
+        Args:
+            pos (tuple): The game position.
+
+        Returns:
+            tuple: The chunk grid coordinates (x, y).
+        """
+        return (math.floor(pos[0] / cls.SIZE), math.floor(pos[1] / cls.SIZE))
+
+    def add_object(self, object):
+        """
+        Adds an object to the chunk.
+
+        Args:
+            object (Object): A Object instance to be added.
+        """
+        self.objects.append(object)
+        self.modified = True
+        self.occluders = None
+
+    def remove_object(self, object):
+        """
+        Removes an object from the chunk.
+
+        Args:
+            object (Object): A Object instance to be removed.
+        """
+        self.objects.remove(object)
+        self.modified = True
+        self.occluders = None
+
+    def serialize(self):
+        """
+        Returns the chunk objects in a lightweight form without any scaled surfaces, used to store the chunk when unloaded.
+
+        Returns:
+            list: A list of tuples containing the source image, game position and size of each object.
+        """
+        return [(object.source[0], object.game_pos, object.source[1]) for object in self.objects]
+
+
+class DepthIndex:
+    def __init__(self):
+        """
+        Initializes a DepthIndex, a list of entries kept sorted by depth so the draw order never needs a full sort.
+
+        Entries are (depth, sequence, item) tuples. The unique sequence number keeps entries with the same depth in insertion order, and means items are never compared.
+        """
+        self.entries = []
+        self.sequence = itertools.count()
+
+    def insert(self, depth, item):
+        """
+        Inserts an item at its sorted position.
+
+        Args:
+            depth (float): The depth of the item.
+            item (object): The item to be inserted.
+
+        Returns:
+            tuple: The entry of the item, used to move or remove it.
+        """
+        entry = (depth, next(self.sequence), item)
+        bisect.insort(self.entries, entry)
+        return entry
+
+    def remove(self, entry):
+        """
+        Removes an entry.
+
+        Args:
+            entry (tuple): The entry returned when the item was inserted.
+        """
+        del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def move(self, entry, depth):
+        """
+        Moves an entry to a new depth. Only moving items need to be moved, static items keep their position.
+
+        Args:
+            entry (tuple): The entry returned when the item was inserted.
+            depth (float): The new depth of the item.
+
+        Returns:
+            tuple: The new entry of the item.
+        """
+        if entry[0] == depth:
+            return entry
+        self.remove(entry)
+        return self.insert(depth, entry[2])
+
+    def get_range(self, start_depth, end_depth):
+        """
+        Returns the entries between two depths, in depth order.
+
+        Args:
+            start_depth (float): The lowest depth, inclusive.
+            end_depth (float): The highest depth, inclusive.
+
+        Returns:
+            list: The entries in the range.
+        """
+        entries = self.entries
+        return entries[bisect.bisect_left(entries, (start_depth,)):bisect.bisect_right(entries, (end_depth, math.inf))]
+
+
+class StaticLayer:
+    TILE_SIZE = Chunk.SIZE
+    GROUND_COLOR = Render.BACKGROUND_COLOR
+
+    tiles = {}
+    versions = {}
+    requested_versions = {}
+    bake_queue = queue.Queue()
+    baker_thread = None
+
+    @classmethod
+    def get_tile_rect(cls, coords):
+        """
+        Returns the game area covered by a tile.
+
+        Args:
+            coords (tuple): The tile grid coordinates (x, y).
+
+        Returns:
+            pygame.Rect: The tile area in game units.
+        """
+        return pygame.Rect(coords[0] * cls.TILE_SIZE, coords[1] * cls.TILE_SIZE, cls.TILE_SIZE, cls.TILE_SIZE)
+
+    @classmethod
+    def invalidate(cls, rect):
+        """
+        Marks all tiles overlapping an area as changed, so they are baked again.
+
+        Args:
+            rect (pygame.Rect): The changed area in game units.
+        """
+        for x in range(math.floor(rect.left / cls.TILE_SIZE), math.floor((rect.right - 1) / cls.TILE_SIZE) + 1):
+            for y in range(math.floor(rect.top / cls.TILE_SIZE), math.floor((rect.bottom - 1) / cls.TILE_SIZE) + 1):
+                cls.versions[(x, y)] = cls.versions.get((x, y), 0) + 1
+
+    @classmethod
+    def bake(cls, coords, objects):
+        """
+        Composites the ground and all objects overlapping a tile into one surface.
+
+        Args:
+            coords (tuple): The tile grid coordinates (x, y).
+            objects (list): The objects overlapping the tile.
+
+        Returns:
+            pygame.Surface: The baked tile.
+        """
+        tile_origin = (coords[0] * cls.TILE_SIZE, coords[1] * cls.TILE_SIZE)
+        # One extra pixel overlaps the next tile, hiding rounding seams
+        surface = pygame.Surface((math.ceil(cls.TILE_SIZE * render.WIDTH_MULTIPLIER) + 1, math.ceil(cls.TILE_SIZE * render.HEIGHT_MULTIPLIER) + 1)).convert()
+        surface.fill(cls.GROUND_COLOR)
+
+        for object in objects:
+            surface.blit(object.image, (round((object.game_pos[0] - tile_origin[0]) * render.WIDTH_MULTIPLIER), round((object.game_pos[1] - tile_origin[1]) * render.HEIGHT_MULTIPLIER)))
+        return surface
+
+    @classmethod
+    def tile_baker(cls):
+        """
+        Tile baking loop, run on its own thread so the render loop never waits on a bake.
+        """
+        while True:
+            coords, version, objects = cls.bake_queue.get()
+            cls.tiles[coords] = (version, cls.bake(coords, objects))
+
+    @classmethod
+    def display(cls, objects):
+        """
+        Displays the tiles overlapping the screen.
+
+        Tiles which are missing or changed are requested from the baker thread, their objects are displayed individually until the bake is done.
+
+        Args:
+            objects (list): All loaded objects.
+        """
+        if cls.baker_thread is None:
+            cls.baker_thread = threading.Thread(target=cls.tile_baker, daemon=True)
+            cls.baker_thread.start()
+
+        camera_pos = Player.game_pos
+        first_tile = (math.floor(camera_pos[0] / cls.TILE_SIZE), math.floor(camera_pos[1] / cls.TILE_SIZE))
+        last_tile = (math.floor((camera_pos[0] + GAME_WIDTH) / cls.TILE_SIZE), math.floor((camera_pos[1] + GAME_HEIGHT) / cls.TILE_SIZE))
+
+        unbaked_rects = []
+        for x in range(first_tile[0], last_tile[0] + 1):
+            for y in range(first_tile[1], last_tile[1] + 1):
+                coords = (x, y)
+                version = cls.versions.get(coords, 0)
+                tile = cls.tiles.get(coords)
+
+                if tile and tile[0] == version:
+                    render.blit(tile[1], render.get_render_pos((x * cls.TILE_SIZE - camera_pos[0], y * cls.TILE_SIZE - camera_pos[1])), layer=render.GROUND_LAYER)
+                    continue
+
+                tile_rect = cls.get_tile_rect(coords)
+                unbaked_rects.append(tile_rect)
+                if cls.requested_versions.get(coords) != version:
+                    cls.requested_versions[coords] = version
+                    cls.bake_queue.put((coords, version, [object for object in objects if tile_rect.colliderect(object.rect)]))
+
+        if unbaked_rects:
+            for object in objects:
+                if object.rect.collidelist(unbaked_rects) != -1:
+                    object.display(render.GROUND_LAYER)
+
+        # Free tiles which are far off screen
+        for coords in list(cls.tiles):
+            if not (first_tile[0] - 1 <= coords[0] <= last_tile[0] + 1 and first_tile[1] - 1 <= coords[1] <= last_tile[1] + 1):
+                del cls.tiles[coords]
+                cls.requested_versions.pop(coords, None)
+
+
+class Lighting:
+    OCCLUDER_SCALE = 0.35      # Fraction of an object size which blocks sight, the trunk and dense canopy of a tree
+    VIEW_MARGIN = 50           # Game units around the screen the visibility polygon extends to
+    CORNER_OFFSET = 0.0005     # Radians rays are cast either side of each occluder corner
+    SHADOW_COLOR = (0, 0, 0, 150)
+
+    polygon = None
+    overlay = None
+
+    @classmethod
+    def get_occluders(cls, chunk):
+        """
+        Returns the occluder rectangles of a chunk. They are built once and cached on the chunk until its objects change.
+
+        Args:
+            chunk (Chunk): The chunk.
+
+        Returns:
+            numpy.ndarray: A float array with a row (left, top, right, bottom) per object, in game units.
+        """
+        if chunk.occluders is None:
+            rects = np.array([tuple(object.rect) for object in chunk.objects], dtype=np.float64).reshape(-1, 4)
+            centers = rects[:, :2] + rects[:, 2:] / 2
+            half_sizes = rects[:, 2:] * cls.OCCLUDER_SCALE / 2
+            chunk.occluders = np.hstack((centers - half_sizes, centers + half_sizes))
+        return chunk.occluders
+
+    @classmethod
+    def get_dynamic_occluders(cls):
+        """
+        Returns the occluder rectangles of moving entities, built again every tick.
+
+        Returns:
+            numpy.ndarray: A float array with a row (left, top, right, bottom) per entity, in game units.
+        """
+        rects = [remote_player.get_body_rect() for remote_player in Network.remote_players.values()]
+        return np.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in rects], dtype=np.float64).reshape(-1, 4)
+
+    @classmethod
+    def compute_polygon(cls, origin, view, occluders):
+        """
+        Computes the visibility polygon from a point with an angular sweep. Rays are cast just either side of every occluder corner and at the view corners, and all rays are intersected with all occluder edges at once.
+
+        Args:
+            origin (tuple): The game position sight is cast from.
+            view (tuple): The (left, top, right, bottom) area the polygon is limited to, containing the origin.
+            occluders (numpy.ndarray): A float array with a row (left, top, right, bottom) per occluder.
+
+        Returns:
+            numpy.ndarray: A float array with a row (x, y) per polygon vertex, in game units, ordered by angle.
+        """
+        origin_x, origin_y = origin
+        left, top, right, bottom = occluders.T
+        view_left, view_top, view_right, view_bottom = view
+
+        # Only edges facing the origin can block sight, occluders around the origin block nothing
+        edges = [np.column_stack((x1, y1, x2, y2))[mask] for x1, y1, x2, y2, mask in (
+            (left, top, left, bottom, origin_x < left),
+            (right, top, right, bottom, origin_x > right),
+            (left, top, right, top, origin_y < top),
+            (left, bottom, right, bottom, origin_y > bottom))]
+        edges.append(np.array([(view_left, view_top, view_right, view_top), (view_right, view_top, view_right, view_bottom),
+                               (view_right, view_bottom, view_left, view_bottom), (view_left, view_bottom, view_left, view_top)], dtype=np.float64))
+        edges = np.concatenate(edges)
+
+        corners = np.concatenate((np.column_stack((np.concatenate((left, right, left, right)), np.concatenate((top, top, bottom, bottom)))), edges[-4:, :2]))
+        corner_angles = np.arctan2(corners[:, 1] - origin_y, corners[:, 0] - origin_x)
+        angles = np.sort(np.concatenate((corner_angles - cls.CORNER_OFFSET, corner_angles, corner_angles + cls.CORNER_OFFSET)))
+        directions_x = np.cos(angles)[:, None]
+        directions_y = np.sin(angles)[:, None]
+
+        # Ray origin + distance * direction meets edge start + t * edge vector
+        start_x = edges[:, 0] - origin_x
+        start_y = edges[:, 1] - origin_y
+        edge_x = edges[:, 2] - edges[:, 0]
+        edge_y = edges[:, 3] - edges[:, 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denominator = directions_x * edge_y - directions_y * edge_x
+            distance = (start_x * edge_y - start_y * edge_x) / denominator
+            t = (start_x * directions_y - start_y * directions_x) / denominator
+            # Rays at an exact corner may miss both edges by a rounding error, so edges are extended by a tiny tolerance
+            distance = np.where((distance > 0) & (t >= -1e-9) & (t <= 1 + 1e-9), distance, np.inf).min(axis=1)
+
+        return np.column_stack((origin_x + directions_x[:, 0] * distance, origin_y + directions_y[:, 0] * distance))
+
+    @classmethod
+    def update(cls):
+        """
+        Computes the visibility polygon of the player against the occluders near the screen.
+        """
+        if not settings["ShadowCasting"]:
+            cls.polygon = None
+            return
+
+        view = (Player.game_pos[0] - cls.VIEW_MARGIN, Player.game_pos[1] - cls.VIEW_MARGIN,
+                Player.game_pos[0] + GAME_WIDTH + cls.VIEW_MARGIN, Player.game_pos[1] + GAME_HEIGHT + cls.VIEW_MARGIN)
+        view_rect = pygame.Rect(view[0], view[1], view[2] - view[0], view[3] - view[1]).inflate(World.max_object_height * 2, World.max_object_height * 2)
+        occluders = [cls.get_occluders(chunk) for coords, chunk in World.chunks.items() if view_rect.colliderect(StaticLayer.get_tile_rect(coords))]
+        occluders.append(cls.get_dynamic_occluders())
+        occluders = np.concatenate(occluders)
+        occluders = occluders[(occluders[:, 0] < view[2]) & (occluders[:, 2] > view[0]) & (occluders[:, 1] < view[3]) & (occluders[:, 3] > view[1])]
+
+        cls.polygon = cls.compute_polygon(World.get_center_pos(), view, occluders)
+
+    @classmethod
+    def display(cls):
+        """
+        Displays the darkness outside the visibility polygon on the screen.
+        """
+        polygon = cls.polygon
+        if polygon is None:
+            return
+
+        # The overlay is redrawn every frame, so it is drawn straight at the internal render scale
+        render_size = render.get_render_size()
+        if cls.overlay is None or cls.overlay.get_size() != render_size:
+            cls.overlay = pygame.Surface(render_size, pygame.SRCALPHA)
+        cls.overlay.fill(cls.SHADOW_COLOR)
+        # Drawing on an alpha surface replaces the pixels, cutting the visible area out of the darkness
+        pygame.draw.polygon(cls.overlay, (0, 0, 0, 0), ((polygon - Player.game_pos) * ParticleEmitter.RENDER_SCALE * render.render_scale).tolist())
+        render.add_scaled_image(cls.overlay)
+        render.blit(cls.overlay, (0, 0), layer=render.EFFECTS_LAYER)
+
+
+class Fog:
+    CELL_SIZE = 50             # Game units per explored cell
+    CELLS = Chunk.SIZE // CELL_SIZE
+    REVEAL_RADIUS = 700        # Game units around the player which are explored
+    WINDOW_RADIUS = 2          # Chunks around the player kept on the fog surface, enough to cover the screen
+    FOG_ALPHA = 235
+
+    # Explored cells of every visited chunk, 1 if explored, indexed [row, column]
+    grids = {}
+    changes = queue.Queue()
+    last_cell = None
+    CELL_CENTERS = (np.arange(CELLS) + 0.5) * CELL_SIZE
+
+    # Render thread state, a surface with a pixel per cell around window_chunk and its scaled visible area
+    surface = None
+    window_chunk = None
+    rebuild = False
+    version = 0
+    scaled = None
+    scaled_key = None
+
+    @classmethod
+    def update(cls, center_pos):
+        """
+        Explores the cells around the player. Nothing is done while the player stays in the same cell, and only cells which were not explored before are sent to the render thread.
+
+        Args:
+            center_pos (tuple): The game position of the player center.
+        """
+        if not settings["FogOfWar"]:
+            return
+        cell = (math.floor(center_pos[0] / cls.CELL_SIZE), math.floor(center_pos[1] / cls.CELL_SIZE))
+        if cell == cls.last_cell:
+            return
+        cls.last_cell = cell
+
+        radius = cls.REVEAL_RADIUS
+        first_chunk = Chunk.get_coords((center_pos[0] - radius, center_pos[1] - radius))
+        last_chunk = Chunk.get_coords((center_pos[0] + radius, center_pos[1] + radius))
+        for chunk_x in range(first_chunk[0], last_chunk[0] + 1):
+            for chunk_y in range(first_chunk[1], last_chunk[1] + 1):
+                offsets_x = cls.CELL_CENTERS + (chunk_x * Chunk.SIZE - center_pos[0])
+                offsets_y = cls.CELL_CENTERS + (chunk_y * Chunk.SIZE - center_pos[1])
+                revealed = offsets_x[None, :] ** 2 + offsets_y[:, None] ** 2 <= radius * radius
+
+                grid = cls.grids.get((chunk_x, chunk_y))
+                if grid is None:
+                    grid = cls.grids[(chunk_x, chunk_y)] = np.zeros((cls.CELLS, cls.CELLS), dtype=np.uint8)
+                explored = revealed & (grid == 0)
+                if not explored.any():
+                    continue
+                grid[revealed] = 1
+
+                rows = np.flatnonzero(explored.any(axis=1))
+                columns = np.flatnonzero(explored.any(axis=0))
+                cls.changes.put(((chunk_x, chunk_y), rows[0], rows[-1] + 1, columns[0], columns[-1] + 1))
+
+    @classmethod
+    def write_cells(cls, alpha, coords, rows, columns):
+        """
+        Writes the cells of a chunk into the alpha of the fog surface.
+
+        Args:
+            alpha (numpy.ndarray): The surface alpha array, indexed [x, y].
+            coords (tuple): The chunk grid coordinates (x, y).
+            rows (slice): The cell rows to write.
+            columns (slice): The cell columns to write.
+        """
+        window_x = (coords[0] - cls.window_chunk[0] + cls.WINDOW_RADIUS) * cls.CELLS
+        window_y = (coords[1] - cls.window_chunk[1] + cls.WINDOW_RADIUS) * cls.CELLS
+        if not (0 <= window_x < alpha.shape[0] and 0 <= window_y < alpha.shape[1]):
+            return
+        grid = cls.grids.get(coords)
+        cells = grid[rows, columns].T if grid is not None else 0
+        alpha[window_x + columns.start:window_x + columns.stop, window_y + rows.start:window_y + rows.stop] = np.where(cells, 0, cls.FOG_ALPHA)
+
+    @classmethod
+    def refresh(cls):
+        """
+        Applies the explored cells to the fog surface. The whole surface is only written when the player enters a new chunk and the window moves, otherwise only the changed cells are.
+        """
+        window_chunk = Chunk.get_coords(World.get_center_pos())
+        if cls.surface is None:
+            size = (cls.WINDOW_RADIUS * 2 + 1) * cls.CELLS
+            cls.surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            cls.surface.fill((0, 0, 0, cls.FOG_ALPHA))
+
+        if window_chunk != cls.window_chunk or cls.rebuild:
+            cls.window_chunk = window_chunk
+            cls.rebuild = False
+            # The grids already hold every change, so the waiting changes are dropped
+            while not cls.changes.empty():
+                cls.changes.get()
+            changes = [((window_chunk[0] + x, window_chunk[1] + y), 0, cls.CELLS, 0, cls.CELLS) for x in range(-cls.WINDOW_RADIUS, cls.WINDOW_RADIUS + 1) for y in range(-cls.WINDOW_RADIUS, cls.WINDOW_RADIUS + 1)]
+        else:
+            changes = []
+            while not cls.changes.empty():
+                changes.append(cls.changes.get())
+            if not changes:
+                return
+
+        alpha = pygame.surfarray.pixels_alpha(cls.surface)
+        for coords, first_row, last_row, first_column, last_column in changes:
+            cls.write_cells(alpha, coords, slice(first_row, last_row), slice(first_column, last_column))
+        # The pixel array locks the surface until deleted
+        del alpha
+        cls.version += 1
+
+    @classmethod
+    def display(cls):
+        """
+        Displays the fog over the unexplored cells on the screen. The visible cells are scaled to the screen once, and scaled again only when cells change or the screen moves into new cells.
+        """
+        if not settings["FogOfWar"]:
+            return
+        cls.refresh()
+
+        camera_pos = Player.game_pos
+        # One extra cell on each side keeps the smoothed edges off screen
+        first_cell = (math.floor(camera_pos[0] / cls.CELL_SIZE) - 1, math.floor(camera_pos[1] / cls.CELL_SIZE) - 1)
+        key = (first_cell, cls.window_chunk, cls.version)
+        if key != cls.scaled_key:
+            cls.scaled_key = key
+            cell_count = (GAME_WIDTH // cls.CELL_SIZE + 3, GAME_HEIGHT // cls.CELL_SIZE + 3)
+            window_origin = ((cls.window_chunk[0] - cls.WINDOW_RADIUS) * cls.CELLS, (cls.window_chunk[1] - cls.WINDOW_RADIUS) * cls.CELLS)
+            area = pygame.Rect(first_cell[0] - window_origin[0], first_cell[1] - window_origin[1], *cell_count).clip(cls.surface.get_rect())
+            cls.scaled = pygame.transform.smoothscale(cls.surface.subsurface(area), render.get_render_pos((area.width * cls.CELL_SIZE, area.height * cls.CELL_SIZE)))
+            cls.scaled_pos = ((area.x + window_origin[0]) * cls.CELL_SIZE, (area.y + window_origin[1]) * cls.CELL_SIZE)
+
+        render.blit(cls.scaled, render.get_render_pos((cls.scaled_pos[0] - camera_pos[0], cls.scaled_pos[1] - camera_pos[1])), layer=render.EFFECTS_LAYER)
+
+    @classmethod
+    def serialize(cls):
+        """
+        Returns the explored cells in a compact form, to be stored with a save game.
+
+        Returns:
+            dict: The explored cells of each visited chunk as packed bits, by chunk grid coordinates.
+        """
+        return {coords: np.packbits(grid).tobytes() for coords, grid in list(cls.grids.items())}
 
+    @classmethod
+    def load(cls, stored_grids):
+        """
+        Replaces the explored cells with stored ones, as returned by serialize.
 
-class Player:
-    game_pos = [0, 0]
-    render_pos = render.get_render_pos([GAME_WIDTH/2 - Sprite.Player.Body.frames[0].get_width() / 2 / render.WIDTH_MULTIPLIER, GAME_HEIGHT/2 - Sprite.Player.Body.frames[0].get_height() / 2 / render.HEIGHT_MULTIPLIER])
-    base_speed = 6 * settings["SpeedMultiplier"]
-    hands = {"left":Hand(-0.5), "right":Hand(0.5)}
-    gun = Gun(0, Sprite.Guns.Flintlock)
-    current_frame = 0
-    last_frame_time = pygame.time.get_ticks()
+        Args:
+            stored_grids (dict): The packed explored cells by chunk grid coordinates.
+        """
+        cls.grids = {coords: np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=cls.CELLS * cls.CELLS).reshape(cls.CELLS, cls.CELLS) for coords, data in stored_grids.items()}
+        cls.last_cell = None
+        # The render thread writes the whole surface again
+        cls.rebuild = True
+
+
+class Minimap:
+    VIEW_SIZE = 4000           # Game units shown across the minimap
+    SIZE = 300                 # Game units the minimap covers on screen
+    MARGIN = 20                # Game units between the minimap and the screen corner
+    WINDOW_RADIUS = 2          # Chunks around the player kept drawn on the minimap surface, enough to cover the view
+    TREE_SCALE = 0.5           # Fraction of a tree size drawn on the minimap
+    MARKER_RADIUS = 2          # Pixels
+
+    GROUND_COLOR = Color.DARKSEAGREEN4
+    TREE_COLOR = Color.DARKGREEN
+    PLAYER_COLOR = Color.RED1
+    REMOTE_PLAYER_COLOR = Color.GOLD1
+    FRAME_COLOR = Color.BLACK
+
+    # Game units per minimap pixel
+    PIXEL_SIZE = VIEW_SIZE / (SIZE * render.WIDTH_MULTIPLIER)
+    WINDOW_PIXELS = math.ceil((WINDOW_RADIUS * 2 + 1) * Chunk.SIZE / PIXEL_SIZE)
+
+    # Objects added and removed since the last update, as (game center, game radius, added)
+    changes = queue.Queue()
+    rebuild = False
+    disc_offsets = {}
+
+    # Render thread state, the minimap surface around window_chunk, its background without markers, and the marker pixels
+    surface = None
+    background = None
+    window_chunk = None
+    marker_pixels = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+    last_update_time = 0
+    frame = None
 
     @classmethod
-    def update(cls, mouse_pos, mouse_down, keys_pressed: pygame.key.ScancodeWrapper, movement_arrows):
+    def add_object(cls, object):
         """
-        Updates the player's state and handles movement.
-
-        Calculates the player's movement vector based on keyboard input and arrow keys. Normalizes the movement vector if it's diagonal. Updates the player's position accordingly. Also updates the render positions of the player's hands and the gun.
+        Queues an object added to the World to be drawn on the minimap.
 
         Args:
-            mouse_pos (tuple): Current mouse position relative to the screen.
-            mouse_down (tuple): Current mouse button states.
-            keys_pressed (pygame.key.ScancodeWrapper): Current keyboard button states.
-            movement_arrows (dict): A dictionary containing arrow key states ("up", "down", "left", "right") as a bool.
+            object (Object): The object.
         """
-        # Calculate the player's movement vector
-        move_vector = [0, 0]
-        if keys_pressed[pygame.K_w] or movement_arrows["up"]:
-            move_vector[1] -= cls.base_speed
-        if keys_pressed[pygame.K_a] or movement_arrows["left"]:
-            move_vector[0] -= cls.base_speed
-        if keys_pressed[pygame.K_s] or movement_arrows["down"]:
-            move_vector[1] += cls.base_speed
-        if keys_pressed[pygame.K_d] or movement_arrows["right"]:
-            move_vector[0] += cls.base_speed
+        cls.changes.put((object.rect.center, object.rect.width * cls.TREE_SCALE / 2, True))
 
-        # Normalize the movement vector if it is diagonal
-        if move_vector[0] != 0 and move_vector[1] != 0:
-            move_vector = [x / math.sqrt(2) for x in move_vector]
-        
-        cls.game_pos = (cls.game_pos[0] + move_vector[0], cls.game_pos[1] + move_vector[1])
+    @classmethod
+    def remove_object(cls, object):
+        """
+        Queues an object removed from the World to be erased from the minimap.
 
-        cls.hands["left"].update(mouse_pos)
-        cls.hands["right"].update(mouse_pos)
-        cls.gun.update(mouse_pos, mouse_down)
+        Args:
+            object (Object): The object.
+        """
+        cls.changes.put((object.rect.center, object.rect.width * cls.TREE_SCALE / 2, False))
 
     @classmethod
-    def display(cls):
+    def get_disc_offsets(cls, radius):
         """
-        Displays the player and hands on the screen.
-        """
-        cls.gun.display()
-        cls.hands["left"].display()
-        cls.hands["right"].display()
+        Returns the pixel offsets of a disc. Each radius is only built once, then cached.
 
-        current_time = pygame.time.get_ticks()
-        if current_time - cls.last_frame_time >= Sprite.Player.Body.frame_interval:
-            cls.last_frame_time = current_time
-            cls.current_frame = (cls.current_frame + 1) % len(Sprite.Player.Body.frames)
-        render.blit(Sprite.Player.Body.frames[cls.current_frame], cls.render_pos)
+        Args:
+            radius (int): The disc radius in pixels.
 
+        Returns:
+            tuple: A tuple containing the x and y offset arrays.
+        """
+        if radius not in cls.disc_offsets:
+            offsets = np.arange(-radius, radius + 1)
+            offsets_x, offsets_y = np.meshgrid(offsets, offsets, indexing="ij")
+            inside = offsets_x ** 2 + offsets_y ** 2 <= radius * radius + radius
+            cls.disc_offsets[radius] = (offsets_x[inside], offsets_y[inside])
+        return cls.disc_offsets[radius]
 
-class Object:
-    def __init__(self, image, game_pos, size = None):
+    @classmethod
+    def get_disc_pixels(cls, discs):
         """
-        Initializes an Object with its game position and image.
+        Returns the minimap pixels covered by discs, as index arrays for one batched surfarray write.
 
         Args:
-            self: The instance of the Object being initialized.
-            game_pos (tuple): The game position of the object.
-            image (pygame.Surface): The image of the object.
-            size (tuple, optional): The size of the image after scaling (width, height). Defaults to None.
-        """
-        if size:
-            self.image = pygame.transform.smoothscale(image, (size[0] * render.WIDTH_MULTIPLIER, size[1] * render.HEIGHT_MULTIPLIER))
+            discs (list): (game center, game radius) tuples.
+
+        Returns:
+            tuple: A tuple containing the x and y pixel arrays, limited to the minimap surface.
+        """
+        window_origin = ((cls.window_chunk[0] - cls.WINDOW_RADIUS) * Chunk.SIZE, (cls.window_chunk[1] - cls.WINDOW_RADIUS) * Chunk.SIZE)
+        pixels_x = []
+        pixels_y = []
+        for center, radius in discs:
+            offsets_x, offsets_y = cls.get_disc_offsets(max(round(radius / cls.PIXEL_SIZE), 0))
+            pixels_x.append(offsets_x + math.floor((center[0] - window_origin[0]) / cls.PIXEL_SIZE))
+            pixels_y.append(offsets_y + math.floor((center[1] - window_origin[1]) / cls.PIXEL_SIZE))
+        if not discs:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        pixels_x = np.concatenate(pixels_x)
+        pixels_y = np.concatenate(pixels_y)
+        inside = (pixels_x >= 0) & (pixels_x < cls.WINDOW_PIXELS) & (pixels_y >= 0) & (pixels_y < cls.WINDOW_PIXELS)
+        return pixels_x[inside], pixels_y[inside]
+
+    @classmethod
+    def update(cls):
+        """
+        Updates the minimap surface. Only the pixels of objects added or removed and of moved markers are written, the whole surface is only drawn again when the player enters a new chunk.
+        """
+        if cls.surface is None:
+            cls.surface = pygame.Surface((cls.WINDOW_PIXELS, cls.WINDOW_PIXELS), 0, 32)
+            cls.background = np.empty((cls.WINDOW_PIXELS, cls.WINDOW_PIXELS, 3), dtype=np.uint8)
+
+        changes = []
+        while not cls.changes.empty():
+            changes.append(cls.changes.get())
+
+        background = cls.background
+        pixels = pygame.surfarray.pixels3d(cls.surface)
+        window_chunk = Chunk.get_coords(World.get_center_pos())
+        if window_chunk != cls.window_chunk or cls.rebuild:
+            cls.window_chunk = window_chunk
+            cls.rebuild = False
+            background[:] = cls.GROUND_COLOR
+            background[cls.get_disc_pixels([(object.rect.center, object.rect.width * cls.TREE_SCALE / 2) for object in list(World.objects)])] = cls.TREE_COLOR
+            pixels[:] = background
         else:
-            self.image = image
-        self.game_pos = game_pos
+            pixels[cls.marker_pixels] = background[cls.marker_pixels]
+
+        # Changes are applied after a full redraw too, as objects are queued before they are in World.objects
+        for added, color in ((False, cls.GROUND_COLOR), (True, cls.TREE_COLOR)):
+            changed_pixels = cls.get_disc_pixels([(center, radius) for center, radius, change in changes if change == added])
+            background[changed_pixels] = color
+            pixels[changed_pixels] = color
+
+        marker_radius = cls.MARKER_RADIUS * cls.PIXEL_SIZE
+        remote_pixels = cls.get_disc_pixels([((remote_player.game_pos[0] + GAME_WIDTH / 2, remote_player.game_pos[1] + GAME_HEIGHT / 2), marker_radius) for remote_player in list(Network.remote_players.values())])
+        player_pixels = cls.get_disc_pixels([(World.get_center_pos(), marker_radius)])
+        pixels[remote_pixels] = cls.REMOTE_PLAYER_COLOR
+        pixels[player_pixels] = cls.PLAYER_COLOR
+        cls.marker_pixels = (np.concatenate((remote_pixels[0], player_pixels[0])), np.concatenate((remote_pixels[1], player_pixels[1])))
+        # The pixel array locks the surface until deleted
+        del pixels
 
-    def update(self):
+    @classmethod
+    def display(cls):
         """
-        Updates and displays the Object.
+        Displays the minimap in the bottom right corner of the screen, updating it at MinimapRate.
         """
-        self.display()
+        if not settings["Minimap"]:
+            return
+        current_time = time.perf_counter()
+        if cls.surface is None or current_time - cls.last_update_time >= 1 / settings["MinimapRate"]:
+            cls.last_update_time = current_time
+            cls.update()
+
+        size = round(cls.SIZE * render.WIDTH_MULTIPLIER)
+        pos = render.get_render_pos((GAME_WIDTH - cls.SIZE - cls.MARGIN, GAME_HEIGHT - cls.SIZE * render.WIDTH_MULTIPLIER / render.HEIGHT_MULTIPLIER - cls.MARGIN))
+        window_origin = ((cls.window_chunk[0] - cls.WINDOW_RADIUS) * Chunk.SIZE, (cls.window_chunk[1] - cls.WINDOW_RADIUS) * Chunk.SIZE)
+        center = World.get_center_pos()
+        area = pygame.Rect(round((center[0] - window_origin[0]) / cls.PIXEL_SIZE - size / 2), round((center[1] - window_origin[1]) / cls.PIXEL_SIZE - size / 2), size, size)
+
+        if cls.frame is None:
+            cls.frame = pygame.Surface((size + 4, size + 4), pygame.SRCALPHA)
+            pygame.draw.rect(cls.frame, cls.FRAME_COLOR, cls.frame.get_rect(), 2)
+        render.blit(cls.surface, pos, area, layer=render.UI_LAYER)
+        render.blit(cls.frame, (pos[0] - 2, pos[1] - 2), layer=render.UI_LAYER)
 
-    def display(self):
+    @classmethod
+    def reset(cls):
         """
-        Displays the Object on the screen.
+        Draws the whole minimap again at the next update, used when the world changes.
         """
-        render.blit(self.image, render.get_render_pos((self.game_pos[0] - Player.game_pos[0], self.game_pos[1] - Player.game_pos[1])))
+        cls.rebuild = True
 
 
 class World(Scene):
     prev_finger = (GAME_WIDTH, 0)
 
+    seed = settings["WorldSeed"] if settings["WorldSeed"] is not None else random.randrange(2 ** 32)
+    chunks = {}
+    stored_chunks = {}
+    loading_chunks = set()
+    load_queue = queue.Queue()
+    loaded_queue = queue.Queue()
+    loader_thread = None
+    player_chunk = None
+
+    destroyed_trees = set()
+
+    depth_index = DepthIndex()
+    max_object_height = 0
+    entity_entries = {Player: depth_index.insert(Player.get_depth(), Player)}
+
     @classmethod
     def update(cls, mouse_pos, mouse_down, keys_pressed, finger_positions):
         """
@@ -859,6 +2461,198 @@ class World(Scene):
         else:
             movement_arrows = {"left": False, "right": False, "up": False, "down": False}
         Player.update(mouse_pos, mouse_down, keys_pressed, movement_arrows)
+        cls.move_entity(Player)
+        cls.update_chunks()
+        Particles.update()
+        Lighting.update()
+        Fog.update(cls.get_center_pos())
+
+        if Network.connected:
+            Network.send_input(Player.buttons, Player.gun.angle)
+
+    @classmethod
+    def move_entity(cls, entity):
+        """
+        A class method which adds a moving entity to the depth index, or moves it to its current depth.
+
+        Args:
+            entity (object): The entity, which has get_depth, get_rect and display methods.
+        """
+        if entity in cls.entity_entries:
+            cls.entity_entries[entity] = cls.depth_index.move(cls.entity_entries[entity], entity.get_depth())
+        else:
+            cls.entity_entries[entity] = cls.depth_index.insert(entity.get_depth(), entity)
+
+    @classmethod
+    def remove_entity(cls, entity):
+        """
+        A class method which removes a moving entity from the depth index.
+
+        Args:
+            entity (object): The entity.
+        """
+        cls.depth_index.remove(cls.entity_entries.pop(entity))
+
+    @classmethod
+    def destroy_tree(cls, game_pos):
+        """
+        A class method which destroys the tree at a position, and stops it from being generated again.
+
+        Args:
+            game_pos (tuple): The game position of the tree.
+        """
+        cls.destroyed_trees.add(game_pos)
+        chunk = cls.chunks.get(Chunk.get_coords(game_pos))
+        if chunk:
+            for object in chunk.objects:
+                if tuple(object.game_pos) == game_pos:
+                    cls.remove_object(object)
+                    break
+
+    @classmethod
+    def reset(cls, seed):
+        """
+        A class method which unloads all chunks and changes the world seed, so the world is generated again.
+
+        Args:
+            seed (int): The new world seed.
+        """
+        cls.update_chunks(wait=True)
+        for coords, chunk in cls.chunks.items():
+            for object in chunk.objects:
+                cls.depth_index.remove(object.depth_entry)
+            StaticLayer.invalidate(StaticLayer.get_tile_rect(coords).unionall([object.rect for object in chunk.objects]))
+
+        cls.seed = seed
+        cls.chunks = {}
+        cls.stored_chunks = {}
+        Fog.load({})
+        Minimap.reset()
+        cls.objects = []
+        cls.player_chunk = None
+        cls.update_chunks(wait=True)
+
+    @classmethod
+    def index_object(cls, object):
+        """
+        A class method which adds a loaded object to the depth index.
+
+        Args:
+            object (Object): A Object instance to be indexed.
+        """
+        object.depth_entry = cls.depth_index.insert(object.rect.bottom, object)
+        cls.max_object_height = max(cls.max_object_height, object.rect.height)
+        Minimap.add_object(object)
+
+    @classmethod
+    def add_object(cls, object):
+        """
+        A class method which adds an object to the chunk containing it. If the chunk is not loaded the object is stored until the chunk loads.
+
+        Args:
+            object (Object): A Object instance to be added.
+        """
+        coords = Chunk.get_coords(object.game_pos)
+        if coords in cls.chunks:
+            cls.chunks[coords].add_object(object)
+            cls.objects.append(object)
+            cls.index_object(object)
+            StaticLayer.invalidate(object.rect)
+        else:
+            cls.stored_chunks.setdefault(coords, []).append((object.source[0], object.game_pos, object.source[1]))
+
+    @classmethod
+    def remove_object(cls, object):
+        """
+        A class method which removes a loaded object from the World and its chunk. Objects are trees, so they burst into leaves.
+
+        Args:
+            object (Object): A Object instance to be removed.
+        """
+        Particles.tree_destroyed(object.rect)
+        Minimap.remove_object(object)
+        cls.chunks[Chunk.get_coords(object.game_pos)].remove_object(object)
+        cls.objects.remove(object)
+        cls.depth_index.remove(object.depth_entry)
+        StaticLayer.invalidate(object.rect)
+
+    @classmethod
+    def get_center_pos(cls):
+        """
+        Returns the game position at the center of the screen, where the player stands.
+
+        Returns:
+            tuple: The game position of the player.
+        """
+        return (Player.game_pos[0] + GAME_WIDTH / 2, Player.game_pos[1] + GAME_HEIGHT / 2)
+
+    @classmethod
+    def chunk_loader(cls):
+        """
+        Chunk loading loop, run on its own thread. Builds the objects of requested chunks so the game thread never waits on image scaling.
+        """
+        while True:
+            coords, stored_objects = cls.load_queue.get()
+            cls.loaded_queue.put(Chunk(coords, cls.seed, stored_objects))
+
+    @classmethod
+    def update_chunks(cls, wait = False):
+        """
+        A class method that keeps the chunks within ChunkRadius of the player loaded and unloads the rest.
+
+        Chunks are requested from the loader thread when the player enters a new chunk, and added once loaded. Modified chunks are serialized when unloaded, unmodified chunks are dropped.
+
+        Args:
+            wait (bool): Blocks until all requested chunks are loaded if True. Defaults to False.
+        """
+        if cls.loader_thread is None:
+            cls.loader_thread = threading.Thread(target=cls.chunk_loader, daemon=True)
+            cls.loader_thread.start()
+
+        player_chunk = Chunk.get_coords(cls.get_center_pos())
+        changed = False
+
+        if player_chunk != cls.player_chunk:
+            cls.player_chunk = player_chunk
+            radius = settings["ChunkRadius"]
+            wanted_chunks = {(player_chunk[0] + x, player_chunk[1] + y) for x in range(-radius, radius + 1) for y in range(-radius, radius + 1)}
+
+            for coords in wanted_chunks:
+                if coords not in cls.chunks and coords not in cls.loading_chunks:
+                    cls.loading_chunks.add(coords)
+                    cls.load_queue.put((coords, cls.stored_chunks.pop(coords, None)))
+
+            for coords in list(cls.chunks):
+                if coords not in wanted_chunks:
+                    chunk = cls.chunks.pop(coords)
+                    if chunk.modified:
+                        cls.stored_chunks[coords] = chunk.serialize()
+                    for object in chunk.objects:
+                        cls.depth_index.remove(object.depth_entry)
+                    StaticLayer.invalidate(StaticLayer.get_tile_rect(coords).unionall([object.rect for object in chunk.objects]))
+                    changed = True
+
+        while cls.loading_chunks and (wait or not cls.loaded_queue.empty()):
+            chunk = cls.loaded_queue.get()
+            cls.loading_chunks.discard(chunk.coords)
+            # Objects added while the chunk was loading
+            for image, game_pos, size in cls.stored_chunks.pop(chunk.coords, []):
+                chunk.add_object(Object(image, game_pos, size))
+
+            # The player may have moved away while the chunk was loading
+            if max(abs(chunk.coords[0] - player_chunk[0]), abs(chunk.coords[1] - player_chunk[1])) > settings["ChunkRadius"]:
+                if chunk.modified:
+                    cls.stored_chunks[chunk.coords] = chunk.serialize()
+                continue
+
+            cls.chunks[chunk.coords] = chunk
+            for object in chunk.objects:
+                cls.index_object(object)
+            StaticLayer.invalidate(StaticLayer.get_tile_rect(chunk.coords).unionall([object.rect for object in chunk.objects]))
+            changed = True
+
+        if changed:
+            cls.objects = [object for chunk in cls.chunks.values() for object in chunk.objects]
 
     @classmethod
     def display(cls):
@@ -866,30 +2660,51 @@ class World(Scene):
         A class method that displays everything in the World.
         """
         cls.display_objects()
-        Player.display()
+        cls.display_depth_sorted()
+        Player.gun.display_bullets()
+        Network.display_bullets()
+        Particles.display()
+        Lighting.display()
+        Fog.display()
         cls.display_overlay()
 
     @classmethod
     def display_objects(cls): 
         """
-        A class method that displays all objects in the World.
+        A class method that displays all objects in the World, using the baked static layer tiles.
         """
-        for object in cls.objects:
-            object.display()
+        StaticLayer.display(cls.objects)
             
+    @classmethod
+    def display_depth_sorted(cls):
+        """
+        A class method that displays the moving entities in depth order.
+
+        Static objects are already displayed in the baked tiles, so only the objects in front of an entity and overlapping it are displayed again on top of it.
+        """
+        entity_entries = list(cls.entity_entries.values())
+        start_depth = min(entry[0] for entry in entity_entries)
+        end_depth = max(entry[2].get_rect().bottom for entry in entity_entries) + cls.max_object_height
+
+        entity_rects = []
+        for depth, sequence, item in cls.depth_index.get_range(start_depth, end_depth):
+            if isinstance(item, Object):
+                if item.rect.collidelist(entity_rects) != -1:
+                    item.display(render.WORLD_LAYER)
+            else:
+                item.display()
+                entity_rects.append(item.get_rect())
+
     @classmethod
     def display_overlay(cls): 
         """
         A class method that displays all buttons and UI elements in the World.
         """        
-        for button in cls.buttons:
-            button.display()
-
-        for mobile_button in cls.mobile_buttons.values():
-            mobile_button.display()
+        Minimap.display()
+        cls.ui.display()
             
 
-class Button:
+class Button(Widget):
     def __init__(self, text, pos, size, color, font, callback):
         """
         Initialize the button.
@@ -907,42 +2722,35 @@ class Button:
         self.game_pos = pos
         self.size = size
         self.color = color
+        self.font = font
         self.callback = callback
 
-        self.button_surface = pygame.Surface(self.size, pygame.SRCALPHA)
-        self.button_surface.fill((0, 0, 0, 0))
+        # Buttons do not move, their area is hit tested by the HitIndex of their Scene
+        super().__init__(self.render_pos)
+        self.redraw()
+
+    def redraw(self):
+        """
+        Renders the button surface with its current text and color.
+        """
+        button_surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        button_surface.fill((0, 0, 0, 0))
         
         if not settings["AndroidBuild"]:
             border_radius = 30
         else:
             border_radius = 0
         
-        pygame.draw.rect(self.button_surface, self.color, (0, 0, self.size[0], self.size[1]), border_radius=border_radius)
+        pygame.draw.rect(button_surface, self.color, (0, 0, self.size[0], self.size[1]), border_radius=border_radius)
         
-        text = font.render(self.text, True, Color.WHITE)
+        text = self.font.render(self.text, True, Color.WHITE)
         text_rect = text.get_rect(center=(self.size[0]/2, self.size[1]/2))
-        self.button_surface.blit(text, text_rect)
+        button_surface.blit(text, text_rect)
 
-        self.button_surface = render.scale_image(self.button_surface)
+        self.surface = render.scale_image(button_surface)
         if settings["AndroidBuild"]:
-            self.button_surface = self.button_surface.convert()
-
-    def update(self, mouse_pos, mouse_down):
-        """
-        Runs the buttons callback function if the mouse is down and the mouse is in the button area.
-
-        Args:
-            mouse_pos (tuple): Current mouse position.
-            mouse_down (tuple): Current mouse button states.
-        """
-        if pygame.Rect(*self.render_pos, *self.button_surface.get_size()).collidepoint(mouse_pos) and mouse_down[0]:
-            self.callback()
-
-    def display(self):
-        """
-        Displays the button on the screen.
-        """
-        render.blit(self.button_surface, self.render_pos)
+            self.surface = self.surface.convert()
+        self.rect.size = self.surface.get_size()
 
 
 class MobileButton(Button):
@@ -959,28 +2767,11 @@ class MobileButton(Button):
         """
         super().__init__(text, pos, size, color, font, None)
 
-    def update(self, finger_positions):
-        """
-        Updates the state of the MobileButton based on finger positions.
-
-        Checks if any finger is on the button by comparing finger positions with the button's position and size. Returns True and the position of the finger if a finger is on the button (used as identifier), otherwise returns False and None (no identifier).
-
-        Args:
-            finger_positions (list): List of finger positions on a touchscreen.
-
-        Returns:
-            tuple: A tuple containing:
-                - bool: True if a finger is on the button, False otherwise.
-                - tuple or None: The position of the finger on the button if detected, or None if no finger is on the button.
-        """
-        for finger_pos in finger_positions:
-            if pygame.Rect(*self.render_pos, *self.button_surface.get_size()).collidepoint(finger_pos):
-                return True, finger_pos
-        return False, None
-
 
 class MainMenu(Scene):
     buttons = []
+    button_index = HitIndex()
+    ui = UIOverlay(Sprite.UI.Menu.Background.image)
     enabled = True
     
     @classmethod
@@ -1020,12 +2811,255 @@ class MainMenu(Scene):
         """
         Displays the MainMenu.
         """
-        render.blit(Sprite.UI.Menu.Background.image, (0, 0))
-        
-        for button in cls.buttons:
-            button.display()
+        cls.ui.display()
                 
 
+class RemotePlayer:
+    GUN_DISTANCE = lakeserver.GUN_DISTANCE + lakeserver.GUN_SIDE_OFFSET
+    BODY_OFFSET = (GAME_WIDTH / 2 - Sprite.Player.Body.size[0] / 2, GAME_HEIGHT / 2 - Sprite.Player.Body.size[1] / 2)
+
+    def __init__(self, player_id):
+        """
+        Initializes a RemotePlayer, another player in an online game.
+
+        Args:
+            player_id (int): The player id given by the server.
+        """
+        self.id = player_id
+        self.game_pos = (0, 0)
+        self.angle = 0
+
+    def update(self, game_pos, angle):
+        """
+        Updates the RemotePlayer to its state in a snapshot.
+
+        Args:
+            game_pos (tuple): The game position, using the same convention as Player.game_pos.
+            angle (float): The normalized gun angle.
+        """
+        self.game_pos = game_pos
+        self.angle = angle
+
+    def get_depth(self):
+        """
+        Returns the depth of the RemotePlayer, the game y position of its feet.
+
+        Returns:
+            float: The depth of the RemotePlayer.
+        """
+        return self.game_pos[1] + GAME_HEIGHT / 2 + Sprite.Player.Body.size[1] / 2
+
+    def get_rect(self):
+        """
+        Returns the area covered by the RemotePlayer, including its hands and gun.
+
+        Returns:
+            pygame.Rect: The RemotePlayer area in game units.
+        """
+        rect = pygame.Rect(0, 0, Sprite.Player.Body.size[0] * 2.5, Sprite.Player.Body.size[1] * 2.5)
+        rect.center = (self.game_pos[0] + GAME_WIDTH / 2, self.game_pos[1] + GAME_HEIGHT / 2)
+        return rect
+
+    def get_body_rect(self):
+        """
+        Returns the area covered by the body of the RemotePlayer.
+
+        Returns:
+            pygame.Rect: The body area in game units.
+        """
+        return pygame.Rect(self.game_pos[0] + self.BODY_OFFSET[0], self.game_pos[1] + self.BODY_OFFSET[1], *Sprite.Player.Body.size)
+
+    def display(self):
+        """
+        Displays the RemotePlayer, its gun and hands on the screen.
+        """
+        center_x = self.game_pos[0] - Player.game_pos[0] + GAME_WIDTH / 2
+        center_y = self.game_pos[1] - Player.game_pos[1] + GAME_HEIGHT / 2
+        direction = -self.angle * 2 * math.pi
+
+        gun_image = pygame.transform.rotate(Player.gun.image, 360 * self.angle)
+        gun_pos = (center_x + self.GUN_DISTANCE * math.cos(direction) - gun_image.get_width() / 2 / render.WIDTH_MULTIPLIER,
+                   center_y + self.GUN_DISTANCE * math.sin(direction) - gun_image.get_height() / 2 / render.HEIGHT_MULTIPLIER)
+        render.blit(gun_image, render.get_render_pos(gun_pos), layer=render.WORLD_LAYER)
+
+        for angle_offset in (-0.5, 0.5):
+            hand_pos = (center_x + Hand.BODY_RADIUS[0] * math.cos(direction + angle_offset) - Hand.HAND_RADIUS[0],
+                        center_y + Hand.BODY_RADIUS[1] * math.sin(direction + angle_offset) - Hand.HAND_RADIUS[1])
+            render.blit(Sprite.Player.Hand.image, render.get_render_pos(hand_pos), layer=render.WORLD_LAYER)
+
+        body_pos = (self.game_pos[0] - Player.game_pos[0] + self.BODY_OFFSET[0], self.game_pos[1] - Player.game_pos[1] + self.BODY_OFFSET[1])
+        render.blit(Sprite.Player.Body.frames[Player.current_frame], render.get_render_pos(body_pos), layer=render.WORLD_LAYER)
+
+
+class Network:
+    INPUT_BUFFER_SIZE = 64   # Inputs kept for replay, must cover the round trip time in ticks
+    SNAP_DISTANCE = 100      # Game units of prediction error corrected instantly instead of smoothed
+    CORRECTION_RATE = 0.2    # Fraction of the prediction error corrected per snapshot
+    CONNECT_TIMEOUT = 5      # Seconds
+
+    connected = False
+    socket = None
+    session = lakeserver.ClientSession()
+    last_snapshot_tick = None
+
+    # Ring buffer of sent inputs, indexed by input sequence
+    input_buttons = np.zeros(INPUT_BUFFER_SIZE, dtype=np.uint8)
+    input_angles = np.zeros(INPUT_BUFFER_SIZE, dtype=np.float64)
+
+    remote_players = {}
+    remote_bullets = np.empty((0, 2))
+
+    @classmethod
+    def connect(cls, address):
+        """
+        Connects to a game server, resending the connect packet until accepted. The world is generated again with the server seed.
+
+        Args:
+            address (str): The server address as "host:port".
+
+        Returns:
+            bool: True if connected, False otherwise.
+        """
+        host, port = address.rsplit(":", 1)
+        server_address = (host, int(port))
+        cls.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        cls.socket.connect(server_address)
+        cls.socket.setblocking(False)
+
+        end_time = time.perf_counter() + cls.CONNECT_TIMEOUT
+        while not cls.session.accepted and time.perf_counter() < end_time:
+            cls.send(cls.session.build_connect(server_address))
+            time.sleep(0.1)
+            cls.receive_packets()
+
+        if cls.session.accepted:
+            cls.connected = True
+            # Predictions move like the server, or every reconciliation would snap the player back
+            Player.base_speed = lakeserver.PLAYER_SPEED
+            World.reset(cls.session.seed)
+        return cls.connected
+
+    @classmethod
+    def send(cls, packet):
+        """
+        Sends a packet to the server. Packets which can not be sent are dropped, like any lost UDP packet.
+
+        Args:
+            packet (bytes): The packet.
+        """
+        try:
+            cls.socket.send(packet)
+        except (BlockingIOError, ConnectionError):
+            pass
+
+    @classmethod
+    def receive_packets(cls):
+        """
+        Reads all packets waiting on the socket without blocking.
+        """
+        while True:
+            try:
+                data = cls.socket.recv(65536)
+            except (BlockingIOError, ConnectionError):
+                return
+            cls.session.receive(data)
+
+    @classmethod
+    def update(cls):
+        """
+        Handles packets from the server. Destroyed trees are removed from the world, and new snapshots reconcile the player and update remote players.
+        """
+        cls.receive_packets()
+
+        for game_pos in cls.session.destroyed_trees:
+            World.destroy_tree(tuple(game_pos))
+        cls.session.destroyed_trees.clear()
+
+        snapshot = cls.session.snapshot
+        if snapshot and snapshot["tick"] != cls.last_snapshot_tick:
+            cls.last_snapshot_tick = snapshot["tick"]
+            cls.reconcile(snapshot)
+            cls.update_remote(snapshot)
+
+    @classmethod
+    def send_input(cls, buttons, angle):
+        """
+        Sends the input for this tick and stores it for replay. The input has already been applied locally.
+
+        Args:
+            buttons (int): The input button bits.
+            angle (float): The normalized gun angle.
+        """
+        packet = cls.session.build_input(buttons, angle)
+        index = cls.session.input_sequence % cls.INPUT_BUFFER_SIZE
+        cls.input_buttons[index] = buttons
+        cls.input_angles[index] = angle
+        cls.send(packet)
+
+    @classmethod
+    def reconcile(cls, snapshot):
+        """
+        Rewinds the player to its authoritative position and replays the inputs the server has not processed yet.
+
+        Small prediction errors are smoothed over several snapshots, large errors are corrected instantly.
+
+        Args:
+            snapshot (dict): The latest snapshot.
+        """
+        state = cls.session.get_player(cls.session.player_id)
+        if state is None:
+            return
+
+        pos = (float(state[0][0]), float(state[0][1]))
+        last_sequence = cls.session.input_sequence
+        first_sequence = max(snapshot["input_sequence"] + 1, last_sequence - cls.INPUT_BUFFER_SIZE + 1)
+        for sequence in range(first_sequence, last_sequence + 1):
+            pos = lakeserver.move_player(pos, int(cls.input_buttons[sequence % cls.INPUT_BUFFER_SIZE]), Player.base_speed, SPT)
+
+        error_x = pos[0] - Player.game_pos[0]
+        error_y = pos[1] - Player.game_pos[1]
+        if math.hypot(error_x, error_y) > cls.SNAP_DISTANCE:
+            Player.game_pos = pos
+        else:
+            Player.game_pos = (Player.game_pos[0] + error_x * cls.CORRECTION_RATE, Player.game_pos[1] + error_y * cls.CORRECTION_RATE)
+
+    @classmethod
+    def update_remote(cls, snapshot):
+        """
+        Updates the remote players and bullets to their state in a snapshot. Bullets of the player are skipped, as they are predicted locally.
+
+        Args:
+            snapshot (dict): The latest snapshot.
+        """
+        players = snapshot["players"]
+        positions = lakeserver.snapshot.get_positions(players)
+        seen = set()
+        for player_id, pos, angle in zip(players["id"].tolist(), positions.tolist(), (players["angle"] / lakeserver.snapshot.ANGLE_SCALE).tolist()):
+            if player_id == cls.session.player_id:
+                continue
+            seen.add(player_id)
+            if player_id not in cls.remote_players:
+                cls.remote_players[player_id] = RemotePlayer(player_id)
+            cls.remote_players[player_id].update(tuple(pos), angle)
+            World.move_entity(cls.remote_players[player_id])
+
+        for player_id in list(cls.remote_players):
+            if player_id not in seen:
+                World.remove_entity(cls.remote_players.pop(player_id))
+
+        bullets = snapshot["bullets"]
+        cls.remote_bullets = lakeserver.snapshot.get_positions(bullets[bullets["owner"] != cls.session.player_id])
+
+    @classmethod
+    def display_bullets(cls):
+        """
+        Displays the bullets of remote players on the screen.
+        """
+        image = Bullet.IMAGE
+        for x, y in cls.remote_bullets.tolist():
+            render.blit(image, render.get_render_pos((x - Player.game_pos[0] - image.get_width() / 2, y - Player.game_pos[1] - image.get_height() / 2)), layer=render.EFFECTS_LAYER)
+
+
 # World Scene Overlay
 MainMenu.add_button(Button("Play", (GAME_WIDTH / 2 - 400, 400), (800, 180), Color.RED1, Font.menu, MainMenu.toggle)) # Play Button
 MainMenu.add_button(Button("Exit", (GAME_WIDTH / 2 - 400, 650), (800, 180), Color.RED1, Font.menu, exit)) # Exit Button
@@ -1034,8 +3068,11 @@ MainMenu.add_button(Button("Exit", (GAME_WIDTH / 2 - 400, 650), (800, 180), Colo
 World.add_button(Button("ll", (10, 10), (100, 100), Color.RED1, Font.symbol, MainMenu.toggle)) # Pause Button
 
 # World Scene Objects
-World.add_object(Object(Sprite.Scenery.Foilage.Tree.frames[0], (0, 0)))
-World.add_object(Object(Sprite.Scenery.Foilage.Tree.frames[0], (350, 180), (60, 60)))
+World.update_chunks(wait=True)
+
+# Online play
+if settings["Server"]:
+    Network.connect(settings["Server"])
 
 # Mobile Buttons
 if settings["AndroidBuild"]:
@@ -1055,20 +3092,25 @@ def game_logic():
     while running:
         loop_start_time = time.perf_counter()
 
-        mouse_pos, mouse_down = render.get_mouse()
-        keys_pressed = render.get_keys()
+        Input.poll()
+        Input.update()
+        mouse_pos, mouse_down = Input.mouse_pos, Input.mouse_down
+        keys_pressed = Input.keys
 
         if settings["AndroidBuild"]:
-            finger_positions = list(render.get_fingers())
+            finger_positions = Input.fingers
         else:
             finger_positions = None
 
+        if Network.connected:
+            Network.update()
+
         if MainMenu.enabled:
             MainMenu.update(mouse_pos, mouse_down)
         else:
             World.update(mouse_pos, mouse_down, keys_pressed, finger_positions)
-        
-        render.handle_events()
+
+        Collision.reset()
         
         # Get the average extra time the delay takes over its set TPS
         delay_overflow_time = np.average(render.running_spt) - SPT
@@ -1088,16 +3130,22 @@ def render_loop():
     global running, render, MainMenu, World
     while running:
         loop_start_time = time.perf_counter()
+        # On posix the render loop runs on the main thread, so events are drained every frame and wait less than a tick
+        Input.poll()
 
-        if MainMenu.enabled:
-            MainMenu.display()
-        else:
-            World.display()
+        if not Governor.skip_frame():
+            if MainMenu.enabled:
+                MainMenu.display()
+            else:
+                World.display()
 
-        render.display()
+            render.display()
+            draw_duration = time.perf_counter() - loop_start_time
+            render.update_render_scale(draw_duration)
+            Governor.update(draw_duration)
 
         # Get time where loop finishes. Delay overflow time not used as accuracy is less important
-        target_time = loop_start_time + SPF
+        target_time = loop_start_time + Governor.frame_time
         current_time = time.perf_counter()
         while current_time < target_time:
             # Sleep for most of the duration until target time, creating a partially busy delay loop
@@ -0,0 +1,2061 @@
+# Authoritative Shadow Fare game server. Runs the game simulation headlessly for many clients over UDP.
+import asyncio, bisect, math, struct, time, collections, multiprocessing, os, pickle, socket, hmac
+import numpy as np
+
+from src import worldgen, snapshot
+
+
+# ----- Constant Variables -----
+# Ticks Per Second, matches the game
+TPS = 64
+# Seconds Per Tick
+SPT = 1 / TPS
+
+GAME_WIDTH = 1920
+GAME_HEIGHT = 1080
+CHUNK_SIZE = 1000
+CHUNK_RADIUS = 2
+
+# Gameplay is expressed in seconds, so it runs the same at any tick rate
+PLAYER_SPEED = 384            # Game units per second
+BULLET_SPEED = 960            # Game units per second
+BULLET_SURVIVAL_TIME = 2      # Seconds
+GUN_COOLDOWN = 0.171875       # Seconds between shots, 11 ticks at 64 TPS
+TIME_EPSILON = 1e-9           # Seconds, absorbs rounding when timers are counted down a tick at a time
+GUN_DISTANCE = 102            # Game units from the player center to the bullet spawn
+GUN_SIDE_OFFSET = -20         # Game units to the side of the aim direction the bullet spawns
+PLAYER_HIT_SIZE = 80          # Game units, the player body size in the game
+
+DEFAULT_PORT = 25570
+CONNECTION_TIMEOUT = 5        # Seconds without packets before a client is dropped
+MAX_RELIABLE_BYTES = 600      # Reliable message bytes sent per packet
+MAX_INPUT_DELAY = 0.125       # Seconds of inputs buffered per player before old ones are dropped
+SNAPSHOT_HISTORY_TIME = 1     # Seconds of sent snapshots kept as delta baselines
+MAX_PLAYERS = 64              # Players per room
+MAX_SUBSCRIBERS = 4           # Subscribers per room, like spectator relays
+LAG_COMPENSATION_TIME = 0.5   # Seconds shots may be rewound, clients with more latency are judged late
+VIEW_MARGIN = 400             # Game units beyond the screen edges entities are sent to a client
+INTEREST_CELL_SIZE = 500      # Game units per area of interest grid cell
+REGION_SIZE = 4000            # Game units per region of a partitioned world
+GHOST_MARGIN = GAME_WIDTH / 2 + VIEW_MARGIN  # Game units from a region border entities are mirrored to other regions, enough for clients to see across borders
+
+DEFAULT_METRICS_PORT = 9570
+# Histogram bucket upper bounds in seconds, the tick buckets include the tick budget SPT
+TICK_TIME_BUCKETS = (0.0005, 0.001, 0.002, 0.004, 0.008, SPT, 0.025, 0.05, 0.1)
+SNAPSHOT_TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+# Packet types
+CONNECT = 0
+ACCEPT = 1
+INPUT = 2
+SNAPSHOT = 3
+DISCONNECT = 4
+SUBSCRIBE = 5
+
+# Player id accepted subscribers get, as they have no player
+SUBSCRIBER_ID = 0xFFFF
+
+# Reliable message types
+TREE_DESTROYED = 0
+
+# Messages between the front process and worker processes
+WORKER_CREATE_ROOM = 0
+WORKER_CLOSE_ROOM = 1
+WORKER_DATAGRAM = 2
+WORKER_STOP = 3
+WORKER_TICK = 4
+WORKER_HANDOFF = 5
+WORKER_BUFFER_SIZE = 1 << 20  # Bytes waiting to be written to a stalled worker before its datagrams are dropped
+
+# Input button bits
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+FIRE = 16
+
+# type, sequence, ack, ack bits, reliable message count
+PACKET_HEADER = struct.Struct("!BHHIB")
+# reliable message id, length
+RELIABLE_HEADER = struct.Struct("!HH")
+# player id, world seed, tick
+ACCEPT_PAYLOAD = struct.Struct("!HQI")
+# room id
+SUBSCRIBE_PAYLOAD = struct.Struct("!I")  # followed by the subscribe token
+# last received snapshot tick
+INPUT_HEADER = struct.Struct("!I")
+# input sequence, buttons, gun angle
+INPUT_ENTRY = struct.Struct("!IBf")
+# message type, x, y
+TREE_DESTROYED_MESSAGE = struct.Struct("!Bii")
+
+
+# ----- Functions ------
+def sequence_greater(a, b):
+    """
+    Checks if a 16 bit sequence number is newer than another, handling wrap around.
+
+    Args:
+        a (int): The first sequence number.
+        b (int): The second sequence number.
+
+    Returns:
+        bool: True if a is newer than b, False otherwise.
+    """
+    return ((a > b) and (a - b <= 32768)) or ((a < b) and (b - a > 32768))
+
+def get_ticks(seconds):
+    """
+    Converts a duration to the nearest whole number of ticks at the current tick rate, so windows kept in ticks last the same time at any rate.
+
+    Args:
+        seconds (float): The duration in seconds.
+
+    Returns:
+        int: The number of ticks.
+    """
+    return round(seconds * TPS)
+
+def split_reliable(data):
+    """
+    Splits the reliable messages off a packet, checking every length against the packet size.
+
+    Args:
+        data (bytes): The packet, starting with its PACKET_HEADER.
+
+    Returns:
+        tuple or None: A tuple containing a list of (message_id, message) tuples and the payload offset, or None if the packet is malformed.
+    """
+    if len(data) < PACKET_HEADER.size:
+        return None
+    reliable_count = data[PACKET_HEADER.size - 1]
+    offset = PACKET_HEADER.size
+    messages = []
+    for i in range(reliable_count):
+        if offset + RELIABLE_HEADER.size > len(data):
+            return None
+        message_id, length = RELIABLE_HEADER.unpack_from(data, offset)
+        offset += RELIABLE_HEADER.size
+        if offset + length > len(data):
+            return None
+        messages.append((message_id, data[offset:offset + length]))
+        offset += length
+    return messages, offset
+
+def move_player(pos, buttons, speed = PLAYER_SPEED, timestep = SPT):
+    """
+    Returns the position of a player after one tick of movement. Matches Player.update in the game.
+
+    Args:
+        pos (tuple): The player game position.
+        buttons (int): The input button bits.
+        speed (float): The player speed in game units per second. Defaults to PLAYER_SPEED.
+        timestep (float): The tick duration in seconds. Defaults to SPT.
+
+    Returns:
+        tuple: The new game position.
+    """
+    speed *= timestep
+    move_x = 0
+    move_y = 0
+    if buttons & UP:
+        move_y -= speed
+    if buttons & LEFT:
+        move_x -= speed
+    if buttons & DOWN:
+        move_y += speed
+    if buttons & RIGHT:
+        move_x += speed
+
+    # Normalize the movement vector if it is diagonal
+    if move_x != 0 and move_y != 0:
+        move_x /= math.sqrt(2)
+        move_y /= math.sqrt(2)
+
+    return (pos[0] + move_x, pos[1] + move_y)
+
+def get_bullet_spawn(pos, angle):
+    """
+    Returns the spawn position and velocity of a bullet fired by a player.
+
+    Args:
+        pos (tuple): The player game position.
+        angle (float): The normalized gun angle, as calculated by calculate_gun_angle in the game.
+
+    Returns:
+        tuple: A tuple containing the bullet game position [x, y] and velocity (x, y) in game units per second.
+    """
+    # Bullets travel opposite to the normalized gun angle, as in Bullet.__init__
+    direction = -angle * 2 * math.pi
+    cos_direction = math.cos(direction)
+    sin_direction = math.sin(direction)
+
+    spawn_x = pos[0] + GAME_WIDTH / 2 + GUN_DISTANCE * cos_direction - GUN_SIDE_OFFSET * sin_direction
+    spawn_y = pos[1] + GAME_HEIGHT / 2 + GUN_DISTANCE * sin_direction + GUN_SIDE_OFFSET * cos_direction
+
+    return [spawn_x, spawn_y], (BULLET_SPEED * cos_direction, BULLET_SPEED * sin_direction)
+
+def get_chunk_coords(pos):
+    """
+    Returns the coordinates of the chunk containing a game position.
+
+    Args:
+        pos (tuple): The game position.
+
+    Returns:
+        tuple: The chunk grid coordinates (x, y).
+    """
+    return (math.floor(pos[0] / CHUNK_SIZE), math.floor(pos[1] / CHUNK_SIZE))
+
+
+# ----- Class -----
+class Connection:
+    def __init__(self, address):
+        """
+        Initializes a Connection, a lightweight reliability layer on top of UDP.
+
+        Every packet carries its sequence number and acks for the last 33 received packets. Reliable messages are resent in every packet until a packet containing them is acked.
+
+        Args:
+            address (tuple): The remote address (host, port).
+        """
+        self.address = address
+        self.local_sequence = 0
+        self.remote_sequence = 0
+        self.received_bits = 0
+        self.received_any = False
+
+        self.next_reliable_id = 0
+        self.reliable_outgoing = collections.OrderedDict()
+        self.received_reliable_ids = collections.deque(maxlen=1024)
+        self.sent_packets = {}
+
+        self.rtt = 0.1
+        self.last_receive_time = time.perf_counter()
+
+    def send_reliable(self, message):
+        """
+        Queues a message to be resent until it is acked.
+
+        Args:
+            message (bytes): The message.
+        """
+        self.reliable_outgoing[self.next_reliable_id] = message
+        self.next_reliable_id = (self.next_reliable_id + 1) % 65536
+
+    def build_packet(self, packet_type, payload = b""):
+        """
+        Builds a packet with the header, unacked reliable messages and the payload.
+
+        Args:
+            packet_type (int): The packet type.
+            payload (bytes): The packet payload. Defaults to b"".
+
+        Returns:
+            bytes: The packet.
+        """
+        reliable_ids = []
+        reliable_parts = []
+        reliable_bytes = 0
+        for message_id, message in self.reliable_outgoing.items():
+            if reliable_bytes + len(message) > MAX_RELIABLE_BYTES or len(reliable_ids) == 255:
+                break
+            reliable_ids.append(message_id)
+            reliable_parts.append(RELIABLE_HEADER.pack(message_id, len(message)))
+            reliable_parts.append(message)
+            reliable_bytes += len(message) + RELIABLE_HEADER.size
+
+        sequence = self.local_sequence
+        self.local_sequence = (sequence + 1) % 65536
+        self.sent_packets[sequence] = (reliable_ids, time.perf_counter())
+        # Packets older than the ack window can never be acked
+        self.sent_packets.pop((sequence - 33) % 65536, None)
+
+        header = PACKET_HEADER.pack(packet_type, sequence, self.remote_sequence, self.received_bits, len(reliable_ids))
+        return b"".join([header, *reliable_parts, payload])
+
+    def receive_packet(self, data):
+        """
+        Reads a packet, processing its acks and reliable messages.
+
+        Args:
+            data (bytes): The packet.
+
+        Returns:
+            tuple or None: A tuple containing the packet type, payload and a list of new reliable messages, or None if the packet is malformed, old or a duplicate.
+        """
+        # Lengths come from the network, so the packet is checked before any state changes
+        split = split_reliable(data)
+        if split is None:
+            return None
+        reliable, offset = split
+        packet_type, sequence, ack, ack_bits, reliable_count = PACKET_HEADER.unpack_from(data)
+        self.last_receive_time = time.perf_counter()
+
+        # Acks are processed even for late packets
+        for index in range(33):
+            if index == 0 or ack_bits & (1 << (index - 1)):
+                acked = self.sent_packets.pop((ack - index) % 65536, None)
+                if acked:
+                    for message_id in acked[0]:
+                        self.reliable_outgoing.pop(message_id, None)
+                    if index == 0:
+                        self.rtt += (time.perf_counter() - acked[1] - self.rtt) * 0.1
+
+        if not self.received_any or sequence_greater(sequence, self.remote_sequence):
+            if self.received_any:
+                # The previous newest packet moves into the ack bits
+                shift = (sequence - self.remote_sequence) % 65536
+                self.received_bits = ((self.received_bits << shift) | (1 << (shift - 1))) & 0xFFFFFFFF
+            self.remote_sequence = sequence
+            self.received_any = True
+        else:
+            index = (self.remote_sequence - sequence) % 65536
+            if index == 0 or index > 32 or self.received_bits & (1 << (index - 1)):
+                return None
+            self.received_bits |= 1 << (index - 1)
+
+        messages = []
+        for message_id, message in reliable:
+            if message_id not in self.received_reliable_ids:
+                self.received_reliable_ids.append(message_id)
+                messages.append(message)
+
+        return packet_type, data[offset:], messages
+
+
+class PositionHistory:
+    def __init__(self, length, capacity):
+        """
+        Initializes a PositionHistory, a ring buffer of player positions for the last ticks. Players are stored in fixed slots, so every array is preallocated.
+
+        Args:
+            length (int): The number of ticks kept.
+            capacity (int): The number of player slots.
+        """
+        self.length = length
+        self.positions = np.zeros((length, capacity, 2), dtype=np.float64)
+        self.valid = np.zeros((length, capacity), dtype=bool)
+        self.tick = -1
+
+    def clear_slot(self, slot):
+        """
+        Forgets the history of a slot, so a new player in it can not be hit where the old one was.
+
+        Args:
+            slot (int): The player slot.
+        """
+        self.valid[:, slot] = False
+
+    def record(self, tick, slots, positions):
+        """
+        Records the player positions of a tick, overwriting the oldest tick.
+
+        Args:
+            tick (int): The simulation tick.
+            slots (numpy.ndarray): The slots of the players.
+            positions (numpy.ndarray): The player positions, a row (x, y) per slot.
+        """
+        row = tick % self.length
+        self.valid[row] = False
+        self.valid[row, slots] = True
+        self.positions[row, slots] = positions
+        self.tick = tick
+
+    def rewind(self, ticks_back):
+        """
+        Returns the recorded player positions some ticks ago, for many queries at once. Rewinds are limited to the recorded ticks.
+
+        Args:
+            ticks_back (numpy.ndarray): The ticks to rewind for each query.
+
+        Returns:
+            tuple: A tuple containing the positions, shaped (queries, capacity, 2), and whether each slot held a player, shaped (queries, capacity).
+        """
+        rows = (self.tick - np.clip(ticks_back, 0, self.length - 1)) % self.length
+        return self.positions[rows], self.valid[rows]
+
+
+class SpatialGrid:
+    def __init__(self, positions, cell_size):
+        """
+        Initializes a SpatialGrid, a uniform grid over positions for fast area queries. Built once per tick by sorting the positions by cell.
+
+        Args:
+            positions (numpy.ndarray): The positions, a row (x, y) per entity.
+            cell_size (float): The cell width and height in game units.
+        """
+        self.positions = positions
+        self.cell_size = cell_size
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        # Cells in a column are contiguous in key order, so a column of cells is one sorted range
+        keys = (cells[:, 0] << 32) + cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query(self, center, half_size):
+        """
+        Returns the entities inside a box.
+
+        Args:
+            center (tuple): The game position of the box center.
+            half_size (tuple): The half width and half height of the box.
+
+        Returns:
+            numpy.ndarray: The sorted indices of the entities inside the box.
+        """
+        if not len(self.keys):
+            return np.empty(0, dtype=np.int64)
+        left, top = math.floor((center[0] - half_size[0]) / self.cell_size), math.floor((center[1] - half_size[1]) / self.cell_size)
+        right, bottom = math.floor((center[0] + half_size[0]) / self.cell_size), math.floor((center[1] + half_size[1]) / self.cell_size)
+
+        columns = np.arange(left, right + 1, dtype=np.int64) << 32
+        starts = np.searchsorted(self.keys, columns + top, "left")
+        ends = np.searchsorted(self.keys, columns + bottom, "right")
+        indices = np.concatenate([self.order[start:end] for start, end in zip(starts.tolist(), ends.tolist())])
+
+        positions = self.positions[indices]
+        inside = (np.abs(positions[:, 0] - center[0]) <= half_size[0]) & (np.abs(positions[:, 1] - center[1]) <= half_size[1])
+        return np.sort(indices[inside])
+
+
+class WorldPartition:
+    def __init__(self, columns, rows, region_size = REGION_SIZE):
+        """
+        Initializes a WorldPartition, which splits the world into square regions, each simulated by its own worker. The grid of columns by rows regions repeats over the endless world.
+
+        Args:
+            columns (int): The regions per row.
+            rows (int): The regions per column.
+            region_size (float): The region width and height in game units. Defaults to REGION_SIZE.
+        """
+        self.columns = columns
+        self.rows = rows
+        self.region_size = region_size
+        self.region_count = columns * rows
+
+    def get_regions(self, positions):
+        """
+        Returns the regions containing game positions.
+
+        Args:
+            positions (numpy.ndarray): The positions, a row (x, y) per entity.
+
+        Returns:
+            numpy.ndarray: The region index of each position.
+        """
+        cells = np.floor(positions / self.region_size).astype(np.int64)
+        return cells[:, 0] % self.columns + cells[:, 1] % self.rows * self.columns
+
+    def get_region(self, pos):
+        """
+        Returns the region containing a game position.
+
+        Args:
+            pos (tuple): The game position.
+
+        Returns:
+            int: The region index.
+        """
+        return int(self.get_regions(np.array([pos], dtype=np.float64))[0])
+
+    def near_border(self, positions, margin = GHOST_MARGIN):
+        """
+        Checks which positions are near a border with another region. Borders between repeats of the same region are ignored.
+
+        Args:
+            positions (numpy.ndarray): The positions, a row (x, y) per entity.
+            margin (float): The distance from a border counted as near. Defaults to GHOST_MARGIN.
+
+        Returns:
+            numpy.ndarray: A bool array, True where the position is near a border.
+        """
+        offsets = positions % self.region_size
+        distances = np.minimum(offsets, self.region_size - offsets)
+        near = np.zeros(len(positions), dtype=bool)
+        if self.columns > 1:
+            near |= distances[:, 0] < margin
+        if self.rows > 1:
+            near |= distances[:, 1] < margin
+        return near
+
+
+class ServerPlayer:
+    def __init__(self, player_id, pos, slot):
+        """
+        Initializes a ServerPlayer, the authoritative state of a connected player.
+
+        Args:
+            player_id (int): The player id.
+            pos (tuple): The starting game position.
+            slot (int): The player slot in the position history.
+        """
+        self.id = player_id
+        self.pos = pos
+        self.slot = slot
+        self.angle = 0
+        self.buttons = 0
+        self.cooldown = 0
+        self.input_sequence = 0
+        self.view_tick = None
+        self.hits = 0
+        self.inputs = collections.deque()
+
+    def queue_inputs(self, inputs, view_tick):
+        """
+        Queues newly received inputs. Inputs are sent redundantly, so already queued or applied inputs are ignored.
+
+        Args:
+            inputs (list): A list of (sequence, buttons, angle) tuples, oldest first.
+            view_tick (int or None): The last snapshot tick the client had received when sending the inputs, or None if it had none.
+        """
+        last_sequence = self.inputs[-1][0] if self.inputs else self.input_sequence
+        for entry in inputs:
+            if entry[0] > last_sequence:
+                self.inputs.append((*entry, view_tick))
+                last_sequence = entry[0]
+
+        while len(self.inputs) > get_ticks(MAX_INPUT_DELAY):
+            self.inputs.popleft()
+
+
+class Simulation:
+    def __init__(self, seed, bullet_id_start = 0, bullet_id_step = 1):
+        """
+        Initializes a Simulation, the headless game world.
+
+        Args:
+            seed (int): The world seed, shared with clients so their scenery matches.
+            bullet_id_start (int): The first bullet id. Defaults to 0.
+            bullet_id_step (int): The step between bullet ids, so simulations sharing a world give out different ids. Defaults to 1.
+        """
+        self.seed = seed
+        self.tick = 0
+        self.players = {}
+        self.bullets = []
+        self.next_bullet_id = bullet_id_start
+        self.bullet_id_step = bullet_id_step
+        self.chunks = {}
+        self.player_chunks = set()
+        self.destroyed_trees = set()
+        self.events = []
+
+        # Player positions for lag compensated hits
+        self.lag_compensation_ticks = get_ticks(LAG_COMPENSATION_TIME)
+        self.history = PositionHistory(self.lag_compensation_ticks + 1, MAX_PLAYERS)
+        self.free_slots = list(range(MAX_PLAYERS - 1, -1, -1))
+        self.slot_ids = np.full(MAX_PLAYERS, -1, dtype=np.int64)
+
+        # Entities simulated elsewhere in a partitioned world, near enough to be hit and seen
+        self.ghost_players = {}
+        self.ghost_slots = {}
+        self.ghost_bullets = []
+
+    def add_player(self, player_id, player = None):
+        """
+        Adds a player at the starting position, or a player handed off from another simulation.
+
+        Args:
+            player_id (int): The player id.
+            player (ServerPlayer or None): The handed off player. Defaults to None.
+
+        Returns:
+            ServerPlayer or None: The added player, or None if the simulation is full.
+        """
+        if player_id in self.ghost_slots:
+            # The player was a ghost here, its position history stays valid
+            slot = self.ghost_slots.pop(player_id)
+        elif self.free_slots:
+            slot = self.free_slots.pop()
+            self.history.clear_slot(slot)
+        else:
+            return None
+
+        if player is None:
+            player = ServerPlayer(player_id, (0, 0), slot)
+        player.slot = slot
+        self.slot_ids[slot] = player_id
+        self.players[player_id] = player
+        return player
+
+    def remove_player(self, player_id, keep_history = False):
+        """
+        Removes a player.
+
+        Args:
+            player_id (int): The player id.
+            keep_history (bool): If True, the player stays as a ghost until the next set_ghosts, for players handed off to another simulation. Defaults to False.
+
+        Returns:
+            ServerPlayer or None: The removed player, or None if there was no such player.
+        """
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return None
+        if keep_history:
+            self.ghost_slots[player_id] = player.slot
+        else:
+            self.history.clear_slot(player.slot)
+            self.slot_ids[player.slot] = -1
+            self.free_slots.append(player.slot)
+        return player
+
+    def set_ghosts(self, players, bullets):
+        """
+        Sets the entities simulated elsewhere near this simulation. Ghost players are recorded in the position history so bullets here can hit them.
+
+        Args:
+            players (dict): The ghost players by id, as (x, y, angle) tuples.
+            bullets (list): The ghost bullets as (id, x, y, owner) tuples.
+        """
+        players = {player_id: state for player_id, state in players.items() if player_id not in self.players}
+        if bullets:
+            owned_bullets = {bullet[4] for bullet in self.bullets}
+            bullets = [bullet for bullet in bullets if bullet[0] not in owned_bullets]
+        for player_id in list(self.ghost_slots):
+            if player_id not in players:
+                slot = self.ghost_slots.pop(player_id)
+                self.history.clear_slot(slot)
+                self.slot_ids[slot] = -1
+                self.free_slots.append(slot)
+        for player_id in players:
+            if player_id not in self.ghost_slots and self.free_slots:
+                slot = self.free_slots.pop()
+                self.history.clear_slot(slot)
+                self.slot_ids[slot] = player_id
+                self.ghost_slots[player_id] = slot
+
+        self.ghost_players = players
+        self.ghost_bullets = bullets
+
+    def destroy_tree(self, x, y):
+        """
+        Destroys a tree destroyed by another simulation sharing the world.
+
+        Args:
+            x (int): The tree game x position.
+            y (int): The tree game y position.
+        """
+        self.destroyed_trees.add((x, y))
+        coords = get_chunk_coords((x, y))
+        trees = self.chunks.get(coords)
+        if trees is not None:
+            self.chunks[coords] = trees[(trees[:, 0] != x) | (trees[:, 1] != y)]
+
+    def update_chunks(self):
+        """
+        Keeps the chunks within CHUNK_RADIUS of any player loaded and unloads the rest. Destroyed trees are filtered from generated chunks.
+        """
+        player_chunks = {get_chunk_coords((player.pos[0] + GAME_WIDTH / 2, player.pos[1] + GAME_HEIGHT / 2)) for player in self.players.values()}
+        if player_chunks == self.player_chunks:
+            return
+        self.player_chunks = player_chunks
+
+        wanted_chunks = set()
+        for player_chunk in player_chunks:
+            for x in range(-CHUNK_RADIUS, CHUNK_RADIUS + 1):
+                for y in range(-CHUNK_RADIUS, CHUNK_RADIUS + 1):
+                    wanted_chunks.add((player_chunk[0] + x, player_chunk[1] + y))
+
+        for coords in list(self.chunks):
+            if coords not in wanted_chunks:
+                del self.chunks[coords]
+
+        for coords in wanted_chunks:
+            if coords not in self.chunks:
+                trees = worldgen.generate_foliage(self.seed, coords, CHUNK_SIZE)
+                if self.destroyed_trees:
+                    trees = trees[[(x, y) not in self.destroyed_trees for x, y in trees[:, :2].tolist()]]
+                self.chunks[coords] = trees
+
+    def hit_tree(self, pos):
+        """
+        Checks if a position hits a tree, destroying the tree if it does.
+
+        Args:
+            pos (list): The game position.
+
+        Returns:
+            bool: True if a tree was hit, False otherwise.
+        """
+        # Trees may reach into this chunk from the chunks to the left and above
+        reach = int(worldgen.TREE_SIZES.max())
+        for chunk_x in range(math.floor((pos[0] - reach) / CHUNK_SIZE), math.floor(pos[0] / CHUNK_SIZE) + 1):
+            for chunk_y in range(math.floor((pos[1] - reach) / CHUNK_SIZE), math.floor(pos[1] / CHUNK_SIZE) + 1):
+                trees = self.chunks.get((chunk_x, chunk_y))
+                if trees is None or not len(trees):
+                    continue
+
+                hits = np.flatnonzero((trees[:, 0] <= pos[0]) & (pos[0] < trees[:, 0] + trees[:, 2]) & (trees[:, 1] <= pos[1]) & (pos[1] < trees[:, 1] + trees[:, 2]))
+                if len(hits):
+                    x, y = trees[hits[0], :2].tolist()
+                    self.chunks[(chunk_x, chunk_y)] = np.delete(trees, hits[0], axis=0)
+                    self.destroyed_trees.add((x, y))
+                    self.events.append(TREE_DESTROYED_MESSAGE.pack(TREE_DESTROYED, x, y))
+                    return True
+        return False
+
+    def step(self):
+        """
+        Runs one tick of the simulation. Each player applies one queued input, or repeats its last input if none arrived.
+        """
+        for player in self.players.values():
+            if player.inputs:
+                player.input_sequence, player.buttons, player.angle, player.view_tick = player.inputs.popleft()
+
+            player.pos = move_player(player.pos, player.buttons, PLAYER_SPEED, SPT)
+
+            # Matches Gun.fire in the game
+            if player.cooldown > 0:
+                player.cooldown -= SPT
+            if player.cooldown <= TIME_EPSILON and player.buttons & FIRE:
+                pos, velocity = get_bullet_spawn(player.pos, player.angle)
+                # The shooter saw other players as they were in its last snapshot, so its bullets are judged against that time
+                latency = self.tick - player.view_tick if player.view_tick is not None else 0
+                self.bullets.append([pos, velocity, BULLET_SURVIVAL_TIME, player.id, self.next_bullet_id, min(max(latency, 0), self.lag_compensation_ticks)])
+                self.next_bullet_id = (self.next_bullet_id + self.bullet_id_step) % 65536
+                # The remainder carries over to the next shot, so the fire rate does not depend on the tick rate
+                player.cooldown += GUN_COOLDOWN
+            elif player.cooldown < 0:
+                player.cooldown = 0
+
+        self.update_chunks()
+
+        slots = [player.slot for player in self.players.values()] + [self.ghost_slots[player_id] for player_id in self.ghost_players if player_id in self.ghost_slots]
+        if slots:
+            positions = [player.pos for player in self.players.values()] + [state[:2] for player_id, state in self.ghost_players.items() if player_id in self.ghost_slots]
+            # Recorded under the tick of the snapshot these positions are sent in
+            self.history.record(self.tick + 1, np.array(slots), np.array(positions, dtype=np.float64))
+
+        for bullet in self.bullets:
+            bullet[0][0] += bullet[1][0] * SPT
+            bullet[0][1] += bullet[1][1] * SPT
+        player_hits = self.hit_players()
+
+        remaining_bullets = []
+        for bullet, hit_slot in zip(self.bullets, player_hits):
+            if hit_slot >= 0:
+                shooter = self.players.get(bullet[3])
+                if shooter is not None:
+                    shooter.hits += 1
+                continue
+            if self.hit_tree(bullet[0]):
+                continue
+            bullet[2] -= SPT
+            if bullet[2] > TIME_EPSILON:
+                remaining_bullets.append(bullet)
+        self.bullets = remaining_bullets
+
+        self.tick += 1
+
+    def hit_players(self):
+        """
+        Checks every bullet against the players, rewound to where the shooter saw them. All bullets are checked in one vectorized query.
+
+        Returns:
+            numpy.ndarray: The slot of the player hit by each bullet, or -1 if none was hit.
+        """
+        if not self.bullets or len(self.free_slots) == MAX_PLAYERS:
+            return np.full(len(self.bullets), -1)
+
+        bullet_positions = np.array([bullet[0] for bullet in self.bullets], dtype=np.float64)
+        latencies = np.array([bullet[5] for bullet in self.bullets])
+        owners = np.array([bullet[3] for bullet in self.bullets])
+
+        positions, valid = self.history.rewind(latencies)
+        # Player positions are the top left of the view, the body is at the center
+        offset_x = bullet_positions[:, 0, None] - positions[:, :, 0] - GAME_WIDTH / 2
+        offset_y = bullet_positions[:, 1, None] - positions[:, :, 1] - GAME_HEIGHT / 2
+        hits = valid & (np.abs(offset_x) < PLAYER_HIT_SIZE / 2) & (np.abs(offset_y) < PLAYER_HIT_SIZE / 2) & (self.slot_ids != owners[:, None])
+
+        return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+    def get_state(self):
+        """
+        Returns the quantized state of all players and bullets, including ghosts.
+
+        Returns:
+            tuple: A tuple containing the PLAYER_STATE and BULLET_STATE arrays.
+        """
+        players = [(player.id, player.pos[0], player.pos[1], player.angle) for player in self.players.values()]
+        players += [(player_id, *state) for player_id, state in self.ghost_players.items()]
+        bullets = [(bullet[4], bullet[0][0], bullet[0][1], bullet[3]) for bullet in self.bullets] + self.ghost_bullets
+        return snapshot.quantize_players(players), snapshot.quantize_bullets(bullets)
+
+
+class Room:
+    def __init__(self, seed, room_id = 0, id_start = 0, id_step = 1, subscribe_token = None):
+        """
+        Initializes a Room, a simulation and the connections of the clients playing in it. Rooms do no socket I/O, packets are passed in and returned.
+
+        Args:
+            seed (int): The world seed.
+            room_id (int): The room id. Defaults to 0.
+            id_start (int): The first player and bullet id. Defaults to 0.
+            id_step (int): The step between player and bullet ids, so rooms sharing a world give out different ids. Defaults to 1.
+            subscribe_token (bytes or None): The secret subscribe packets must carry, or None to refuse subscribers. Defaults to None.
+        """
+        self.id = room_id
+        self.subscribe_token = subscribe_token
+        self.simulation = Simulation(seed, id_start, id_step)
+        self.connections = {}
+        self.player_ids = {}
+        self.next_player_id = id_start
+        self.id_step = id_step
+        self.outgoing = []
+        # The simulation events of the last tick
+        self.events = []
+        # Addresses of removed or rejected clients, collected by the sharded server
+        self.closed_addresses = []
+
+        # States sent to each client by tick, and the last tick each client received, used as delta baselines
+        self.state_history = {}
+        self.baseline_ticks = {}
+        # Seconds the last tick spent building snapshots
+        self.snapshot_time = 0
+
+    def receive(self, data, address):
+        """
+        Handles a packet from a client. Clients either play, or subscribe to the snapshots of the whole room without a player, like spectator relays.
+
+        Args:
+            data (bytes): The packet.
+            address (tuple): The client address (host, port).
+        """
+        connection = self.connections.get(address)
+        if connection is None:
+            split = split_reliable(data)
+            if split is None or data[0] not in (CONNECT, SUBSCRIBE):
+                return
+            if data[0] == CONNECT:
+                if self.simulation.add_player(self.next_player_id) is None:
+                    self.closed_addresses.append(address)
+                    return
+                self.player_ids[address] = self.next_player_id
+                self.next_player_id = (self.next_player_id + self.id_step) % 65536
+            else:
+                # Subscribers get the whole room, so only holders of the token are accepted, or any spoofed address could be flooded with snapshots
+                token = data[split[1] + SUBSCRIBE_PAYLOAD.size:]
+                subscriber_count = len(self.connections) - len(self.player_ids)
+                if self.subscribe_token is None or not hmac.compare_digest(token, self.subscribe_token) or subscriber_count >= MAX_SUBSCRIBERS:
+                    self.closed_addresses.append(address)
+                    return
+            connection = Connection(address)
+            self.connections[address] = connection
+
+            # Late joiners need every tree destroyed so far
+            for x, y in self.simulation.destroyed_trees:
+                connection.send_reliable(TREE_DESTROYED_MESSAGE.pack(TREE_DESTROYED, x, y))
+
+        packet = connection.receive_packet(data)
+        if packet is None:
+            return
+        packet_type, payload, messages = packet
+        player_id = self.player_ids.get(address)
+
+        if packet_type in (CONNECT, SUBSCRIBE):
+            # Clients repeat CONNECT or SUBSCRIBE until accepted
+            accepted_id = SUBSCRIBER_ID if player_id is None else player_id
+            self.outgoing.append((connection.build_packet(ACCEPT, ACCEPT_PAYLOAD.pack(accepted_id, self.simulation.seed, self.simulation.tick)), address))
+        elif packet_type == INPUT:
+            if len(payload) < INPUT_HEADER.size:
+                return
+            baseline_tick, = INPUT_HEADER.unpack_from(payload)
+            if baseline_tick != snapshot.NO_BASELINE and (address not in self.baseline_ticks or baseline_tick > self.baseline_ticks[address]):
+                self.baseline_ticks[address] = baseline_tick
+            if player_id is not None:
+                inputs = [INPUT_ENTRY.unpack_from(payload, offset) for offset in range(INPUT_HEADER.size, len(payload) - INPUT_ENTRY.size + 1, INPUT_ENTRY.size)]
+                self.simulation.players[player_id].queue_inputs(inputs, None if baseline_tick == snapshot.NO_BASELINE else baseline_tick)
+        elif packet_type == DISCONNECT:
+            self.remove_connection(address)
+
+    def remove_connection(self, address):
+        """
+        Removes a client and its player.
+
+        Args:
+            address (tuple): The client address (host, port).
+        """
+        if self.connections.pop(address, None) is not None:
+            self.closed_addresses.append(address)
+        self.state_history.pop(address, None)
+        self.baseline_ticks.pop(address, None)
+        self.simulation.remove_player(self.player_ids.pop(address, None))
+
+    def export_client(self, address):
+        """
+        Removes a client and its player to hand them off to another room, keeping the connection state so the client does not notice.
+
+        Args:
+            address (tuple): The client address (host, port).
+
+        Returns:
+            tuple: The client record for import_client.
+        """
+        player = self.simulation.remove_player(self.player_ids.pop(address), keep_history=True)
+        return (address, self.connections.pop(address), player, self.state_history.pop(address, {}), self.baseline_ticks.pop(address, None))
+
+    def import_client(self, record):
+        """
+        Adds a client and its player handed off from another room.
+
+        Args:
+            record (tuple): The client record from export_client.
+        """
+        address, connection, player, state_history, baseline_tick = record
+        if self.simulation.add_player(player.id, player) is None:
+            self.closed_addresses.append(address)
+            return
+        self.connections[address] = connection
+        self.player_ids[address] = player.id
+        self.state_history[address] = state_history
+        if baseline_tick is not None:
+            self.baseline_ticks[address] = baseline_tick
+
+    def send_events(self, events):
+        """
+        Sends simulation events to every client as reliable messages.
+
+        Args:
+            events (list): The packed event messages.
+        """
+        for event in events:
+            for connection in self.connections.values():
+                connection.send_reliable(event)
+
+    def build_interest(self):
+        """
+        Builds the state shared by every client's snapshot this tick: the quantized state and spatial grids over it.
+
+        Returns:
+            tuple: A tuple containing the PLAYER_STATE and BULLET_STATE arrays, and a SpatialGrid for each.
+        """
+        players, bullets = self.simulation.get_state()
+        # Player positions are the top left of the view, the area of interest is around the player
+        player_grid = SpatialGrid(snapshot.get_positions(players) + (GAME_WIDTH / 2, GAME_HEIGHT / 2), INTEREST_CELL_SIZE)
+        bullet_grid = SpatialGrid(snapshot.get_positions(bullets), INTEREST_CELL_SIZE)
+        return players, bullets, player_grid, bullet_grid
+
+    def build_snapshot(self, address, interest):
+        """
+        Builds the snapshot payload for a client, containing only the entities near its player, delta encoded against the last snapshot the client received. Subscribers get every entity.
+
+        Entities entering or leaving the client's area are sent in full or as removed ids, so the work depends on the area, not on the world size.
+
+        Args:
+            address (tuple): The client address (host, port).
+            interest (tuple): The shared state built by build_interest.
+
+        Returns:
+            bytes: The snapshot payload.
+        """
+        simulation = self.simulation
+        players, bullets, player_grid, bullet_grid = interest
+        player_id = self.player_ids.get(address)
+        if player_id is None:
+            state = (players, bullets)
+            input_sequence = 0
+        else:
+            player = simulation.players[player_id]
+            center = (player.pos[0] + GAME_WIDTH / 2, player.pos[1] + GAME_HEIGHT / 2)
+            half_size = (GAME_WIDTH / 2 + VIEW_MARGIN, GAME_HEIGHT / 2 + VIEW_MARGIN)
+            state = (players[player_grid.query(center, half_size)], bullets[bullet_grid.query(center, half_size)])
+            input_sequence = player.input_sequence
+
+        history = self.state_history.setdefault(address, {})
+        history[simulation.tick] = state
+        history.pop(simulation.tick - get_ticks(SNAPSHOT_HISTORY_TIME), None)
+
+        baseline_tick = self.baseline_ticks.get(address, snapshot.NO_BASELINE)
+        if baseline_tick not in history:
+            baseline_tick = snapshot.NO_BASELINE
+        baseline = history.get(baseline_tick, (None, None))
+
+        tables = snapshot.encode_table(state[0], baseline[0]) + snapshot.encode_table(state[1], baseline[1])
+        return snapshot.encode_snapshot(simulation.tick, baseline_tick, input_sequence, tables)
+
+    def build_snapshots(self):
+        """
+        Builds the snapshot payload for every client.
+
+        Returns:
+            dict: The snapshot payloads by client address.
+        """
+        start_time = time.perf_counter()
+        interest = self.build_interest()
+        payloads = {address: self.build_snapshot(address, interest) for address in self.connections}
+        self.snapshot_time = time.perf_counter() - start_time
+        return payloads
+
+    def update(self):
+        """
+        Runs one tick of the room, then builds a snapshot for every client.
+
+        Returns:
+            list: A list of (packet, address) tuples to be sent.
+        """
+        current_time = time.perf_counter()
+        for address, connection in list(self.connections.items()):
+            if current_time - connection.last_receive_time > CONNECTION_TIMEOUT:
+                self.remove_connection(address)
+
+        self.simulation.step()
+
+        self.events = self.simulation.events
+        self.simulation.events = []
+        self.send_events(self.events)
+
+        outgoing = self.outgoing
+        self.outgoing = []
+        for address, payload in self.build_snapshots().items():
+            outgoing.append((self.connections[address].build_packet(SNAPSHOT, payload), address))
+        return outgoing
+
+
+class ServerMetrics:
+    def __init__(self):
+        """
+        Initializes ServerMetrics, the tick and snapshot time histograms of a server.
+
+        Observing only increments a bucket count, so it is cheap enough for every tick. Text is only formatted when scraped.
+        """
+        self.tick_counts = [0] * (len(TICK_TIME_BUCKETS) + 1)
+        self.tick_time_sum = 0
+        self.snapshot_counts = [0] * (len(SNAPSHOT_TIME_BUCKETS) + 1)
+        self.snapshot_time_sum = 0
+
+    def observe_tick(self, tick_time):
+        """
+        Records the duration of a tick.
+
+        Args:
+            tick_time (float): The tick duration in seconds.
+        """
+        self.tick_counts[bisect.bisect_left(TICK_TIME_BUCKETS, tick_time)] += 1
+        self.tick_time_sum += tick_time
+
+    def observe_snapshot(self, snapshot_time):
+        """
+        Records the time a room spent building the snapshots of a tick.
+
+        Args:
+            snapshot_time (float): The build duration in seconds.
+        """
+        self.snapshot_counts[bisect.bisect_left(SNAPSHOT_TIME_BUCKETS, snapshot_time)] += 1
+        self.snapshot_time_sum += snapshot_time
+
+    def export(self):
+        """
+        Returns the histograms observed since the last export, and resets them. Used by workers to report to the front process.
+
+        Returns:
+            tuple: A tuple containing the tick counts, tick time sum, snapshot counts and snapshot time sum.
+        """
+        histograms = (self.tick_counts, self.tick_time_sum, self.snapshot_counts, self.snapshot_time_sum)
+        self.tick_counts = [0] * len(self.tick_counts)
+        self.tick_time_sum = 0
+        self.snapshot_counts = [0] * len(self.snapshot_counts)
+        self.snapshot_time_sum = 0
+        return histograms
+
+    def merge(self, histograms):
+        """
+        Adds histograms exported by a worker.
+
+        Args:
+            histograms (tuple): The histograms returned by export.
+        """
+        tick_counts, tick_time_sum, snapshot_counts, snapshot_time_sum = histograms
+        self.tick_counts = [count + other for count, other in zip(self.tick_counts, tick_counts)]
+        self.tick_time_sum += tick_time_sum
+        self.snapshot_counts = [count + other for count, other in zip(self.snapshot_counts, snapshot_counts)]
+        self.snapshot_time_sum += snapshot_time_sum
+
+    def format(self, bytes_sent, bytes_received, overruns, clients, rooms):
+        """
+        Formats the metrics in the Prometheus text format.
+
+        Args:
+            bytes_sent (int): The bytes sent since the server started.
+            bytes_received (int): The bytes received since the server started.
+            overruns (int): The ticks which ran over their time since the server started.
+            clients (int): The connected clients.
+            rooms (dict): The (player count, bullet count) of each room by room id.
+
+        Returns:
+            str: The metrics text.
+        """
+        lines = []
+        for name, description, buckets, counts, total in (
+                ("lakeserver_tick_duration_seconds", "Duration of server ticks.", TICK_TIME_BUCKETS, self.tick_counts, self.tick_time_sum),
+                ("lakeserver_snapshot_encode_seconds", "Time a room spent building the snapshots of a tick.", SNAPSHOT_TIME_BUCKETS, self.snapshot_counts, self.snapshot_time_sum)):
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+            # Prometheus buckets are cumulative
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{"+Inf" if bound == float("inf") else repr(bound)}"}} {cumulative}')
+            lines += [f"{name}_sum {total!r}", f"{name}_count {cumulative}"]
+
+        for name, metric_type, description, value in (
+                ("lakeserver_tick_overruns_total", "counter", "Ticks which ran over their time.", overruns),
+                ("lakeserver_sent_bytes_total", "counter", "UDP payload bytes sent.", bytes_sent),
+                ("lakeserver_received_bytes_total", "counter", "UDP payload bytes received.", bytes_received),
+                ("lakeserver_connected_clients", "gauge", "Connected clients, including subscribers.", clients)):
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+
+        for name, description, index in (("lakeserver_room_players", "Players simulated by each room.", 0), ("lakeserver_room_bullets", "Bullets simulated by each room.", 1)):
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{room="{room_id}"}} {counts[index]}' for room_id, counts in sorted(rooms.items())]
+        return "\n".join(lines) + "\n"
+
+
+class GameServer(asyncio.DatagramProtocol):
+    def __init__(self, room):
+        """
+        Initializes a GameServer, which runs a Room at a fixed tick rate over UDP.
+
+        Args:
+            room (Room): The room to run.
+        """
+        self.room = room
+        self.transport = None
+        self.running = True
+        self.overruns = 0
+
+        # Traffic and tick durations of the last minute, read by load tests
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tick_times = collections.deque(maxlen=TPS * 60)
+        self.metrics = ServerMetrics()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        # Packets are only parsed and queued here, the simulation runs in the tick loop
+        self.bytes_received += len(data)
+        self.room.receive(data, address)
+
+    async def run(self):
+        """
+        Fixed tick loop. Socket I/O is handled by the event loop between ticks, and sends never block.
+        """
+        loop = asyncio.get_running_loop()
+        next_tick_time = loop.time()
+        while self.running:
+            start_time = time.perf_counter()
+            for packet, address in self.room.update():
+                self.bytes_sent += len(packet)
+                self.transport.sendto(packet, address)
+            # Only servers routing by address need the closed addresses
+            self.room.closed_addresses.clear()
+            tick_time = time.perf_counter() - start_time
+            self.tick_times.append(tick_time)
+            self.metrics.observe_tick(tick_time)
+            self.metrics.observe_snapshot(self.room.snapshot_time)
+
+            next_tick_time += SPT
+            delay = next_tick_time - loop.time()
+            if delay < 0:
+                # Too far behind to catch up, skip the missed ticks
+                self.overruns += 1
+                next_tick_time = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def format_metrics(self):
+        """
+        Formats the server metrics in the Prometheus text format.
+
+        Returns:
+            str: The metrics text.
+        """
+        simulation = self.room.simulation
+        rooms = {self.room.id: (len(simulation.players), len(simulation.bullets))}
+        return self.metrics.format(self.bytes_sent, self.bytes_received, self.overruns, len(self.room.connections), rooms)
+
+
+class WorkerWriter:
+    def __init__(self, connection):
+        """
+        Initializes a WorkerWriter, which writes messages to a worker process without blocking the event loop.
+
+        Messages are queued and written as one batch per event loop iteration. Whatever the pipe does not take is written once it is writable again, so a stalled worker never stalls the front process and the other workers.
+
+        Args:
+            connection (multiprocessing.connection.Connection): The pipe to the worker, which reads each batch with Connection.recv.
+        """
+        # Pipes are socket pairs on posix, a duplicate socket sends with MSG_DONTWAIT while reads on the connection stay blocking
+        self.socket = socket.fromfd(connection.fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+        self.batch = []
+        self.buffer = bytearray()
+        self.flush_scheduled = False
+
+    def stalled(self):
+        """
+        Checks if the worker stopped reading, so datagrams for it should be dropped.
+
+        Returns:
+            bool: True if WORKER_BUFFER_SIZE bytes or more are waiting to be written, False otherwise.
+        """
+        return len(self.buffer) >= WORKER_BUFFER_SIZE
+
+    def send(self, message):
+        """
+        Queues a message, written with the others queued in this event loop iteration.
+
+        Args:
+            message (tuple): The message.
+        """
+        self.batch.append(message)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        """
+        Writes the queued batch.
+        """
+        self.flush_scheduled = False
+        if self.batch:
+            payload = pickle.dumps(self.batch, pickle.HIGHEST_PROTOCOL)
+            # Framed like Connection.send, so the worker reads each batch with Connection.recv
+            self.buffer += struct.pack("!i", len(payload)) + payload
+            self.batch = []
+            self.write()
+
+    def write(self):
+        """
+        Writes as much of the buffer as the pipe takes without blocking, and waits for the pipe to be writable again if some is left.
+        """
+        try:
+            del self.buffer[:self.socket.send(self.buffer, socket.MSG_DONTWAIT)]
+        except BlockingIOError:
+            pass
+        loop = asyncio.get_running_loop()
+        if self.buffer:
+            loop.add_writer(self.socket.fileno(), self.write)
+        else:
+            loop.remove_writer(self.socket.fileno())
+
+    def close(self):
+        """
+        Writes everything left, blocking if needed, and closes the duplicate socket. Used when stopping the worker.
+        """
+        self.flush()
+        asyncio.get_running_loop().remove_writer(self.socket.fileno())
+        if self.buffer:
+            self.socket.sendall(self.buffer)
+        self.socket.close()
+
+
+class ShardedServer(asyncio.DatagramProtocol):
+    def __init__(self, seed, worker_count = None, room_size = MAX_PLAYERS, subscribe_token = None):
+        """
+        Initializes a ShardedServer, which runs many independent rooms across a pool of worker processes.
+
+        This front process owns the socket. It places new clients in rooms and routes their datagrams to the worker owning the room, and workers send their packets back through it, so clients only ever see one address.
+
+        Args:
+            seed (int): The world seed of every room.
+            worker_count (int or None): The number of worker processes. Defaults to the number of cores.
+            room_size (int): The players per room, at most MAX_PLAYERS. Defaults to MAX_PLAYERS.
+            subscribe_token (bytes or None): The secret subscribe packets must carry, or None to refuse subscribers. Defaults to None.
+        """
+        self.seed = seed
+        self.subscribe_token = subscribe_token
+        self.worker_count = worker_count or os.cpu_count()
+        self.room_size = min(room_size, MAX_PLAYERS)
+        self.transport = None
+        self.running = True
+
+        self.workers = []
+        self.worker_connections = []
+        self.worker_writers = []
+        self.datagrams_dropped = 0
+        # Reported by each worker every second
+        self.worker_metrics = [{"rooms": 0, "players": 0, "tick_time_mean": 0, "tick_time_p99": 0, "tick_time_max": 0, "overruns": 0, "room_counts": {}} for _ in range(self.worker_count)]
+        self.metrics = ServerMetrics()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        self.next_room_id = 0
+        self.room_workers = {}
+        self.room_addresses = {}
+        self.room_subscribers = {}
+        self.client_rooms = {}
+
+    def start_workers(self):
+        """
+        Starts the worker processes and reads their packets on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        # Spawned workers do not inherit the event loop or the socket
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.worker_count):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=run_worker, args=(worker_connection, self.seed, self.subscribe_token), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+            self.worker_connections.append(connection)
+            self.worker_writers.append(WorkerWriter(connection))
+            loop.add_reader(connection.fileno(), self.receive_worker, index)
+
+    def stop_workers(self):
+        """
+        Stops the worker processes, after writing what is left for them.
+        """
+        loop = asyncio.get_running_loop()
+        for connection, writer, worker in zip(self.worker_connections, self.worker_writers, self.workers):
+            loop.remove_reader(connection.fileno())
+            writer.send((WORKER_STOP,))
+            writer.close()
+            worker.join()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.bytes_received += len(data)
+        room_id = self.client_rooms.get(address)
+        if room_id is None:
+            if len(data) < PACKET_HEADER.size:
+                return
+            if data[0] == CONNECT:
+                room_id = self.place_client(address)
+            elif data[0] == SUBSCRIBE and len(data) >= PACKET_HEADER.size + SUBSCRIBE_PAYLOAD.size:
+                # Subscribers watch a room, and do not count towards its size
+                room_id, = SUBSCRIBE_PAYLOAD.unpack_from(data, PACKET_HEADER.size)
+                if room_id not in self.room_workers:
+                    return
+                self.client_rooms[address] = room_id
+                self.room_subscribers.setdefault(room_id, set()).add(address)
+            else:
+                return
+        worker_index = self.room_workers.get(room_id)
+        if worker_index is None:
+            # The room closed, the client has to connect or subscribe again
+            del self.client_rooms[address]
+            return
+        writer = self.worker_writers[worker_index]
+        if writer.stalled():
+            # Its clients resend what matters
+            self.datagrams_dropped += 1
+            return
+        writer.send((WORKER_DATAGRAM, room_id, address, data))
+
+    def place_client(self, address):
+        """
+        Places a new client in the fullest room with space left, so rooms fill up before new ones are made. New rooms go to the least loaded worker.
+
+        Args:
+            address (tuple): The client address (host, port).
+
+        Returns:
+            int: The room id.
+        """
+        open_rooms = [room_id for room_id, addresses in self.room_addresses.items() if len(addresses) < self.room_size]
+        if open_rooms:
+            room_id = max(open_rooms, key=lambda room_id: len(self.room_addresses[room_id]))
+        else:
+            room_id = self.next_room_id
+            self.next_room_id += 1
+            # Rooms created since the last report are counted, or a burst of clients would all land on one worker
+            rooms_per_worker = collections.Counter(self.room_workers.values())
+            worker_index = min(range(self.worker_count), key=lambda index: (rooms_per_worker[index], self.worker_metrics[index]["tick_time_mean"]))
+            self.room_workers[room_id] = worker_index
+            self.room_addresses[room_id] = set()
+            self.worker_writers[worker_index].send((WORKER_CREATE_ROOM, room_id))
+
+        self.room_addresses[room_id].add(address)
+        self.client_rooms[address] = room_id
+        return room_id
+
+    def receive_worker(self, index):
+        """
+        Sends the packets of a worker, forgets its closed clients, and closes rooms left empty.
+
+        Args:
+            index (int): The worker index.
+        """
+        connection = self.worker_connections[index]
+        while connection.poll():
+            outgoing, closed_addresses, metrics = connection.recv()
+            for packet, address in outgoing:
+                self.bytes_sent += len(packet)
+                self.transport.sendto(packet, address)
+
+            for address in closed_addresses:
+                room_id = self.client_rooms.pop(address, None)
+                self.room_subscribers.get(room_id, set()).discard(address)
+                addresses = self.room_addresses.get(room_id)
+                if addresses is None or address not in addresses:
+                    continue
+                addresses.discard(address)
+                if not addresses:
+                    del self.room_addresses[room_id]
+                    del self.room_workers[room_id]
+                    # Room ids are never reused, so the subscribers of a closed room are forgotten with it
+                    for subscriber in self.room_subscribers.pop(room_id, ()):
+                        self.client_rooms.pop(subscriber, None)
+                    self.worker_writers[index].send((WORKER_CLOSE_ROOM, room_id))
+
+            if metrics is not None:
+                self.metrics.merge(metrics.pop("histograms"))
+                self.worker_metrics[index] = metrics
+
+    def format_metrics(self):
+        """
+        Formats the server metrics in the Prometheus text format. Tick metrics are the ones reported by the workers, up to a second old.
+
+        Returns:
+            str: The metrics text.
+        """
+        rooms = {room_id: counts for metrics in self.worker_metrics for room_id, counts in metrics["room_counts"].items()}
+        overruns = sum(metrics["overruns"] for metrics in self.worker_metrics)
+        return self.metrics.format(self.bytes_sent, self.bytes_received, overruns, len(self.client_rooms), rooms)
+
+    async def run(self):
+        """
+        Runs until stopped. Packets are handled by the event loop, the simulation runs in the workers.
+        """
+        self.start_workers()
+        while self.running:
+            await asyncio.sleep(0.1)
+        self.stop_workers()
+
+
+class PartitionedServer(asyncio.DatagramProtocol):
+    def __init__(self, seed, partition):
+        """
+        Initializes a PartitionedServer, which simulates one large world split into regions, each run by its own worker process.
+
+        The front process owns the socket and drives the workers in lockstep, one tick message each per tick. Players and bullets crossing a region border are handed off to the worker owning the new region. Entities near a border are mirrored to every worker as ghosts one tick later, so bullets hit across borders and clients see across them.
+
+        Args:
+            seed (int): The world seed.
+            partition (WorldPartition): How the world is split between workers.
+        """
+        self.seed = seed
+        self.partition = partition
+        self.worker_count = partition.region_count
+        self.transport = None
+        self.running = True
+        self.overruns = 0
+        self.handoffs = 0
+
+        self.workers = []
+        self.worker_connections = []
+        self.worker_writers = []
+        self.datagrams_dropped = 0
+        # Reported by each worker every second
+        self.worker_metrics = [{"players": 0, "bullets": 0, "ghosts": 0, "tick_time_mean": 0, "tick_time_p99": 0, "tick_time_max": 0} for _ in range(self.worker_count)]
+        self.metrics = ServerMetrics()
+        self.client_workers = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        # Handed off bullets waiting for the next tick, by worker, and the ghosts and events of the last tick
+        self.handed_bullets = [[] for _ in range(self.worker_count)]
+        self.ghost_players = {}
+        self.ghost_bullets = []
+        self.events = [[] for _ in range(self.worker_count)]
+
+        self.replies = {}
+        self.replies_ready = None
+
+    def start_workers(self):
+        """
+        Starts the worker processes and reads their replies on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        # Spawned workers do not inherit the event loop or the socket
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.worker_count):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=run_region_worker, args=(worker_connection, self.seed, self.partition, index), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+            self.worker_connections.append(connection)
+            self.worker_writers.append(WorkerWriter(connection))
+            loop.add_reader(connection.fileno(), self.receive_worker, index)
+
+    def stop_workers(self):
+        """
+        Stops the worker processes.
+        """
+        loop = asyncio.get_running_loop()
+        for connection, writer, worker in zip(self.worker_connections, self.worker_writers, self.workers):
+            loop.remove_reader(connection.fileno())
+            writer.send((WORKER_STOP,))
+            writer.close()
+            worker.join()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.bytes_received += len(data)
+        index = self.client_workers.get(address)
+        if index is None:
+            if len(data) < PACKET_HEADER.size or data[0] != CONNECT:
+                return
+            # New players start at the origin
+            index = self.partition.get_region((GAME_WIDTH / 2, GAME_HEIGHT / 2))
+            self.client_workers[address] = index
+        writer = self.worker_writers[index]
+        if writer.stalled():
+            # Its clients resend what matters
+            self.datagrams_dropped += 1
+            return
+        writer.send((WORKER_DATAGRAM, index, address, data))
+
+    def receive_worker(self, index):
+        """
+        Stores the tick reply of a worker, and wakes the tick loop once every worker replied.
+
+        Args:
+            index (int): The worker index.
+        """
+        connection = self.worker_connections[index]
+        while connection.poll():
+            self.replies[index] = connection.recv()
+        if len(self.replies) == self.worker_count and self.replies_ready is not None and not self.replies_ready.done():
+            self.replies_ready.set_result(None)
+
+    def route_replies(self):
+        """
+        Sends the packets of every worker, hands off clients to their new workers right away, and routes bullets, ghosts and events to the workers for the next tick.
+        """
+        self.ghost_players = {}
+        self.ghost_bullets = []
+        for index in range(self.worker_count):
+            outgoing, closed_addresses, clients, bullets, ghost_players, ghost_bullets, events, metrics = self.replies[index]
+            for packet, address in outgoing:
+                self.bytes_sent += len(packet)
+                self.transport.sendto(packet, address)
+            for address in closed_addresses:
+                self.client_workers.pop(address, None)
+
+            for record in clients:
+                pos = record[2].pos
+                destination = self.partition.get_region((pos[0] + GAME_WIDTH / 2, pos[1] + GAME_HEIGHT / 2))
+                # The record is queued ahead of the datagrams now routed to the destination, so it knows the client before they arrive
+                self.worker_writers[destination].send((WORKER_HANDOFF, record))
+                self.client_workers[record[0]] = destination
+            if bullets:
+                for bullet, destination in zip(bullets, self.partition.get_regions(np.array([bullet[0] for bullet in bullets])).tolist()):
+                    self.handed_bullets[destination].append(bullet)
+            self.handoffs += len(clients) + len(bullets)
+
+            self.ghost_players.update(ghost_players)
+            self.ghost_bullets.extend(ghost_bullets)
+            for other in range(self.worker_count):
+                if other != index:
+                    self.events[other].extend(events)
+
+            if metrics is not None:
+                self.metrics.merge(metrics.pop("histograms"))
+                self.worker_metrics[index] = metrics
+        self.replies = {}
+
+    async def run(self):
+        """
+        Fixed tick loop. Each tick every worker is sent its handed off bullets, the ghosts and the events of other workers, and the tick waits for all of them to reply.
+        """
+        loop = asyncio.get_running_loop()
+        self.start_workers()
+        next_tick_time = loop.time()
+        while self.running:
+            self.replies_ready = loop.create_future()
+            for index, writer in enumerate(self.worker_writers):
+                writer.send((WORKER_TICK, self.handed_bullets[index], self.ghost_players, self.ghost_bullets, self.events[index]))
+                self.handed_bullets[index] = []
+                self.events[index] = []
+            start_time = time.perf_counter()
+            await self.replies_ready
+            self.route_replies()
+            # The front tick time covers the slowest worker and the routing
+            self.metrics.observe_tick(time.perf_counter() - start_time)
+
+            next_tick_time += SPT
+            delay = next_tick_time - loop.time()
+            if delay < 0:
+                # Too far behind to catch up, skip the missed ticks
+                self.overruns += 1
+                next_tick_time = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+        self.stop_workers()
+
+    def format_metrics(self):
+        """
+        Formats the server metrics in the Prometheus text format. Each region is reported as a room, and snapshot times are the ones reported by the workers, up to a second old.
+
+        Returns:
+            str: The metrics text.
+        """
+        rooms = {index: (metrics["players"], metrics["bullets"]) for index, metrics in enumerate(self.worker_metrics)}
+        return self.metrics.format(self.bytes_sent, self.bytes_received, self.overruns, len(self.client_workers), rooms)
+
+
+class ClientSession:
+    def __init__(self):
+        """
+        Initializes a ClientSession, the client side of the protocol. Sessions do no socket I/O, packets are passed in and returned.
+        """
+        self.connection = None
+        self.accepted = False
+        self.player_id = None
+        self.seed = None
+        self.snapshot = None
+        self.snapshots = {}
+        self.destroyed_trees = []
+        self.input_sequence = 0
+        self.sent_inputs = collections.deque(maxlen=4)
+
+    def build_connect(self, address):
+        """
+        Builds a connect packet. Should be sent repeatedly until accepted.
+
+        Args:
+            address (tuple): The server address (host, port).
+
+        Returns:
+            bytes: The packet.
+        """
+        if self.connection is None:
+            self.connection = Connection(address)
+        return self.connection.build_packet(CONNECT)
+
+    def build_subscribe(self, address, room_id = 0, token = b""):
+        """
+        Builds a subscribe packet, to receive the snapshots of a whole room without playing. Should be sent repeatedly until accepted.
+
+        Args:
+            address (tuple): The server address (host, port).
+            room_id (int): The room to watch on a sharded server. Defaults to 0.
+            token (bytes): The subscribe token the server was started with. Defaults to b"".
+
+        Returns:
+            bytes: The packet.
+        """
+        if self.connection is None:
+            self.connection = Connection(address)
+        return self.connection.build_packet(SUBSCRIBE, SUBSCRIBE_PAYLOAD.pack(room_id) + token)
+
+    def build_ack(self):
+        """
+        Builds an input packet without inputs, which only tells the server the last received snapshot. Sent by subscribers every tick.
+
+        Returns:
+            bytes: The packet.
+        """
+        baseline_tick = self.snapshot["tick"] if self.snapshot else snapshot.NO_BASELINE
+        return self.connection.build_packet(INPUT, INPUT_HEADER.pack(baseline_tick))
+
+    def build_input(self, buttons, angle):
+        """
+        Builds an input packet for the next tick. The last few inputs are resent with it, so a lost packet does not lose inputs.
+
+        Args:
+            buttons (int): The input button bits.
+            angle (float): The normalized gun angle.
+
+        Returns:
+            bytes: The packet.
+        """
+        self.input_sequence += 1
+        self.sent_inputs.append(INPUT_ENTRY.pack(self.input_sequence, buttons, angle))
+        # The last received snapshot tick tells the server which baseline to delta encode against
+        baseline_tick = self.snapshot["tick"] if self.snapshot else snapshot.NO_BASELINE
+        return self.connection.build_packet(INPUT, INPUT_HEADER.pack(baseline_tick) + b"".join(self.sent_inputs))
+
+    def build_disconnect(self):
+        """
+        Builds a disconnect packet.
+
+        Returns:
+            bytes: The packet.
+        """
+        return self.connection.build_packet(DISCONNECT)
+
+    def receive(self, data):
+        """
+        Handles a packet from the server.
+
+        Args:
+            data (bytes): The packet.
+
+        Returns:
+            int or None: The packet type, or None if the packet was dropped.
+        """
+        if self.connection is None:
+            return None
+        packet = self.connection.receive_packet(data)
+        if packet is None:
+            return None
+        packet_type, payload, messages = packet
+
+        for message in messages:
+            # Malformed messages are skipped, the server never sends them
+            if len(message) == TREE_DESTROYED_MESSAGE.size and message[0] == TREE_DESTROYED:
+                self.destroyed_trees.append(TREE_DESTROYED_MESSAGE.unpack(message)[1:])
+
+        if packet_type == ACCEPT:
+            if len(payload) != ACCEPT_PAYLOAD.size:
+                return None
+            self.player_id, self.seed, tick = ACCEPT_PAYLOAD.unpack(payload)
+            self.accepted = True
+        elif packet_type == SNAPSHOT:
+            if len(payload) < snapshot.SNAPSHOT_HEADER.size:
+                return None
+            decoded = snapshot.decode_snapshot(payload, self.snapshots)
+            # Late snapshots are still kept as baselines, but never replace a newer one
+            if decoded is not None:
+                self.snapshots[decoded["tick"]] = decoded
+                self.snapshots.pop(decoded["tick"] - get_ticks(SNAPSHOT_HISTORY_TIME), None)
+                if self.snapshot is None or decoded["tick"] > self.snapshot["tick"]:
+                    self.snapshot = decoded
+        return packet_type
+
+    def get_player(self, player_id):
+        """
+        Returns the state of a player in the latest snapshot.
+
+        Args:
+            player_id (int): The player id.
+
+        Returns:
+            tuple or None: A tuple containing the game position (x, y) and gun angle, or None if the player is not in the snapshot.
+        """
+        players = self.snapshot["players"] if self.snapshot else None
+        if players is None:
+            return None
+        index = np.searchsorted(players["id"], player_id)
+        if index == len(players) or players["id"][index] != player_id:
+            return None
+        player = players[index]
+        return (player["x"] / snapshot.POSITION_SCALE, player["y"] / snapshot.POSITION_SCALE), player["angle"] / snapshot.ANGLE_SCALE
+
+
+class GameClient(asyncio.DatagramProtocol):
+    def __init__(self, address):
+        """
+        Initializes a GameClient, a headless asyncio client used for testing and bots.
+
+        Args:
+            address (tuple): The server address (host, port).
+        """
+        self.address = address
+        self.session = ClientSession()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.session.receive(data)
+
+    async def connect(self, timeout = 5):
+        """
+        Connects to the server, resending the connect packet until accepted.
+
+        Args:
+            timeout (float): Seconds to wait before giving up. Defaults to 5.
+
+        Returns:
+            bool: True if accepted, False otherwise.
+        """
+        end_time = time.perf_counter() + timeout
+        while not self.session.accepted and time.perf_counter() < end_time:
+            self.transport.sendto(self.session.build_connect(self.address))
+            await asyncio.sleep(0.1)
+        return self.session.accepted
+
+    def send_input(self, buttons, angle):
+        """
+        Sends the input for the next tick.
+
+        Args:
+            buttons (int): The input button bits.
+            angle (float): The normalized gun angle.
+        """
+        self.transport.sendto(self.session.build_input(buttons, angle))
+
+    def disconnect(self):
+        """
+        Tells the server the client is leaving and closes the socket.
+        """
+        self.transport.sendto(self.session.build_disconnect())
+        self.transport.close()
+
+
+def run_worker(connection, seed, subscribe_token = None):
+    """
+    The main loop of a worker process. Runs its rooms at a fixed tick rate and handles messages from the front process between ticks.
+
+    Args:
+        connection (multiprocessing.connection.Connection): The pipe to the front process.
+        seed (int): The world seed of every room.
+        subscribe_token (bytes or None): The secret subscribe packets must carry, or None to refuse subscribers. Defaults to None.
+    """
+    rooms = {}
+    tick_times = []
+    server_metrics = ServerMetrics()
+    overruns = 0
+    next_tick_time = time.perf_counter()
+    while True:
+        while True:
+            remaining = next_tick_time - time.perf_counter()
+            if remaining <= 0 or not connection.poll(remaining):
+                break
+            # The front process sends messages in batches
+            for message in connection.recv():
+                if message[0] == WORKER_DATAGRAM:
+                    room = rooms.get(message[1])
+                    if room is not None:
+                        room.receive(message[3], message[2])
+                elif message[0] == WORKER_CREATE_ROOM:
+                    rooms[message[1]] = Room(seed, message[1], subscribe_token=subscribe_token)
+                elif message[0] == WORKER_CLOSE_ROOM:
+                    rooms.pop(message[1], None)
+                elif message[0] == WORKER_STOP:
+                    return
+
+        start_time = time.perf_counter()
+        outgoing = []
+        closed_addresses = []
+        for room in rooms.values():
+            outgoing.extend(room.update())
+            closed_addresses.extend(room.closed_addresses)
+            room.closed_addresses.clear()
+            server_metrics.observe_snapshot(room.snapshot_time)
+        tick_times.append(time.perf_counter() - start_time)
+        server_metrics.observe_tick(tick_times[-1])
+
+        metrics = None
+        if len(tick_times) >= TPS:
+            tick_times.sort()
+            metrics = {"rooms": len(rooms), "players": sum(len(room.connections) for room in rooms.values()),
+                       "tick_time_mean": sum(tick_times) / len(tick_times), "tick_time_p99": tick_times[int(len(tick_times) * 0.99)], "tick_time_max": tick_times[-1], "overruns": overruns,
+                       "room_counts": {room_id: (len(room.simulation.players), len(room.simulation.bullets)) for room_id, room in rooms.items()}, "histograms": server_metrics.export()}
+            tick_times.clear()
+        connection.send((outgoing, closed_addresses, metrics))
+
+        next_tick_time += SPT
+        if next_tick_time < time.perf_counter():
+            # Too far behind to catch up, skip the missed ticks
+            overruns += 1
+            next_tick_time = time.perf_counter()
+
+def run_region_worker(connection, seed, partition, index):
+    """
+    The main loop of a region worker process. Handles datagrams between ticks, and runs a tick of its region for each tick message from the front process.
+
+    Args:
+        connection (multiprocessing.connection.Connection): The pipe to the front process.
+        seed (int): The world seed.
+        partition (WorldPartition): How the world is split between workers.
+        index (int): The region index of this worker.
+    """
+    # Every region gives out different player and bullet ids
+    room = Room(seed, index, index, partition.region_count)
+    simulation = room.simulation
+    center_offset = np.array((GAME_WIDTH / 2, GAME_HEIGHT / 2))
+    tick_times = []
+    server_metrics = ServerMetrics()
+    messages = collections.deque()
+    while True:
+        if not messages:
+            # The front process sends messages in batches
+            messages.extend(connection.recv())
+        message = messages.popleft()
+        if message[0] == WORKER_DATAGRAM:
+            room.receive(message[3], message[2])
+            continue
+        elif message[0] == WORKER_HANDOFF:
+            room.import_client(message[1])
+            continue
+        elif message[0] == WORKER_STOP:
+            return
+
+        start_time = time.perf_counter()
+        bullets, ghost_players, ghost_bullets, events = message[1:]
+        simulation.bullets.extend(bullets)
+        simulation.set_ghosts(ghost_players, ghost_bullets)
+        for event in events:
+            simulation.destroy_tree(*TREE_DESTROYED_MESSAGE.unpack(event)[1:])
+        room.send_events(events)
+
+        outgoing = room.update()
+
+        # Hand off entities which left the region, they stay here as ghosts until the next tick
+        handed_clients = []
+        if simulation.players:
+            addresses = list(room.player_ids)
+            centers = np.array([simulation.players[room.player_ids[address]].pos for address in addresses]) + center_offset
+            for address, region in zip(addresses, partition.get_regions(centers).tolist()):
+                if region != index:
+                    handed_clients.append(room.export_client(address))
+        handed_bullets = []
+        if simulation.bullets:
+            regions = partition.get_regions(np.array([bullet[0] for bullet in simulation.bullets]))
+            handed_bullets = [bullet for bullet, region in zip(simulation.bullets, regions.tolist()) if region != index]
+            simulation.bullets = [bullet for bullet, region in zip(simulation.bullets, regions.tolist()) if region == index]
+
+        # Ghosts are every entity near a border, including the ones just handed off
+        players = list(simulation.players.values()) + [record[2] for record in handed_clients]
+        ghost_players = {}
+        if players:
+            near = partition.near_border(np.array([player.pos for player in players]) + center_offset)
+            ghost_players = {player.id: (player.pos[0], player.pos[1], player.angle) for player, is_near in zip(players, near.tolist()) if is_near}
+        bullets = simulation.bullets + handed_bullets
+        ghost_bullets = []
+        if bullets:
+            near = partition.near_border(np.array([bullet[0] for bullet in bullets]))
+            ghost_bullets = [(bullet[4], bullet[0][0], bullet[0][1], bullet[3]) for bullet, is_near in zip(bullets, near.tolist()) if is_near]
+
+        tick_times.append(time.perf_counter() - start_time)
+        # Region tick times are already covered by the front tick time, only snapshot times are reported
+        server_metrics.observe_snapshot(room.snapshot_time)
+        metrics = None
+        if len(tick_times) >= TPS:
+            tick_times.sort()
+            metrics = {"players": len(simulation.players), "bullets": len(simulation.bullets), "ghosts": len(simulation.ghost_players) + len(simulation.ghost_bullets),
+                       "tick_time_mean": sum(tick_times) / len(tick_times), "tick_time_p99": tick_times[int(len(tick_times) * 0.99)], "tick_time_max": tick_times[-1], "histograms": server_metrics.export()}
+            tick_times.clear()
+
+        connection.send((outgoing, room.closed_addresses, handed_clients, handed_bullets, ghost_players, ghost_bullets, room.events, metrics))
+        room.closed_addresses = []
+
+async def start_server(host = "127.0.0.1", port = DEFAULT_PORT, seed = 0, subscribe_token = None):
+    """
+    Starts a GameServer and its tick loop on the running event loop.
+
+    Args:
+        host (str): The host to bind. Defaults to "127.0.0.1".
+        port (int): The port to bind. Defaults to DEFAULT_PORT.
+        seed (int): The world seed. Defaults to 0.
+        subscribe_token (bytes or None): The secret subscribe packets must carry, or None to refuse subscribers. Defaults to None.
+
+    Returns:
+        tuple: A tuple containing the GameServer and its tick loop task.
+    """
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: GameServer(Room(seed, subscribe_token=subscribe_token)), local_addr=(host, port))
+    return server, asyncio.create_task(server.run())
+
+async def start_sharded_server(host = "127.0.0.1", port = DEFAULT_PORT, seed = 0, worker_count = None, room_size = MAX_PLAYERS, subscribe_token = None):
+    """
+    Starts a ShardedServer, its worker processes and its loop on the running event loop.
+
+    Args:
+        host (str): The host to bind. Defaults to "127.0.0.1".
+        port (int): The port to bind. Defaults to DEFAULT_PORT.
+        seed (int): The world seed. Defaults to 0.
+        worker_count (int or None): The number of worker processes. Defaults to the number of cores.
+        room_size (int): The players per room. Defaults to MAX_PLAYERS.
+        subscribe_token (bytes or None): The secret subscribe packets must carry, or None to refuse subscribers. Defaults to None.
+
+    Returns:
+        tuple: A tuple containing the ShardedServer and its loop task.
+    """
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: ShardedServer(seed, worker_count, room_size, subscribe_token), local_addr=(host, port))
+    return server, asyncio.create_task(server.run())
+
+async def start_partitioned_server(host = "127.0.0.1", port = DEFAULT_PORT, seed = 0, partition = None):
+    """
+    Starts a PartitionedServer, its region worker processes and its tick loop on the running event loop.
+
+    Args:
+        host (str): The host to bind. Defaults to "127.0.0.1".
+        port (int): The port to bind. Defaults to DEFAULT_PORT.
+        seed (int): The world seed. Defaults to 0.
+        partition (WorldPartition or None): How the world is split between workers. Defaults to 2 by 1 regions.
+
+    Returns:
+        tuple: A tuple containing the PartitionedServer and its tick loop task.
+    """
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: PartitionedServer(seed, partition or WorldPartition(2, 1)), local_addr=(host, port))
+    return server, asyncio.create_task(server.run())
+
+async def start_metrics_server(server, host = "127.0.0.1", port = DEFAULT_METRICS_PORT):
+    """
+    Starts an HTTP endpoint serving the metrics of a server at /metrics in the Prometheus text format.
+
+    Args:
+        server (GameServer, ShardedServer or PartitionedServer): The server to report.
+        host (str): The host to bind. Defaults to "127.0.0.1", so metrics are only served locally.
+        port (int): The port to bind. Defaults to DEFAULT_METRICS_PORT.
+
+    Returns:
+        asyncio.Server: The HTTP server.
+    """
+    async def handle_request(reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        request_line = request.split(b"\r\n", 1)[0].split(b" ")
+        if len(request_line) == 3 and request_line[0] == b"GET" and request_line[1].split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", server.format_metrics().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle_request, host, port)
+
+async def connect_client(host = "127.0.0.1", port = DEFAULT_PORT):
+    """
+    Creates a GameClient and connects it to a server.
+
+    Args:
+        host (str): The server host. Defaults to "127.0.0.1".
+        port (int): The server port. Defaults to DEFAULT_PORT.
+
+    Returns:
+        GameClient: The connected client.
+    """
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(lambda: GameClient((host, port)), remote_addr=(host, port))
+    await client.connect()
+    return client
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Runs a Shadow Fare game server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes running rooms, 0 runs a single room in this process")
+    parser.add_argument("--room-size", type=int, default=MAX_PLAYERS)
+    parser.add_argument("--regions", default=None, help="Simulates one world split into COLUMNSxROWS regions, each in its own worker process")
+    parser.add_argument("--region-size", type=float, default=REGION_SIZE)
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    parser.add_argument("--metrics-port", type=int, default=DEFAULT_METRICS_PORT, help="Port of the Prometheus metrics endpoint, 0 disables it")
+    parser.add_argument("--subscribe-token", default=None, help="Secret spectator relays subscribe with, subscribing is refused without it")
+    args = parser.parse_args()
+    subscribe_token = args.subscribe_token.encode() if args.subscribe_token else None
+
+    async def main():
+        if args.regions:
+            columns, rows = (int(count) for count in args.regions.lower().split("x"))
+            server, task = await start_partitioned_server(args.host, args.port, args.seed, WorldPartition(columns, rows, args.region_size))
+        elif args.workers:
+            server, task = await start_sharded_server(args.host, args.port, args.seed, args.workers, args.room_size, subscribe_token)
+        else:
+            server, task = await start_server(args.host, args.port, args.seed, subscribe_token)
+        if args.metrics_port:
+            await start_metrics_server(server, args.metrics_host, args.metrics_port)
+        await task
+
+    asyncio.run(main())
@@ -0,0 +1,410 @@
+# Spectator relay. Subscribes to the full snapshot stream of one room and rebroadcasts it to many spectators with a delay, encoding each frame once for all of them.
+import asyncio, collections, hashlib, os, struct, time
+import numpy as np
+
+from src import lakeserver, snapshot
+
+
+# ----- Constant Variables -----
+DEFAULT_PORT = 25571
+DEFAULT_DELAY = 2            # Seconds spectators are behind the match
+KEYFRAME_INTERVAL = 64       # Ticks between keyframes, the longest a joining spectator waits for a full state
+JOIN_INTERVAL = 1            # Seconds between join packets spectators send to stay subscribed
+SPECTATOR_TIMEOUT = 5        # Seconds without a join packet before a spectator is dropped
+COOKIE_LIFETIME = 60         # Seconds a relay issued cookie is accepted for, at least COOKIE_LIFETIME and at most twice that
+
+# Packet types, separate from the game protocol as spectators only receive
+JOIN = 0
+WELCOME = 1
+FRAME = 2
+LEAVE = 3
+CHALLENGE = 4
+
+# packet type, cookie. Join packets are as large as the challenge they get back, so spoofed joins are not amplified
+JOIN_PACKET = struct.Struct("!BQ")
+CHALLENGE_PACKET = struct.Struct("!BQ")
+# packet type, world seed
+WELCOME_PACKET = struct.Struct("!BQ")
+# packet type, destroyed tree count
+FRAME_HEADER = struct.Struct("!BH")
+# Destroyed tree positions (x, y), big endian to match the struct network byte order
+TREE_POSITIONS = np.dtype(">i4")
+
+
+# ----- Classes ------
+class RelayUpstream(asyncio.DatagramProtocol):
+    def __init__(self, relay, address, room_id = 0, token = b""):
+        """
+        Initializes a RelayUpstream, the subscription of a relay to a room on the game server.
+
+        Args:
+            relay (SpectatorRelay): The relay fed with the snapshots.
+            address (tuple): The game server address (host, port).
+            room_id (int): The room to watch on a sharded server. Defaults to 0.
+            token (bytes): The subscribe token of the game server. Defaults to b"".
+        """
+        self.relay = relay
+        self.address = address
+        self.room_id = room_id
+        self.token = token
+        self.session = lakeserver.ClientSession()
+        self.transport = None
+        self.last_tick = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        packet_type = self.session.receive(data)
+        session = self.session
+
+        if session.destroyed_trees:
+            self.relay.destroyed_trees.extend(session.destroyed_trees)
+            session.destroyed_trees.clear()
+
+        if packet_type == lakeserver.SNAPSHOT and session.snapshot and session.snapshot["tick"] != self.last_tick:
+            self.last_tick = session.snapshot["tick"]
+            # Acks keep the subscription alive, and let the server delta encode against this snapshot
+            self.transport.sendto(session.build_ack())
+            self.relay.receive_snapshot(session.snapshot)
+
+    async def subscribe(self, timeout = 5):
+        """
+        Subscribes to the room, resending the subscribe packet until accepted.
+
+        Args:
+            timeout (float): Seconds to wait before giving up. Defaults to 5.
+
+        Returns:
+            bool: True if accepted, False otherwise.
+        """
+        end_time = time.perf_counter() + timeout
+        while not self.session.accepted and time.perf_counter() < end_time:
+            self.transport.sendto(self.session.build_subscribe(self.address, self.room_id, self.token))
+            await asyncio.sleep(0.1)
+        if self.session.accepted:
+            self.relay.seed = self.session.seed
+        return self.session.accepted
+
+
+class SpectatorRelay(asyncio.DatagramProtocol):
+    def __init__(self, delay = DEFAULT_DELAY, keyframe_interval = KEYFRAME_INTERVAL):
+        """
+        Initializes a SpectatorRelay, which rebroadcasts the snapshots of one room to spectators.
+
+        Frames are keyframes holding the full state, or deltas against the last keyframe, so a lost frame never stops the next one from decoding and joining spectators only need one keyframe. Each frame is encoded once, and every spectator is sent the same bytes.
+
+        Args:
+            delay (float): Seconds spectators are behind the match. Defaults to DEFAULT_DELAY.
+            keyframe_interval (int): Ticks between keyframes. Defaults to KEYFRAME_INTERVAL.
+        """
+        self.delay_ticks = round(delay * lakeserver.TPS)
+        self.keyframe_interval = keyframe_interval
+        self.transport = None
+        self.seed = None
+        self.secret = os.urandom(16)
+
+        self.spectators = {}
+        # Snapshots waiting out the delay, as (tick, players, bullets, destroyed tree count)
+        self.pending = collections.deque()
+        self.destroyed_trees = []
+        self.keyframe = None
+        self.keyframe_packet = None
+
+        self.frames_encoded = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def cookie(self, address, epoch):
+        """
+        Computes the cookie of an address, which a spectator echoes in its join packets to prove it receives packets sent to that address.
+
+        Args:
+            address (tuple): The spectator address (host, port).
+            epoch (int): The COOKIE_LIFETIME period the cookie is issued in.
+
+        Returns:
+            int: The cookie.
+        """
+        digest = hashlib.blake2b(f"{address[0]}:{address[1]}:{epoch}".encode(), key=self.secret, digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def check_cookie(self, data, address):
+        """
+        Checks the cookie of a join or leave packet against the current and previous epoch.
+
+        Args:
+            data (bytes): The packet.
+            address (tuple): The sender address (host, port).
+
+        Returns:
+            bool: True if the cookie was issued by this relay to the address, False otherwise.
+        """
+        if len(data) != JOIN_PACKET.size:
+            return False
+        cookie = JOIN_PACKET.unpack(data)[1]
+        epoch = int(time.time() // COOKIE_LIFETIME)
+        return cookie in (self.cookie(address, epoch), self.cookie(address, epoch - 1))
+
+    def datagram_received(self, data, address):
+        if not data or self.seed is None:
+            return
+        if data[0] == JOIN:
+            if not self.check_cookie(data, address):
+                # Unproven addresses only get a challenge no larger than their join, never frames
+                if len(data) == JOIN_PACKET.size:
+                    self.transport.sendto(CHALLENGE_PACKET.pack(CHALLENGE, self.cookie(address, int(time.time() // COOKIE_LIFETIME))), address)
+                return
+            if address not in self.spectators:
+                self.transport.sendto(WELCOME_PACKET.pack(WELCOME, self.seed), address)
+                # Joining mid match only costs resending the cached keyframe
+                if self.keyframe_packet is not None:
+                    self.send(self.keyframe_packet, address)
+            self.spectators[address] = time.perf_counter()
+        elif data[0] == LEAVE and self.check_cookie(data, address):
+            self.spectators.pop(address, None)
+
+    def send(self, packet, address):
+        """
+        Sends a frame to a spectator.
+
+        Args:
+            packet (bytes): The frame.
+            address (tuple): The spectator address (host, port).
+        """
+        self.transport.sendto(packet, address)
+        self.packets_sent += 1
+        self.bytes_sent += len(packet)
+
+    def receive_snapshot(self, decoded):
+        """
+        Queues a snapshot from the game server, and broadcasts the snapshots which have waited out the delay.
+
+        Args:
+            decoded (dict): The decoded snapshot.
+        """
+        self.pending.append((decoded["tick"], decoded["players"], decoded["bullets"], len(self.destroyed_trees)))
+        while self.pending and self.pending[0][0] <= decoded["tick"] - self.delay_ticks:
+            self.broadcast(self.encode_frame(*self.pending.popleft()))
+
+    def encode_frame(self, tick, players, bullets, tree_count):
+        """
+        Encodes a frame, a keyframe if the last one is old enough, or a delta against the last keyframe otherwise.
+
+        Args:
+            tick (int): The snapshot tick.
+            players (numpy.ndarray): The PLAYER_STATE array.
+            bullets (numpy.ndarray): The BULLET_STATE array.
+            tree_count (int): The number of trees destroyed by this tick.
+
+        Returns:
+            bytes: The frame.
+        """
+        keyframe = self.keyframe is None or tick - self.keyframe[0] >= self.keyframe_interval
+        if keyframe:
+            # Keyframes carry every destroyed tree, deltas the trees destroyed since their keyframe
+            trees = self.destroyed_trees[:tree_count]
+            tables = snapshot.encode_table(players, None) + snapshot.encode_table(bullets, None)
+            payload = snapshot.encode_snapshot(tick, snapshot.NO_BASELINE, 0, tables)
+        else:
+            keyframe_tick, keyframe_players, keyframe_bullets, keyframe_tree_count = self.keyframe
+            trees = self.destroyed_trees[keyframe_tree_count:tree_count]
+            tables = snapshot.encode_table(players, keyframe_players) + snapshot.encode_table(bullets, keyframe_bullets)
+            payload = snapshot.encode_snapshot(tick, keyframe_tick, 0, tables)
+
+        packet = b"".join((FRAME_HEADER.pack(FRAME, len(trees)), np.array(trees, dtype=TREE_POSITIONS).tobytes(), payload))
+        self.frames_encoded += 1
+        if keyframe:
+            self.keyframe = (tick, players, bullets, tree_count)
+            self.keyframe_packet = packet
+        return packet
+
+    def broadcast(self, packet):
+        """
+        Sends a frame to every spectator, and drops spectators which stopped sending join packets.
+
+        Args:
+            packet (bytes): The frame. The same bytes object is passed to every send, nothing is copied per spectator.
+        """
+        current_time = time.perf_counter()
+        for address, join_time in list(self.spectators.items()):
+            if current_time - join_time > SPECTATOR_TIMEOUT:
+                del self.spectators[address]
+            else:
+                self.send(packet, address)
+
+
+class SpectatorSession:
+    def __init__(self):
+        """
+        Initializes a SpectatorSession, the spectator side of the relay protocol. Sessions do no socket I/O, packets are passed in.
+        """
+        self.seed = None
+        self.cookie = 0
+        self.snapshot = None
+        self.keyframes = {}
+        self.destroyed_trees = set()
+
+    def build_join(self):
+        """
+        Builds a join packet, echoing the cookie of the last challenge. The first join carries no cookie and is answered with a challenge.
+
+        Returns:
+            bytes: The packet.
+        """
+        return JOIN_PACKET.pack(JOIN, self.cookie)
+
+    def build_leave(self):
+        """
+        Builds a leave packet, which the relay only accepts with a valid cookie.
+
+        Returns:
+            bytes: The packet.
+        """
+        return JOIN_PACKET.pack(LEAVE, self.cookie)
+
+    def receive(self, data):
+        """
+        Handles a packet from the relay. Frames whose keyframe was lost are dropped until the next keyframe, and packets of the wrong size are dropped.
+
+        Args:
+            data (bytes): The packet.
+
+        Returns:
+            int or None: The packet type, or None if the packet was dropped.
+        """
+        if not data:
+            return None
+        if data[0] == CHALLENGE and len(data) == CHALLENGE_PACKET.size:
+            self.cookie = CHALLENGE_PACKET.unpack(data)[1]
+            return CHALLENGE
+        if data[0] == WELCOME and len(data) == WELCOME_PACKET.size:
+            self.seed = WELCOME_PACKET.unpack(data)[1]
+            return WELCOME
+        if data[0] != FRAME or len(data) < FRAME_HEADER.size:
+            return None
+
+        tree_count = FRAME_HEADER.unpack_from(data)[1]
+        if FRAME_HEADER.size + tree_count * 2 * TREE_POSITIONS.itemsize > len(data):
+            return None
+        trees = np.frombuffer(data, TREE_POSITIONS, tree_count * 2, FRAME_HEADER.size).reshape(-1, 2)
+        view = memoryview(data)[FRAME_HEADER.size + trees.nbytes:]
+        decoded = snapshot.decode_snapshot(view, self.keyframes)
+        if decoded is None:
+            return None
+
+        self.destroyed_trees.update(map(tuple, trees.tolist()))
+        if snapshot.SNAPSHOT_HEADER.unpack_from(view)[1] == snapshot.NO_BASELINE:
+            self.keyframes = {decoded["tick"]: decoded}
+        if self.snapshot is None or decoded["tick"] > self.snapshot["tick"]:
+            self.snapshot = decoded
+        return FRAME
+
+
+class SpectatorClient(asyncio.DatagramProtocol):
+    def __init__(self, address):
+        """
+        Initializes a SpectatorClient, a headless asyncio spectator used for testing.
+
+        Args:
+            address (tuple): The relay address (host, port).
+        """
+        self.address = address
+        self.session = SpectatorSession()
+        self.transport = None
+        self.frames = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        packet_type = self.session.receive(data)
+        if packet_type == FRAME:
+            self.frames += 1
+        elif packet_type == CHALLENGE:
+            # Answers right away rather than waiting JOIN_INTERVAL
+            self.transport.sendto(self.session.build_join())
+
+    async def watch(self, duration):
+        """
+        Watches for a while, sending join packets to stay subscribed.
+
+        Args:
+            duration (float): Seconds to watch.
+        """
+        end_time = time.perf_counter() + duration
+        while time.perf_counter() < end_time:
+            self.transport.sendto(self.session.build_join())
+            await asyncio.sleep(min(JOIN_INTERVAL, max(end_time - time.perf_counter(), 0)))
+
+    def leave(self):
+        """
+        Tells the relay the spectator is leaving and closes the socket.
+        """
+        self.transport.sendto(self.session.build_leave())
+        self.transport.close()
+
+
+# ----- Functions ------
+async def start_relay(server_host = "127.0.0.1", server_port = lakeserver.DEFAULT_PORT, host = "127.0.0.1", port = DEFAULT_PORT, room_id = 0, delay = DEFAULT_DELAY, token = b""):
+    """
+    Starts a SpectatorRelay and subscribes it to a room on the game server.
+
+    Args:
+        server_host (str): The game server host. Defaults to "127.0.0.1".
+        server_port (int): The game server port. Defaults to lakeserver.DEFAULT_PORT.
+        host (str): The host spectators connect to. Defaults to "127.0.0.1".
+        port (int): The port spectators connect to. Defaults to DEFAULT_PORT.
+        room_id (int): The room to watch on a sharded server. Defaults to 0.
+        delay (float): Seconds spectators are behind the match. Defaults to DEFAULT_DELAY.
+        token (bytes): The subscribe token of the game server. Defaults to b"".
+
+    Returns:
+        tuple: A tuple containing the SpectatorRelay and its RelayUpstream, or None for the upstream if the game server did not accept the subscription.
+    """
+    loop = asyncio.get_running_loop()
+    transport, relay = await loop.create_datagram_endpoint(lambda: SpectatorRelay(delay), local_addr=(host, port))
+    transport, upstream = await loop.create_datagram_endpoint(lambda: RelayUpstream(relay, (server_host, server_port), room_id, token), remote_addr=(server_host, server_port))
+    if not await upstream.subscribe():
+        return relay, None
+    return relay, upstream
+
+async def connect_spectator(host = "127.0.0.1", port = DEFAULT_PORT):
+    """
+    Creates a SpectatorClient for a relay.
+
+    Args:
+        host (str): The relay host. Defaults to "127.0.0.1".
+        port (int): The relay port. Defaults to DEFAULT_PORT.
+
+    Returns:
+        SpectatorClient: The spectator.
+    """
+    loop = asyncio.get_running_loop()
+    transport, spectator = await loop.create_datagram_endpoint(lambda: SpectatorClient((host, port)), remote_addr=(host, port))
+    return spectator
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relays a Shadow Fare match to spectators.")
+    parser.add_argument("--server", default=f"127.0.0.1:{lakeserver.DEFAULT_PORT}", help="The game server as host:port")
+    parser.add_argument("--room", type=int, default=0)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--delay", type=float, default=DEFAULT_DELAY)
+    parser.add_argument("--token", default="", help="The subscribe token the game server was started with")
+    args = parser.parse_args()
+
+    async def main():
+        server_host, server_port = args.server.rsplit(":", 1)
+        relay, upstream = await start_relay(server_host, int(server_port), args.host, args.port, args.room, args.delay, args.token.encode())
+        if upstream is None:
+            raise SystemExit("The game server did not accept the subscription")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
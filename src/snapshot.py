@@ -0,0 +1,237 @@
+# Binary snapshot codec. Entity states are quantized into NumPy structured arrays and delta encoded against a state the client already has.
+import struct
+import numpy as np
+
+
+# ----- Constant Variables -----
+POSITION_SCALE = 8      # Quantization steps per game unit
+ANGLE_SCALE = 65536     # Quantization steps per full turn
+NO_BASELINE = 0xFFFFFFFF
+
+# Arrays are big endian to match the struct network byte order
+PLAYER_STATE = np.dtype([("id", ">u2"), ("x", ">i4"), ("y", ">i4"), ("angle", ">u2")])
+PLAYER_DELTA = np.dtype([("id", ">u2"), ("x", ">i2"), ("y", ">i2"), ("angle", ">i2")])
+BULLET_STATE = np.dtype([("id", ">u2"), ("x", ">i4"), ("y", ">i4"), ("owner", ">u2")])
+BULLET_DELTA = np.dtype([("id", ">u2"), ("x", ">i2"), ("y", ">i2")])
+
+# Fields which wrap around instead of overflowing
+WRAPPING_FIELDS = {"angle"}
+
+# tick, baseline tick, last processed input sequence
+SNAPSHOT_HEADER = struct.Struct("!III")
+# removed count, full count, changed count
+TABLE_HEADER = struct.Struct("!HHH")
+
+
+# ----- Functions ------
+def contains_sorted(sorted_ids, ids):
+    """
+    Checks which ids are in a sorted id array. Faster than numpy.isin for the small sorted arrays used here.
+
+    Args:
+        sorted_ids (numpy.ndarray): Sorted unique ids.
+        ids (numpy.ndarray): The ids to check.
+
+    Returns:
+        numpy.ndarray: A bool array, True where the id is in sorted_ids.
+    """
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=bool)
+    return sorted_ids[np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)] == ids
+
+def quantize_players(players):
+    """
+    Returns the quantized state of players, sorted by id.
+
+    Args:
+        players (list): A list of (id, x, y, angle) tuples, where angle is the normalized gun angle.
+
+    Returns:
+        numpy.ndarray: A PLAYER_STATE array.
+    """
+    state = np.empty(len(players), PLAYER_STATE)
+    if len(players):
+        values = np.array(players, dtype=np.float64)
+        state["id"] = values[:, 0]
+        state["x"] = np.round(values[:, 1] * POSITION_SCALE)
+        state["y"] = np.round(values[:, 2] * POSITION_SCALE)
+        state["angle"] = np.round(values[:, 3] * ANGLE_SCALE).astype(np.int64) % ANGLE_SCALE
+        state.sort(order="id")
+    return state
+
+def quantize_bullets(bullets):
+    """
+    Returns the quantized state of bullets, sorted by id.
+
+    Args:
+        bullets (list): A list of (id, x, y, owner) tuples, where owner is the player id of the shooter.
+
+    Returns:
+        numpy.ndarray: A BULLET_STATE array.
+    """
+    state = np.empty(len(bullets), BULLET_STATE)
+    if len(bullets):
+        values = np.array(bullets, dtype=np.float64)
+        state["id"] = values[:, 0]
+        state["x"] = np.round(values[:, 1] * POSITION_SCALE)
+        state["y"] = np.round(values[:, 2] * POSITION_SCALE)
+        state["owner"] = values[:, 3]
+        state.sort(order="id")
+    return state
+
+def encode_table(current, baseline):
+    """
+    Delta encodes an entity table against a baseline table.
+
+    Entities missing from the current table are sent as removed ids, unchanged entities are not sent, and changed entities are sent as 16 bit field deltas. Entities new to the baseline, which moved too far for a 16 bit delta, or whose fields without deltas changed, are sent in full.
+
+    Args:
+        current (numpy.ndarray): The current state array, sorted by unique id.
+        baseline (numpy.ndarray or None): The baseline state array, sorted by unique id, or None to send everything in full.
+
+    Returns:
+        bytes: The encoded table.
+    """
+    delta_dtype = PLAYER_DELTA if current.dtype == PLAYER_STATE else BULLET_DELTA
+    if baseline is None or not len(baseline):
+        return TABLE_HEADER.pack(0, len(current), 0) + current.tobytes()
+
+    base_ids = baseline["id"]
+    ids = current["id"]
+    index = np.minimum(np.searchsorted(base_ids, ids), len(base_ids) - 1)
+    matched = base_ids[index] == ids
+    removed_ids = base_ids[~contains_sorted(ids, base_ids)]
+
+    matched_current = current[matched]
+    matched_baseline = baseline[index[matched]]
+    deltas = np.empty(len(matched_current), delta_dtype)
+    deltas["id"] = matched_current["id"]
+    fits = np.ones(len(matched_current), dtype=bool)
+    changed = np.zeros(len(matched_current), dtype=bool)
+
+    for field in delta_dtype.names[1:]:
+        difference = matched_current[field].astype(np.int64) - matched_baseline[field]
+        if field in WRAPPING_FIELDS:
+            difference = (difference + 32768) % 65536 - 32768
+        fits &= (difference >= -32768) & (difference <= 32767)
+        changed |= difference != 0
+        # Deltas which do not fit are sent in full instead, so wrapping here is harmless
+        deltas[field] = difference
+
+    # Fields without deltas never change for an entity, a change means the id was reused
+    for field in current.dtype.names[1:]:
+        if field not in delta_dtype.names:
+            fits &= matched_current[field] == matched_baseline[field]
+
+    # Concatenating can convert to native byte order
+    full = np.concatenate((current[~matched], matched_current[~fits])).astype(current.dtype, copy=False)
+    full.sort(order="id")
+    deltas = deltas[changed & fits]
+
+    return b"".join((TABLE_HEADER.pack(len(removed_ids), len(full), len(deltas)), removed_ids.astype(">u2").tobytes(), full.tobytes(), deltas.tobytes()))
+
+def decode_table(data, offset, baseline, state_dtype):
+    """
+    Decodes an entity table encoded by encode_table.
+
+    Args:
+        data (bytes): The encoded snapshot.
+        offset (int): The offset of the table in data.
+        baseline (numpy.ndarray or None): The baseline state array the table was encoded against.
+        state_dtype (numpy.dtype): PLAYER_STATE or BULLET_STATE.
+
+    Returns:
+        tuple or None: A tuple containing the decoded state array sorted by id, the ids which entered and were removed since the baseline, and the offset after the table, or None if the table is truncated or changes an entity the baseline does not have.
+    """
+    delta_dtype = PLAYER_DELTA if state_dtype == PLAYER_STATE else BULLET_DELTA
+    if offset + TABLE_HEADER.size > len(data):
+        return None
+    removed_count, full_count, changed_count = TABLE_HEADER.unpack_from(data, offset)
+    offset += TABLE_HEADER.size
+    if offset + removed_count * 2 + full_count * state_dtype.itemsize + changed_count * delta_dtype.itemsize > len(data):
+        return None
+
+    removed_ids = np.frombuffer(data, ">u2", removed_count, offset)
+    offset += removed_ids.nbytes
+    full = np.frombuffer(data, state_dtype, full_count, offset)
+    offset += full.nbytes
+    deltas = np.frombuffer(data, delta_dtype, changed_count, offset)
+    offset += deltas.nbytes
+
+    if baseline is None:
+        baseline = np.empty(0, state_dtype)
+    entered_ids = full["id"][~contains_sorted(baseline["id"], full["id"])]
+    state = baseline[~contains_sorted(removed_ids, baseline["id"]) & ~contains_sorted(full["id"], baseline["id"])]
+
+    if len(deltas):
+        index = np.searchsorted(state["id"], deltas["id"])
+        if (index >= len(state)).any() or (state["id"][np.minimum(index, len(state) - 1)] != deltas["id"]).any():
+            return None
+        for field in delta_dtype.names[1:]:
+            values = state[field][index].astype(np.int64) + deltas[field]
+            if field in WRAPPING_FIELDS:
+                values %= 65536
+            state[field][index] = values
+
+    state = np.concatenate((state, full)).astype(state_dtype, copy=False)
+    state.sort(order="id", kind="stable")
+    return state, entered_ids, removed_ids, offset
+
+def encode_snapshot(tick, baseline_tick, input_sequence, tables):
+    """
+    Encodes a snapshot from already encoded tables. Tables are encoded separately so clients sharing a baseline can share them.
+
+    Args:
+        tick (int): The simulation tick of the snapshot.
+        baseline_tick (int): The tick of the baseline the tables were encoded against, or NO_BASELINE.
+        input_sequence (int): The last input sequence processed for the receiving client.
+        tables (bytes): The encoded player and bullet tables.
+
+    Returns:
+        bytes: The encoded snapshot.
+    """
+    return SNAPSHOT_HEADER.pack(tick, baseline_tick, input_sequence) + tables
+
+def decode_snapshot(data, baselines):
+    """
+    Decodes a snapshot.
+
+    Args:
+        data (bytes): The encoded snapshot.
+        baselines (dict): Previously decoded snapshots by tick, used to find the baseline.
+
+    Returns:
+        dict or None: The snapshot, with "tick", "input_sequence", "players" and "bullets" state arrays, and "entered" and "removed" dicts of the "players" and "bullets" ids added or removed since the baseline, or None if the baseline is missing or the snapshot is malformed. The table does not say why, an entity is entered when it spawns or comes into the area of interest, and removed when it despawns or leaves it.
+    """
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    tick, baseline_tick, input_sequence = SNAPSHOT_HEADER.unpack_from(data)
+    if baseline_tick == NO_BASELINE:
+        baseline = None
+    elif baseline_tick in baselines:
+        baseline = baselines[baseline_tick]
+    else:
+        return None
+
+    players_table = decode_table(data, SNAPSHOT_HEADER.size, baseline and baseline["players"], PLAYER_STATE)
+    if players_table is None:
+        return None
+    players, entered_players, removed_players, offset = players_table
+    bullets_table = decode_table(data, offset, baseline and baseline["bullets"], BULLET_STATE)
+    if bullets_table is None:
+        return None
+    bullets, entered_bullets, removed_bullets, offset = bullets_table
+    return {"tick": tick, "input_sequence": input_sequence, "players": players, "bullets": bullets,
+            "entered": {"players": entered_players, "bullets": entered_bullets}, "removed": {"players": removed_players, "bullets": removed_bullets}}
+
+def get_positions(state):
+    """
+    Returns the game positions of a state array.
+
+    Args:
+        state (numpy.ndarray): A PLAYER_STATE or BULLET_STATE array.
+
+    Returns:
+        numpy.ndarray: A float array with a row (x, y) per entity.
+    """
+    return np.column_stack((state["x"], state["y"])) / POSITION_SCALE
@@ -0,0 +1,96 @@
+# Procedural world generation. Everything is derived from a world seed and global coordinates, so any region generates the same layout every time, in any order.
+import numpy as np
+
+# Tree sizes are bucketed so scaled images and masks can be cached per size
+TREE_SIZES = np.array([60, 90, 120], dtype=np.int32)
+
+FOLIAGE_SPACING = 125      # Game units between foliage grid cells. Chunk sizes should be a multiple of this.
+FOLIAGE_DENSITY = 0.45     # Average fraction of cells containing a tree.
+FOLIAGE_NOISE_SCALE = 700  # Game units between density noise lattice points. Larger values give larger forests and clearings.
+
+
+def hash_noise(seed, x, y):
+    """
+    Returns deterministic pseudo random values for integer lattice coordinates.
+
+    Args:
+        seed (int): The world seed.
+        x (numpy.ndarray): Integer x coordinates.
+        y (numpy.ndarray): Integer y coordinates, the same shape as x.
+
+    Returns:
+        numpy.ndarray: Floats in the range [0, 1), the same shape as x.
+    """
+    x = np.asarray(x, dtype=np.int64).view(np.uint64)
+    y = np.asarray(y, dtype=np.int64).view(np.uint64)
+
+    h = x * np.uint64(0x9E3779B97F4A7C15)
+    h ^= y * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= np.uint64((seed * 0x165667B19E3779F9) & 0xFFFFFFFFFFFFFFFF)
+
+    # Mix the bits so neighbouring coordinates are uncorrelated
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xFF51AFD7ED558CCD)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xC4CEB9FE1A85EC53)
+    h ^= h >> np.uint64(33)
+
+    return (h >> np.uint64(40)).astype(np.float64) / (1 << 24)
+
+def value_noise(seed, x, y, scale):
+    """
+    Returns smooth noise for game positions, continuous across chunk borders.
+
+    Args:
+        seed (int): The world seed.
+        x (numpy.ndarray): Game x positions.
+        y (numpy.ndarray): Game y positions, the same shape as x.
+        scale (float): Game units between noise lattice points.
+
+    Returns:
+        numpy.ndarray: Floats in the range [0, 1), the same shape as x.
+    """
+    x = np.asarray(x, dtype=np.float64) / scale
+    y = np.asarray(y, dtype=np.float64) / scale
+    lattice_x = np.floor(x).astype(np.int64)
+    lattice_y = np.floor(y).astype(np.int64)
+
+    # Smoothstep the fractional position to hide the lattice
+    fraction_x = x - lattice_x
+    fraction_y = y - lattice_y
+    fraction_x = fraction_x * fraction_x * (3 - 2 * fraction_x)
+    fraction_y = fraction_y * fraction_y * (3 - 2 * fraction_y)
+
+    top = hash_noise(seed, lattice_x, lattice_y) * (1 - fraction_x) + hash_noise(seed, lattice_x + 1, lattice_y) * fraction_x
+    bottom = hash_noise(seed, lattice_x, lattice_y + 1) * (1 - fraction_x) + hash_noise(seed, lattice_x + 1, lattice_y + 1) * fraction_x
+    return top * (1 - fraction_y) + bottom * fraction_y
+
+def generate_foliage(seed, coords, chunk_size):
+    """
+    Generates the foliage of a chunk.
+
+    One tree may be placed per jittered grid cell, so trees never bunch up, and a density noise decides which cells are filled, giving forests and clearings.
+
+    Args:
+        seed (int): The world seed.
+        coords (tuple): The chunk grid coordinates (x, y).
+        chunk_size (int): The chunk width and height in game units.
+
+    Returns:
+        numpy.ndarray: An int32 array with a row (x, y, size) for each tree, where (x, y) is the top left game position.
+    """
+    cells = chunk_size // FOLIAGE_SPACING
+    cell_x, cell_y = np.meshgrid(np.arange(cells) + coords[0] * cells, np.arange(cells) + coords[1] * cells)
+    cell_x = cell_x.ravel()
+    cell_y = cell_y.ravel()
+
+    # Offset each tree within its cell, leaving a gap to the next cell
+    x = (cell_x + hash_noise(seed + 1, cell_x, cell_y) * 0.75) * FOLIAGE_SPACING
+    y = (cell_y + hash_noise(seed + 2, cell_x, cell_y) * 0.75) * FOLIAGE_SPACING
+
+    density = value_noise(seed, x, y, FOLIAGE_NOISE_SCALE) * FOLIAGE_DENSITY * 2
+    keep = hash_noise(seed + 3, cell_x, cell_y) < density
+
+    sizes = TREE_SIZES[(hash_noise(seed + 4, cell_x, cell_y) * len(TREE_SIZES)).astype(np.int64)]
+
+    return np.column_stack((x[keep], y[keep], sizes[keep])).astype(np.int32)
@@ -0,0 +1,77 @@
+# ----- Setup ------
+import os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver, snapshot
+
+# ----- Constant Variables -----
+SEED = 1234
+CLIENTS = 16
+TICKS = 64
+BULLET_DENSITY = 20 / 1e6   # Bullets per square game unit, kept constant as the world grows
+WORLD_SIZES = [5000, 20000, 50000]  # Bullet ids are 16 bit, so the largest world has under 65536 bullets
+
+rng = np.random.default_rng(0)
+
+# ----- Function ------
+def benchmark(world_size):
+    """Runs a room with clients spread over the world, checks every client only receives nearby entities, and returns the per client timings and sizes."""
+    room = lakeserver.Room(SEED)
+    sessions = {}
+    for index in range(CLIENTS):
+        address = ("127.0.0.1", index)
+        session = lakeserver.ClientSession()
+        room.receive(session.build_connect(address), address)
+        sessions[address] = session
+        room.simulation.players[room.player_ids[address]].pos = tuple(rng.uniform(-world_size / 2, world_size / 2, 2))
+
+    bullet_count = int(world_size * world_size * BULLET_DENSITY)
+    bullet_positions = rng.uniform(-world_size / 2, world_size / 2, (bullet_count, 2))
+    bullet_velocity = rng.uniform(-15, 15, (bullet_count, 2))
+    half_size = (lakeserver.GAME_WIDTH / 2 + lakeserver.VIEW_MARGIN, lakeserver.GAME_HEIGHT / 2 + lakeserver.VIEW_MARGIN)
+
+    shared_time = client_time = 0
+    sent_bytes = 0
+    entered = removed = 0
+    for tick in range(TICKS):
+        # Bullets are moved directly, the benchmark is about snapshots, not the simulation
+        bullet_positions += bullet_velocity
+        room.simulation.bullets = [[position, None, 1, 0, index] for index, position in enumerate(bullet_positions.tolist())]
+
+        start_time = time.perf_counter()
+        interest = room.build_interest()
+        shared_time += time.perf_counter() - start_time
+
+        payloads = {}
+        for address in room.connections:
+            start_time = time.perf_counter()
+            payloads[address] = room.build_snapshot(address, interest)
+            client_time += time.perf_counter() - start_time
+        room.simulation.tick += 1
+
+        for address, payload in payloads.items():
+            sent_bytes += len(payload)
+            session = sessions[address]
+            decoded = snapshot.decode_snapshot(payload, session.snapshots)
+            session.snapshots[decoded["tick"]] = decoded
+            room.baseline_ticks[address] = decoded["tick"]
+            entered += len(decoded["entered"]["bullets"])
+            removed += len(decoded["removed"]["bullets"])
+
+            player = room.simulation.players[room.player_ids[address]]
+            center = np.array((player.pos[0] + lakeserver.GAME_WIDTH / 2, player.pos[1] + lakeserver.GAME_HEIGHT / 2))
+            offsets = np.abs(snapshot.get_positions(decoded["bullets"]) - center)
+            expected = np.flatnonzero((np.abs(np.round(bullet_positions * snapshot.POSITION_SCALE) / snapshot.POSITION_SCALE - center) <= half_size).all(axis=1))
+            assert (offsets <= half_size).all(), "Client received an entity outside its area"
+            assert np.array_equal(decoded["bullets"]["id"], expected), "Client is missing an entity inside its area"
+            assert player.id in decoded["players"]["id"], "Client did not receive its own player"
+
+    return bullet_count, shared_time / TICKS, client_time / TICKS / CLIENTS, sent_bytes / TICKS / CLIENTS, entered / TICKS / CLIENTS, removed / TICKS / CLIENTS
+
+
+# ----- Main ------
+print(f"{'World':>8} {'Bullets':>8} {'Shared':>12} {'Per client':>12} {'Size':>10} {'Entered':>8} {'Removed':>8}")
+for world_size in WORLD_SIZES:
+    bullet_count, shared_time, client_time, size, entered, removed = benchmark(world_size)
+    print(f"{world_size:>8} {bullet_count:>8} {shared_time * 1e6:>10.1f}us {client_time * 1e6:>10.1f}us {size:>8.0f} B {entered:>8.2f} {removed:>8.2f}")
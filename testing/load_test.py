@@ -0,0 +1,262 @@
+# ----- Setup ------
+import os, sys, time, json, random, asyncio, argparse, multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+SEED = 1234
+CONNECT_BATCH = 50     # Bots connecting at once
+POLL_INTERVAL = 0.05   # Seconds between server process checks for requests
+
+DIRECTIONS = [0, lakeserver.UP, lakeserver.DOWN, lakeserver.LEFT, lakeserver.RIGHT,
+              lakeserver.UP | lakeserver.LEFT, lakeserver.UP | lakeserver.RIGHT, lakeserver.DOWN | lakeserver.LEFT, lakeserver.DOWN | lakeserver.RIGHT]
+
+# ----- Classes ------
+class Bot(lakeserver.GameClient):
+    def __init__(self, address, rng):
+        """
+        Initializes a Bot, a headless client which plays like a person: it walks in one direction for a while, sweeps its aim and fires in bursts.
+
+        Args:
+            address (tuple): The server address (host, port).
+            rng (random.Random): The random generator of the bot process.
+        """
+        super().__init__(address)
+        self.rng = rng
+        self.buttons = 0
+        self.angle = rng.random()
+        self.angle_speed = 0
+        self.measuring = False
+
+        # Send times of inputs not yet acknowledged by a snapshot
+        self.pending_inputs = []
+        self.latencies = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+
+    def datagram_received(self, data, address):
+        packet_type = self.session.receive(data)
+        if not self.measuring:
+            self.pending_inputs.clear()
+            return
+        self.bytes_received += len(data)
+
+        if packet_type == lakeserver.SNAPSHOT and self.session.snapshot:
+            self.snapshots += 1
+            # Input latency is the time from sending an input to receiving the first snapshot it was applied in
+            acked_sequence = self.session.snapshot["input_sequence"]
+            receive_time = time.perf_counter()
+            acked_count = 0
+            for sequence, send_time in self.pending_inputs:
+                if sequence > acked_sequence:
+                    break
+                self.latencies.append(receive_time - send_time)
+                acked_count += 1
+            del self.pending_inputs[:acked_count]
+
+    def step(self):
+        """
+        Chooses and sends the input for the next tick.
+        """
+        rng = self.rng
+        if rng.random() < 1 / lakeserver.TPS:
+            self.buttons = rng.choice(DIRECTIONS) | (self.buttons & lakeserver.FIRE)
+        if rng.random() < 2 / lakeserver.TPS:
+            self.buttons ^= lakeserver.FIRE
+        self.angle_speed = min(max(self.angle_speed + rng.uniform(-0.002, 0.002), -0.01), 0.01)
+        self.angle = (self.angle + self.angle_speed) % 1
+
+        packet = self.session.build_input(self.buttons, self.angle)
+        self.transport.sendto(packet)
+        if self.measuring:
+            self.bytes_sent += len(packet)
+            self.pending_inputs.append((self.session.input_sequence, time.perf_counter()))
+
+# ----- Functions ------
+def run_server(connection, port, workers):
+    """
+    The main loop of the server process. Runs a GameServer, or a ShardedServer if workers is not 0, and reports its stats over a measurement window.
+
+    Args:
+        connection (multiprocessing.connection.Connection): The pipe to the harness.
+        port (int): The port to bind.
+        workers (int): The number of worker processes, or 0 for a single room in this process.
+    """
+    async def main():
+        if workers:
+            server, task = await lakeserver.start_sharded_server(HOST, port, SEED, workers)
+        else:
+            server, task = await lakeserver.start_server(HOST, port, SEED)
+        connection.send("ready")
+
+        # Reading the pipe would block the event loop, and the server with it
+        window_start, window_end = await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+        await asyncio.sleep(max(window_start - time.time(), 0))
+        bytes_sent, bytes_received = server.bytes_sent, server.bytes_received
+        overruns = sum(metrics["overruns"] for metrics in server.worker_metrics) if workers else server.overruns
+        if not workers:
+            server.tick_times.clear()
+
+        # Workers report every second, the reports are sampled at the same rate
+        reports = []
+        while time.time() < window_end:
+            await asyncio.sleep(min(1, max(window_end - time.time(), 0)))
+            if workers:
+                reports.extend(dict(metrics) for metrics in server.worker_metrics)
+
+        duration = window_end - window_start
+        if workers:
+            tick_time_mean = float(np.mean([report["tick_time_mean"] for report in reports]))
+            tick_time_p99 = max(report["tick_time_p99"] for report in reports)
+            tick_time_max = max(report["tick_time_max"] for report in reports)
+            overruns = sum(metrics["overruns"] for metrics in server.worker_metrics) - overruns
+        else:
+            tick_times = np.array(server.tick_times)
+            tick_time_mean, tick_time_p99, tick_time_max = float(tick_times.mean()), float(np.percentile(tick_times, 99)), float(tick_times.max())
+            overruns = server.overruns - overruns
+
+        connection.send({
+            "tick_time_mean_ms": tick_time_mean * 1000,
+            "tick_time_p99_ms": tick_time_p99 * 1000,
+            "tick_time_max_ms": tick_time_max * 1000,
+            "overruns": overruns,
+            "bytes_sent_per_second": (server.bytes_sent - bytes_sent) / duration,
+            "bytes_received_per_second": (server.bytes_received - bytes_received) / duration,
+        })
+        server.running = False
+        await task
+
+    asyncio.run(main())
+
+def run_bots(connection, port, bot_count, seed):
+    """
+    The main loop of a bot process. Connects its bots, plays until the end of the measurement window, and reports what the bots observed.
+
+    Args:
+        connection (multiprocessing.connection.Connection): The pipe to the harness.
+        port (int): The server port.
+        bot_count (int): The number of bots in this process.
+        seed (int): The random seed of the bots.
+    """
+    async def main():
+        loop = asyncio.get_running_loop()
+        rng = random.Random(seed)
+        bots = []
+        for start in range(0, bot_count, CONNECT_BATCH):
+            batch = []
+            for _ in range(min(CONNECT_BATCH, bot_count - start)):
+                transport, bot = await loop.create_datagram_endpoint(lambda: Bot((HOST, port), rng), remote_addr=(HOST, port))
+                batch.append(bot)
+            await asyncio.gather(*[bot.connect() for bot in batch])
+            bots.extend(batch)
+        bots = [bot for bot in bots if bot.session.accepted]
+        connection.send(len(bots))
+
+        window_start, window_end = await loop.run_in_executor(None, connection.recv)
+        next_tick_time = time.perf_counter()
+        while time.time() < window_end:
+            measuring = time.time() >= window_start
+            for bot in bots:
+                bot.measuring = measuring
+                bot.step()
+            next_tick_time += lakeserver.SPT
+            await asyncio.sleep(max(next_tick_time - time.perf_counter(), 0))
+
+        connection.send({
+            "latencies": [latency for bot in bots for latency in bot.latencies],
+            "bytes_sent": sum(bot.bytes_sent for bot in bots),
+            "bytes_received": sum(bot.bytes_received for bot in bots),
+            "snapshots": sum(bot.snapshots for bot in bots),
+        })
+        for bot in bots:
+            bot.disconnect()
+
+    asyncio.run(main())
+
+def run_step(client_count, args):
+    """
+    Runs one load step: starts a server and the bot processes, measures, and returns the step report.
+
+    Args:
+        client_count (int): The number of bots.
+        args (argparse.Namespace): The harness arguments.
+
+    Returns:
+        dict: The step report.
+    """
+    workers = args.workers if args.workers is not None else (0 if client_count <= lakeserver.MAX_PLAYERS else os.cpu_count())
+    # Spawned processes do not inherit the event loop or sockets
+    context = multiprocessing.get_context("spawn")
+
+    server_connection, child_connection = context.Pipe()
+    server = context.Process(target=run_server, args=(child_connection, args.port, workers))
+    server.start()
+    server_connection.recv()
+
+    bot_processes = []
+    process_count = min(args.bot_processes, client_count)
+    for index in range(process_count):
+        connection, child_connection = context.Pipe()
+        count = client_count // process_count + (index < client_count % process_count)
+        process = context.Process(target=run_bots, args=(child_connection, args.port, count, index))
+        process.start()
+        bot_processes.append((process, connection))
+    connected = sum(connection.recv() for process, connection in bot_processes)
+
+    window_start = time.time() + args.warmup
+    window_end = window_start + args.duration
+    server_connection.send((window_start, window_end))
+    for process, connection in bot_processes:
+        connection.send((window_start, window_end))
+
+    results = [connection.recv() for process, connection in bot_processes]
+    server_stats = server_connection.recv()
+    for process, connection in bot_processes:
+        process.join()
+    server.join()
+
+    latencies = np.array([latency for result in results for latency in result["latencies"]]) * 1000
+    client_seconds = max(connected, 1) * args.duration
+    return {
+        "clients": client_count,
+        "connected": connected,
+        "workers": workers,
+        "server": server_stats,
+        "client": {
+            "input_latency_ms": {name: float(np.percentile(latencies, percentile)) if len(latencies) else None for name, percentile in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+            "bytes_sent_per_client_per_second": sum(result["bytes_sent"] for result in results) / client_seconds,
+            "bytes_received_per_client_per_second": sum(result["bytes_received"] for result in results) / client_seconds,
+            "snapshots_per_client_per_second": sum(result["snapshots"] for result in results) / client_seconds,
+        },
+    }
+
+
+# ----- Main ------
+# Server and bot processes are spawned, and import this file again
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load tests a local Shadow Fare game server with headless bots.")
+    parser.add_argument("--clients", default="1,10,50,100,250,500", help="Comma separated bot counts, one step each")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds measured per step")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds played before measuring")
+    parser.add_argument("--bot-processes", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="Server worker processes, 0 for a single room. Defaults to a single room up to MAX_PLAYERS clients, and one worker per core above")
+    parser.add_argument("--port", type=int, default=lakeserver.DEFAULT_PORT)
+    parser.add_argument("--output", default="load_report.json")
+    args = parser.parse_args()
+
+    report = {"config": {"duration": args.duration, "warmup": args.warmup, "bot_processes": args.bot_processes, "tps": lakeserver.TPS, "cores": os.cpu_count()}, "steps": []}
+    print(f"{'Clients':>8} {'Tick mean':>10} {'Tick p99':>10} {'Overruns':>9} {'Out KiB/s':>10} {'In KiB/s':>10} {'Latency p50':>12} {'p99':>8}")
+    for client_count in (int(count) for count in args.clients.split(",")):
+        step = run_step(client_count, args)
+        report["steps"].append(step)
+        server, latency = step["server"], step["client"]["input_latency_ms"]
+        print(f"{step['connected']:>8} {server['tick_time_mean_ms']:>8.2f}ms {server['tick_time_p99_ms']:>8.2f}ms {server['overruns']:>9} "
+              f"{server['bytes_sent_per_second'] / 1024:>10.1f} {server['bytes_received_per_second'] / 1024:>10.1f} {latency['p50'] or 0:>10.1f}ms {latency['p99'] or 0:>6.1f}ms")
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
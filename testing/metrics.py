@@ -0,0 +1,57 @@
+# ----- Setup ------
+import os, sys, time, asyncio, urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+SEED = 1234
+CLIENTS = 4
+DURATION = 2  # seconds
+
+# ----- Function ------
+async def run_client(index):
+    """Connects a client and fires for a while, then returns the still connected client."""
+    client = await lakeserver.connect_client(HOST, lakeserver.DEFAULT_PORT)
+    end_time = time.perf_counter() + DURATION
+    while time.perf_counter() < end_time:
+        client.send_input(lakeserver.FIRE, index / CLIENTS)
+        await asyncio.sleep(lakeserver.SPT)
+    return client
+
+def scrape():
+    """Fetches the metrics endpoint, and returns the samples by name and labels."""
+    with urllib.request.urlopen(f"http://{HOST}:{lakeserver.DEFAULT_METRICS_PORT}/metrics") as response:
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.read().decode()
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if not line.startswith("#")}
+
+async def main():
+    server, task = await lakeserver.start_server(HOST, lakeserver.DEFAULT_PORT, SEED)
+    await lakeserver.start_metrics_server(server)
+    clients = await asyncio.gather(*[run_client(index) for index in range(CLIENTS)])
+
+    # Scraping blocks, so it runs off the event loop like an external scraper would
+    samples = await asyncio.get_running_loop().run_in_executor(None, scrape)
+    for name, value in samples.items():
+        if "_bucket" not in name:
+            print(f"{name} {value:g}")
+
+    simulation = server.room.simulation
+    assert samples["lakeserver_connected_clients"] == CLIENTS
+    assert samples['lakeserver_room_players{room="0"}'] == CLIENTS
+    assert abs(samples['lakeserver_room_bullets{room="0"}'] - len(simulation.bullets)) <= CLIENTS, "Bullet count does not match the room"
+    assert samples['lakeserver_tick_duration_seconds_bucket{le="+Inf"}'] == samples["lakeserver_tick_duration_seconds_count"] >= DURATION * lakeserver.TPS * 0.9, "Ticks were not counted"
+    assert samples["lakeserver_snapshot_encode_seconds_count"] == samples["lakeserver_tick_duration_seconds_count"]
+    assert 0 < samples["lakeserver_sent_bytes_total"] <= server.bytes_sent
+    assert samples['lakeserver_tick_duration_seconds_bucket{le="0.0005"}'] <= samples['lakeserver_tick_duration_seconds_bucket{le="0.1"}'], "Buckets are not cumulative"
+
+    for client in clients:
+        client.disconnect()
+    server.running = False
+    await task
+
+
+# ----- Main ------
+asyncio.run(main())
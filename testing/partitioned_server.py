@@ -0,0 +1,86 @@
+# ----- Setup ------
+import os, sys, time, signal, asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+PORT = lakeserver.DEFAULT_PORT
+SEED = 1234
+PARTITION = lakeserver.WorldPartition(2, 1)
+DURATION = 3  # seconds, the walker ends up across the border but within view of the others
+STALL_DATAGRAMS = 4000  # Datagrams sent to a stalled region worker, more than its pipe and buffer hold
+
+# Players start in region 0, just right of the border to region 1 at x = 0
+CLIENTS = {
+    "walker": lakeserver.LEFT,                     # Crosses into region 1
+    "shooter": lakeserver.FIRE,                    # Stays, its bullets fly left into region 1
+    "watcher": 0,                                  # Stays, and should still see the walker across the border
+}
+
+# ----- Function ------
+async def run_client(buttons):
+    """Connects a client and sends the same input every tick, then returns the still connected client."""
+    client = await lakeserver.connect_client(HOST, PORT)
+    assert client.session.accepted, "Client was not accepted"
+
+    end_time = time.perf_counter() + DURATION
+    while time.perf_counter() < end_time:
+        # An angle of 0.5 aims left
+        client.send_input(buttons, 0.5)
+        await asyncio.sleep(lakeserver.SPT)
+
+    # Wait for the last inputs to be simulated
+    await asyncio.sleep(0.5)
+    return client
+
+async def main():
+    server, task = await lakeserver.start_partitioned_server(HOST, PORT, SEED, PARTITION)
+    clients = dict(zip(CLIENTS, await asyncio.gather(*[run_client(buttons) for buttons in CLIENTS.values()])))
+
+    for name, client in clients.items():
+        session = client.session
+        (x, y), angle = session.get_player(session.player_id)
+        address = client.transport.get_extra_info("sockname")
+        print(f"{name}: player {session.player_id} pos ({x:.1f}, {y:.1f}), region {server.client_workers[address]}, inputs applied {session.snapshot['input_sequence']}/{session.input_sequence}, sees players {session.snapshot['players']['id'].tolist()}")
+        assert session.snapshot["input_sequence"] == session.input_sequence, "Inputs were lost"
+
+    walker = clients["walker"]
+    (x, y), angle = walker.session.get_player(walker.session.player_id)
+    assert x + lakeserver.GAME_WIDTH / 2 < 0, "Walker did not cross the border"
+    assert server.client_workers[walker.transport.get_extra_info("sockname")] == 1, "Walker was not handed off"
+    assert walker.session.player_id in clients["watcher"].session.snapshot["players"]["id"], "Watcher can not see the walker across the border"
+    assert clients["watcher"].session.player_id in walker.session.snapshot["players"]["id"], "Walker can not see the watcher across the border"
+    assert len({client.session.player_id for client in clients.values()}) == len(clients), "Player ids are not unique across regions"
+
+    print(f"Handoffs: {server.handoffs}, overruns: {server.overruns}")
+    for index, metrics in enumerate(server.worker_metrics):
+        print(f"Region {index}: {metrics['players']} players, {metrics['bullets']} bullets, {metrics['ghosts']} ghosts, tick {metrics['tick_time_mean'] * 1000:.3f}ms mean {metrics['tick_time_max'] * 1000:.3f}ms max")
+    assert server.handoffs > 1, "Bullets were not handed off"
+
+    # A stalled region worker does not block the front process, its datagrams are dropped once its buffer is full
+    stalled_worker = server.workers[1]
+    address = walker.transport.get_extra_info("sockname")
+    os.kill(stalled_worker.pid, signal.SIGSTOP)
+    start_time = time.perf_counter()
+    for _ in range(STALL_DATAGRAMS):
+        server.datagram_received(bytes(1000), address)
+        await asyncio.sleep(0)
+    stall_time = time.perf_counter() - start_time
+    os.kill(stalled_worker.pid, signal.SIGCONT)
+    print(f"Stalled worker: {STALL_DATAGRAMS} datagrams in {stall_time * 1000:.1f}ms, {server.datagrams_dropped} dropped")
+    assert server.datagrams_dropped > 0, "Datagrams to a stalled worker were not dropped"
+    assert stall_time < 1, "The front process blocked on a stalled worker"
+    await asyncio.sleep(0.5)
+
+    for client in clients.values():
+        client.disconnect()
+    server.running = False
+    await task
+
+
+# ----- Main ------
+# Worker processes are spawned, and import this file again
+if __name__ == "__main__":
+    asyncio.run(main())
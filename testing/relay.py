@@ -0,0 +1,107 @@
+# ----- Setup ------
+import os, sys, time, asyncio
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver, relay
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+SEED = 1234
+DELAY = 0.5         # seconds
+SPECTATORS = 100    # Half join at the start, half mid match
+DURATION = 3        # seconds
+TOKEN = b"relay secret"
+
+# ----- Function ------
+async def run_player(index):
+    """Connects a client and walks while firing, so the spectators have something to watch."""
+    client = await lakeserver.connect_client(HOST, lakeserver.DEFAULT_PORT)
+    assert client.session.accepted, "Client was not accepted"
+    end_time = time.perf_counter() + DURATION + DELAY
+    while time.perf_counter() < end_time:
+        client.send_input((lakeserver.RIGHT if index else lakeserver.DOWN) | lakeserver.FIRE, index / 2)
+        await asyncio.sleep(lakeserver.SPT)
+    return client
+
+async def run_spectator(start_delay):
+    """Joins the relay after a while and watches until the end of the match."""
+    await asyncio.sleep(start_delay)
+    spectator = await relay.connect_spectator(HOST, relay.DEFAULT_PORT)
+    await spectator.watch(DURATION - start_delay)
+    return spectator
+
+class Recorder(asyncio.DatagramProtocol):
+    """Records the packets sent to a socket that never answers challenges, like the victim of a spoofed join."""
+    def __init__(self):
+        self.packets = []
+
+    def datagram_received(self, data, address):
+        self.packets.append(data)
+
+async def run_unverified():
+    """Sends joins without a valid cookie, and returns what the relay sent back."""
+    loop = asyncio.get_running_loop()
+    transport, recorder = await loop.create_datagram_endpoint(Recorder, remote_addr=(HOST, relay.DEFAULT_PORT))
+    for cookie in (0, 1234):
+        transport.sendto(relay.JOIN_PACKET.pack(relay.JOIN, cookie))
+    transport.sendto(bytes((relay.JOIN,)))
+    await asyncio.sleep(DURATION / 2)
+    transport.close()
+    return recorder.packets
+
+async def main():
+    server, task = await lakeserver.start_server(HOST, lakeserver.DEFAULT_PORT, SEED, TOKEN)
+    spectator_relay, upstream = await relay.start_relay(HOST, lakeserver.DEFAULT_PORT, HOST, relay.DEFAULT_PORT, delay=DELAY, token=TOKEN)
+    assert upstream is not None, "Relay was not accepted"
+
+    # Subscribing needs the token, so spectators can not skip the relay
+    loop = asyncio.get_running_loop()
+    transport, intruder = await loop.create_datagram_endpoint(lambda: relay.RelayUpstream(relay.SpectatorRelay(), (HOST, lakeserver.DEFAULT_PORT), token=b"guess"), remote_addr=(HOST, lakeserver.DEFAULT_PORT))
+    assert not await intruder.subscribe(0.5), "Subscriber without the token was accepted"
+    transport.close()
+
+    players = asyncio.gather(*[run_player(index) for index in range(2)])
+    unverified = asyncio.ensure_future(run_unverified())
+    spectators = await asyncio.gather(*[run_spectator(0 if index % 2 else DURATION / 2) for index in range(SPECTATORS)])
+
+    # Joins without the cookie only get challenges as large as themselves, the short join nothing at all
+    unverified = await unverified
+    assert [packet[0] for packet in unverified] == [relay.CHALLENGE] * 2, "Relay answered an unverified join with more than a challenge"
+    assert all(len(packet) <= relay.JOIN_PACKET.size for packet in unverified), "Relay amplified an unverified join"
+    assert len(spectator_relay.spectators) == SPECTATORS, "Relay added an unverified spectator"
+
+    upstream_tick = upstream.session.snapshot["tick"]
+    frames = spectator_relay.frames_encoded
+    print(f"Relay: {frames} frames encoded, {spectator_relay.packets_sent} packets sent, {spectator_relay.bytes_sent / max(spectator_relay.packets_sent, 1):.0f} B per packet, {len(spectator_relay.destroyed_trees)} trees destroyed")
+    # Frames are encoded once per tick, whatever the number of spectators
+    assert frames <= upstream_tick, "Frames were encoded per spectator"
+    assert spectator_relay.packets_sent > frames * SPECTATORS / 2, "Spectators were not sent every frame"
+
+    for index, spectator in enumerate(spectators):
+        session = spectator.session
+        assert session.seed == SEED, "Spectator did not receive the seed"
+        tick = session.snapshot["tick"]
+        # Spectators are behind by the delay, give or take the frames still in flight
+        assert upstream_tick - spectator_relay.delay_ticks - 4 <= tick <= upstream_tick - spectator_relay.delay_ticks, f"Spectator is at tick {tick}, the match at {upstream_tick}"
+        expected = upstream.session.snapshots.get(tick)
+        if expected is not None:
+            assert np.array_equal(session.snapshot["players"], expected["players"]), "Spectator players do not match the match"
+            assert np.array_equal(session.snapshot["bullets"], expected["bullets"]), "Spectator bullets do not match the match"
+        assert session.destroyed_trees <= set(spectator_relay.destroyed_trees), "Spectator destroyed an unknown tree"
+        assert spectator.frames > 0, "Spectator received no frames"
+    late_frames = np.mean([spectator.frames for spectator in spectators[::2]])
+    print(f"Spectators: {len(spectators)} at tick {tick} of {upstream_tick}, {np.mean([spectator.frames for spectator in spectators[1::2]]):.0f} frames from the start, {late_frames:.0f} frames joining mid match")
+
+    for spectator in spectators:
+        spectator.leave()
+    for client in await players:
+        client.disconnect()
+    await asyncio.sleep(0.1)
+    assert not spectator_relay.spectators, "Spectators did not leave"
+    server.running = False
+    await task
+
+
+# ----- Main ------
+asyncio.run(main())
@@ -0,0 +1,47 @@
+# ----- Setup ------
+import os, sys, time, asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+PORT = lakeserver.DEFAULT_PORT
+SEED = 1234
+CLIENTS = 4
+DURATION = 3  # seconds
+
+# ----- Function ------
+async def run_client(index):
+    """Connects a client, walks right while firing, then returns the last snapshot it received."""
+    client = await lakeserver.connect_client(HOST, PORT)
+    assert client.session.accepted, "Client was not accepted"
+    assert client.session.seed == SEED
+
+    buttons = lakeserver.RIGHT | (lakeserver.FIRE if index % 2 == 0 else 0)
+    end_time = time.perf_counter() + DURATION
+    while time.perf_counter() < end_time:
+        client.send_input(buttons, index / CLIENTS)
+        await asyncio.sleep(lakeserver.SPT)
+
+    # Wait for the last inputs to be simulated
+    await asyncio.sleep(0.5)
+    session = client.session
+    client.disconnect()
+    return session
+
+async def main():
+    server, task = await lakeserver.start_server(HOST, PORT, SEED)
+    sessions = await asyncio.gather(*[run_client(index) for index in range(CLIENTS)])
+
+    for session in sessions:
+        (x, y), angle = session.get_player(session.player_id)
+        print(f"Player {session.player_id}: pos ({x:.1f}, {y:.1f}), inputs applied {session.snapshot['input_sequence']}/{session.input_sequence}, rtt {session.connection.rtt * 1000:.2f}ms, trees destroyed {len(session.destroyed_trees)}")
+        assert x > 0 and y == 0, "Player did not move"
+        assert session.snapshot["input_sequence"] == session.input_sequence, "Inputs were lost"
+
+    print(f"Server tick: {server.room.simulation.tick}, overruns: {server.overruns}, bullets: {len(server.room.simulation.bullets)}")
+    server.running = False
+    await task
+
+asyncio.run(main())
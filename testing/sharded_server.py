@@ -0,0 +1,82 @@
+# ----- Setup ------
+import os, sys, time, signal, asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+HOST = "127.0.0.1"
+PORT = lakeserver.DEFAULT_PORT
+SEED = 1234
+WORKERS = 3
+ROOM_SIZE = 4
+CLIENTS = 12
+DURATION = 3  # seconds
+STALL_DATAGRAMS = 4000  # Datagrams sent to a stalled worker, more than its pipe and buffer hold
+
+# ----- Function ------
+async def run_client(index):
+    """Connects a client, walks right while firing, then returns the still connected client."""
+    client = await lakeserver.connect_client(HOST, PORT)
+    assert client.session.accepted, "Client was not accepted"
+
+    end_time = time.perf_counter() + DURATION
+    while time.perf_counter() < end_time:
+        client.send_input(lakeserver.RIGHT | lakeserver.FIRE, index / CLIENTS)
+        await asyncio.sleep(lakeserver.SPT)
+
+    # Wait for the last inputs to be simulated
+    await asyncio.sleep(0.5)
+    return client
+
+async def main():
+    server, task = await lakeserver.start_sharded_server(HOST, PORT, SEED, WORKERS, ROOM_SIZE)
+    clients = await asyncio.gather(*[run_client(index) for index in range(CLIENTS)])
+
+    rooms = {room_id: len(addresses) for room_id, addresses in server.room_addresses.items()}
+    print(f"Rooms: {rooms}, workers: {server.room_workers}")
+    assert len(rooms) == CLIENTS // ROOM_SIZE, "Rooms were not filled before new ones were made"
+    assert len(set(server.room_workers.values())) == WORKERS, "Rooms were not spread over the workers"
+
+    for client in clients:
+        session = client.session
+        (x, y), angle = session.get_player(session.player_id)
+        assert x > 0 and y == 0, "Player did not move"
+        assert session.snapshot["input_sequence"] == session.input_sequence, "Inputs were lost"
+        # Rooms are independent, so each only sends its own players
+        assert len(session.snapshot["players"]) == ROOM_SIZE
+
+    for index, metrics in enumerate(server.worker_metrics):
+        print(f"Worker {index}: {metrics['rooms']} rooms, {metrics['players']} players, tick {metrics['tick_time_mean'] * 1000:.3f}ms mean {metrics['tick_time_max'] * 1000:.3f}ms max, overruns {metrics['overruns']}")
+
+    # A stalled worker does not block the front process, its datagrams are dropped once its buffer is full
+    stalled_worker = server.workers[0]
+    address = next(address for address, room_id in server.client_rooms.items() if server.room_workers[room_id] == 0)
+    os.kill(stalled_worker.pid, signal.SIGSTOP)
+    start_time = time.perf_counter()
+    for _ in range(STALL_DATAGRAMS):
+        server.datagram_received(bytes(1000), address)
+        await asyncio.sleep(0)
+    stall_time = time.perf_counter() - start_time
+    os.kill(stalled_worker.pid, signal.SIGCONT)
+    print(f"Stalled worker: {STALL_DATAGRAMS} datagrams in {stall_time * 1000:.1f}ms, {server.datagrams_dropped} dropped")
+    assert server.datagrams_dropped > 0, "Datagrams to a stalled worker were not dropped"
+    assert stall_time < 1, "The front process blocked on a stalled worker"
+    for client in clients:
+        client.send_input(0, 0)
+    await asyncio.sleep(0.5)
+
+    # Disconnected clients free their rooms
+    for client in clients:
+        client.disconnect()
+    await asyncio.sleep(0.2)
+    assert not server.room_addresses, "Empty rooms were not closed"
+
+    server.running = False
+    await task
+
+
+# ----- Main ------
+# Worker processes are spawned, and import this file again
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+# ----- Setup ------
+import os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import snapshot
+
+# ----- Constant Variables -----
+TICKS = 256
+ACK_DELAY = 4  # Ticks between a snapshot being sent and the client acking it
+ENTITY_COUNTS = [10, 100, 1000]
+
+rng = np.random.default_rng(0)
+
+# ----- Function ------
+def benchmark(entity_count):
+    """Simulates moving players and bullets, checks every decoded snapshot matches, and returns the timings and sizes."""
+    player_count = max(1, entity_count // 10)
+    bullet_count = entity_count - player_count
+
+    players = np.column_stack((np.arange(player_count), rng.uniform(-5000, 5000, (player_count, 2)), rng.uniform(0, 1, player_count)))
+    bullets = np.column_stack((np.arange(bullet_count), rng.uniform(-5000, 5000, (bullet_count, 2)), rng.integers(0, player_count, bullet_count)))
+    bullet_velocity = rng.uniform(-15, 15, (bullet_count, 2))
+    next_bullet_id = bullet_count
+
+    sent = {}
+    received = {}
+    encode_time = decode_time = 0
+    full_bytes = delta_bytes = 0
+
+    for tick in range(TICKS):
+        players[:, 1:3] += rng.choice([-6, 0, 6], (player_count, 2))
+        players[:, 3] = (players[:, 3] + rng.uniform(-0.02, 0.02, player_count)) % 1
+        bullets[:, 1:3] += bullet_velocity
+
+        # Replace a few bullets with new ones, as if they hit something
+        replaced = rng.random(bullet_count) < 0.02
+        bullets[replaced, 0] = np.arange(next_bullet_id, next_bullet_id + replaced.sum()) % 65536
+        next_bullet_id += replaced.sum()
+        order = np.argsort(bullets[:, 0])
+        bullets, bullet_velocity = bullets[order], bullet_velocity[order]
+
+        player_state = snapshot.quantize_players(players.tolist())
+        bullet_state = snapshot.quantize_bullets(bullets.tolist())
+        sent[tick] = (player_state, bullet_state)
+
+        baseline_tick = tick - ACK_DELAY if tick >= ACK_DELAY else snapshot.NO_BASELINE
+        baseline = sent.get(baseline_tick, (None, None))
+
+        start_time = time.perf_counter()
+        data = snapshot.encode_snapshot(tick, baseline_tick, 0, snapshot.encode_table(player_state, baseline[0]) + snapshot.encode_table(bullet_state, baseline[1]))
+        encode_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        decoded = snapshot.decode_snapshot(data, received)
+        decode_time += time.perf_counter() - start_time
+        received[tick] = decoded
+
+        assert np.array_equal(decoded["players"], player_state) and np.array_equal(decoded["bullets"], bullet_state), f"Snapshot {tick} decoded incorrectly"
+
+        if tick >= ACK_DELAY:
+            delta_bytes += len(data)
+            full_bytes += len(snapshot.encode_snapshot(tick, snapshot.NO_BASELINE, 0, snapshot.encode_table(player_state, None) + snapshot.encode_table(bullet_state, None)))
+
+    measured_ticks = TICKS - ACK_DELAY
+    return encode_time / TICKS, decode_time / TICKS, full_bytes / measured_ticks, delta_bytes / measured_ticks
+
+# ----- Benchmark -----
+print(f"{'Entities':>8} {'Encode':>10} {'Decode':>10} {'Full':>12} {'Delta':>12} {'Delta at 64 TPS':>16}")
+for entity_count in ENTITY_COUNTS:
+    encode_time, decode_time, full_bytes, delta_bytes = benchmark(entity_count)
+    print(f"{entity_count:>8} {encode_time * 1e6:>8.1f}us {decode_time * 1e6:>8.1f}us {full_bytes:>10.0f} B {delta_bytes:>10.0f} B {delta_bytes * 64 / 1024:>11.1f} KiB/s")
@@ -0,0 +1,91 @@
+# ----- Setup ------
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import lakeserver
+
+# ----- Constant Variables -----
+SEED = 1234
+ADDRESS = ("127.0.0.1", 1)
+TICK_RATES = (30, 64, 128)
+SAMPLE_INTERVAL = 0.5   # Seconds, a whole number of ticks at every tick rate
+DURATION = 3            # Seconds
+
+# The buttons held from a time in seconds on. The player stands still while firing, as bullets spawn from where the player is at the end of the tick
+INPUTS = [(0, lakeserver.FIRE), (1, lakeserver.DOWN | lakeserver.RIGHT), (2, lakeserver.UP), (2.5, lakeserver.LEFT)]
+
+# ----- Function ------
+def clear_trees(simulation):
+    """Removes the trees of every loaded chunk, so bullets fly their whole lifetime."""
+    for coords in simulation.chunks:
+        simulation.chunks[coords] = simulation.chunks[coords][:0]
+
+def run(tps):
+    """Plays the inputs at a tick rate, and returns the player and first bullet positions sampled every SAMPLE_INTERVAL, and the number of shots fired."""
+    # The simulation reads the timestep from the module, as the server does
+    lakeserver.TPS, lakeserver.SPT = tps, 1 / tps
+    simulation = lakeserver.Simulation(SEED)
+    player = simulation.add_player(0)
+    simulation.update_chunks()
+    clear_trees(simulation)
+
+    player_samples, bullet_samples = [], []
+    shots = 0
+    first_bullet_id = None
+    for tick in range(round(DURATION * tps) + 1):
+        time = tick / tps
+        if tick % round(SAMPLE_INTERVAL * tps) == 0:
+            player_samples.append(player.pos)
+            bullet = next((bullet for bullet in simulation.bullets if bullet[4] == first_bullet_id), None)
+            bullet_samples.append(tuple(bullet[0]) if bullet else None)
+
+        player.buttons = [buttons for start, buttons in INPUTS if start <= time][-1]
+        bullet_count = len(simulation.bullets)
+        simulation.step()
+        clear_trees(simulation)
+        if len(simulation.bullets) > bullet_count:
+            shots += 1
+            if first_bullet_id is None:
+                first_bullet_id = simulation.bullets[-1][4]
+
+    return np.array(player_samples), bullet_samples, shots
+
+def measure_windows(tps):
+    """Fills the input queue, snapshot history and lag compensation history at a tick rate, and returns how many seconds each covers."""
+    lakeserver.TPS, lakeserver.SPT = tps, 1 / tps
+    room = lakeserver.Room(SEED, 0)
+    room.receive(lakeserver.ClientSession().build_connect(ADDRESS), ADDRESS)
+    for _ in range(DURATION * tps):
+        room.update()
+    player = next(iter(room.simulation.players.values()))
+    player.queue_inputs([(sequence, 0, 0) for sequence in range(1, DURATION * tps)], None)
+
+    return {"input queue": len(player.inputs) / tps, "snapshot history": len(room.state_history[ADDRESS]) / tps, "lag compensation": (room.simulation.history.length - 1) / tps}
+
+
+# ----- Main ------
+default_tps = lakeserver.TPS
+results = {tps: run(tps) for tps in TICK_RATES}
+lakeserver.TPS, lakeserver.SPT = default_tps, 1 / default_tps
+
+reference_players, reference_bullets, reference_shots = results[default_tps]
+for tps, (players, bullets, shots) in results.items():
+    player_error = np.abs(players - reference_players).max()
+    bullet_error = max(np.abs(np.subtract(bullet, reference)).max() for bullet, reference in zip(bullets, reference_bullets) if bullet and reference)
+    print(f"{tps:>4} TPS: player error {player_error:.2e}, bullet error {bullet_error:.2e}, {shots} shots, first bullet alive for {sum(bullet is not None for bullet in bullets)} samples")
+
+    assert player_error < 1e-6, f"Player trajectory differs at {tps} TPS"
+    assert bullet_error < 1e-6, f"Bullet trajectory differs at {tps} TPS"
+    assert [bullet is None for bullet in bullets] == [bullet is None for bullet in reference_bullets], f"Bullet lifetime differs at {tps} TPS"
+    assert shots == reference_shots, f"Fire rate differs at {tps} TPS"
+print(f"Player at {reference_players[-1].tolist()} after {DURATION}s at every tick rate")
+
+# Windows are kept in whole ticks, so they match the seconds they are defined in to within half a tick
+expected_windows = {"input queue": lakeserver.MAX_INPUT_DELAY, "snapshot history": lakeserver.SNAPSHOT_HISTORY_TIME, "lag compensation": lakeserver.LAG_COMPENSATION_TIME}
+for tps in TICK_RATES:
+    windows = measure_windows(tps)
+    print(f"{tps:>4} TPS: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in windows.items()))
+    for name, seconds in windows.items():
+        assert abs(seconds - expected_windows[name]) <= 0.5 / tps, f"The {name} window differs at {tps} TPS"
+lakeserver.TPS, lakeserver.SPT = default_tps, 1 / default_tps
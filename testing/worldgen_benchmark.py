@@ -0,0 +1,31 @@
+# ----- Setup ------
+import os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import worldgen
+
+# ----- Constant Variables -----
+SEED = 1234
+CHUNK_SIZE = 1000
+CHUNKS = 2000
+
+GAME_WIDTH = 1920
+GAME_HEIGHT = 1080
+
+# ----- Benchmark -----
+# Revisiting a chunk must give an identical layout
+assert np.array_equal(worldgen.generate_foliage(SEED, (-3, 7), CHUNK_SIZE), worldgen.generate_foliage(SEED, (-3, 7), CHUNK_SIZE))
+
+start_time = time.perf_counter()
+trees = 0
+for i in range(CHUNKS):
+    trees += len(worldgen.generate_foliage(SEED, (i % 50 - 25, i // 50 - 20), CHUNK_SIZE))
+duration = time.perf_counter() - start_time
+
+chunk_time = duration / CHUNKS
+screen_chunks = GAME_WIDTH * GAME_HEIGHT / (CHUNK_SIZE * CHUNK_SIZE)
+
+print(f"Chunks: {CHUNKS} in {duration:.3f}s ({CHUNKS / duration:.0f} chunks/s, {trees / duration:.0f} trees/s)")
+print(f"Trees per chunk: {trees / CHUNKS:.1f}")
+print(f"Full screen: {chunk_time * screen_chunks * 1000:.3f}ms")